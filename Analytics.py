@@ -0,0 +1,370 @@
+import argparse
+import csv
+import time
+from QuestionManager import QuestionManager
+from QuestionBank import build_bank, TRUE_ANSWER, FALSE_ANSWER
+from Recorder import read_session, QUESTION, ANSWER, TIMEOUT
+from Server import RED, GREEN, YELLOW, RESET
+
+try:
+    import numpy as np
+except ImportError:  # only the analytics need NumPy, the game doesn't
+    np = None
+
+"""
+Offline analytics of the recorded answers (see Recorder.py).
+
+The answers of one or more session files are loaded once into columnar NumPy arrays (one array per field,
+one row per answer or timeout), which can be cached to a .npz file. Every statistic is then computed over the
+whole columns at once with bincount, lexsort and masks, never with a Python loop over the answers, so millions
+of answers take seconds:
+    per question: accuracy, timeouts, discrimination (how well the question separates the strong players from the
+        weak ones) and the answer latency distribution,
+    per player: accuracy over time, in windows of the session's time.
+The result is a difficulty table, written as a CSV file and as a rated question bank whose difficulty levels
+QuestionManager draws from directly, e.g. QuestionManager("rated.tqb", difficulty=1) for the easiest questions.
+"""
+
+DIFFICULTY_LEVELS = 5  # 1 (most players get it right) to 5 (almost no one does), 0 is unrated
+INVALID = -1  # the answer code of a timeout or of an answer that is neither true nor false
+ANSWER_CODES = {**{answer: 1 for answer in TRUE_ANSWER}, **{answer: 0 for answer in FALSE_ANSWER}}
+COLUMNS = ("game", "question", "player", "answer", "answered", "latency", "time")
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("the analytics need NumPy: pip install numpy")
+
+
+class AnswerTable:
+    """
+    The recorded answers as columns, one row per question a player had to answer:
+        game (int32): The game of the answer, numbered across the session files.
+        question (int32): The id of the question in the question bank.
+        player (int32): The player, an index of names.
+        answer (int8): 1 for true, 0 for false, INVALID for a timeout or an answer that is neither.
+        answered (bool): False if the player timed out or disconnected instead of answering.
+        latency (float32): The seconds from the question to the answer, NaN for a timeout.
+        time (float64): The seconds from the start of the first session file to the answer.
+    """
+
+    def __init__(self, columns, names, question_file):
+        """
+        Attributes:
+            columns (dict): The arrays of the table {column name: array}, all of the same length.
+            names (list): The name of every player, by its index.
+            question_file (str): The question file the games were played with.
+        """
+        require_numpy()
+        self.columns = columns
+        self.names = list(names)
+        self.question_file = question_file
+
+    def __getattr__(self, name):
+        if name in COLUMNS:
+            return self.columns[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.columns["question"])
+
+    @classmethod
+    def open(cls, paths):
+        """
+        Loads a cached table (.npz) or reads the answers of session files.
+        """
+        if len(paths) == 1 and paths[0].endswith(".npz"):
+            return cls.load(paths[0])
+        return cls.from_sessions(paths)
+
+    @classmethod
+    def from_sessions(cls, paths):
+        """
+        Reads the answers and timeouts of session files, in order. An answer belongs to the last question of its game.
+        This is the only pass over the records, everything after it works on the columns.
+        """
+        require_numpy()
+        rows = {column: [] for column in COLUMNS}
+        player_ids = {}
+        question_file = None
+        game_offset = 0
+        time_offset = 0.0
+        for path in paths:
+            session_question_file, records = read_session(path)
+            if question_file is not None and session_question_file != question_file:
+                raise ValueError(f"{path} was played with {session_question_file}, not {question_file}")
+            question_file = session_question_file
+            current = {}  # game: (question id, time it was asked, players who answered it)
+            last_game = 0
+            seconds = 0.0
+            for kind, seconds, game, fields in records:
+                last_game = max(last_game, game)
+                if kind == QUESTION:
+                    current[game] = (fields[1], seconds, set())
+                    continue
+                if kind not in (ANSWER, TIMEOUT) or game not in current:
+                    continue
+                question_id, asked_at, answered = current[game]
+                player_name = fields[0]
+                if player_name in answered:
+                    continue  # a player who answered and then disconnected
+                answered.add(player_name)
+                rows["game"].append(game_offset + game)
+                rows["question"].append(question_id)
+                rows["player"].append(player_ids.setdefault(player_name, len(player_ids)))
+                rows["time"].append(time_offset + seconds)
+                if kind == ANSWER:
+                    rows["answer"].append(ANSWER_CODES.get(fields[1], INVALID))
+                    rows["answered"].append(True)
+                    rows["latency"].append(seconds - asked_at)
+                else:
+                    rows["answer"].append(INVALID)
+                    rows["answered"].append(False)
+                    rows["latency"].append(np.nan)
+            game_offset += last_game
+            time_offset += seconds
+        dtypes = {"game": np.int32, "question": np.int32, "player": np.int32, "answer": np.int8,
+                  "answered": np.bool_, "latency": np.float32, "time": np.float64}
+        columns = {column: np.array(rows[column], dtype=dtypes[column]) for column in COLUMNS}
+        return cls(columns, player_ids, question_file or "Questions.py")
+
+    def save(self, path):
+        """
+        Caches the table to a .npz file, which loads in a fraction of the time it takes to read the sessions.
+        """
+        np.savez_compressed(path, names=np.array(self.names, dtype=str), question_file=np.array(self.question_file),
+                            **self.columns)
+
+    @classmethod
+    def load(cls, path):
+        require_numpy()
+        with np.load(path) as data:
+            return cls({column: data[column] for column in COLUMNS}, data["names"].tolist(), str(data["question_file"]))
+
+
+def group_percentiles(groups, values, group_count, fractions):
+    """
+    Returns the given percentiles (fractions, 0.5 for the median) of the values of every group, one row per fraction,
+    NaN for a group without values. The values are sorted by group once, then every percentile of every group is
+    read at its position in the sorted array.
+    """
+    keep = ~np.isnan(values)
+    groups, values = groups[keep], values[keep]
+    sorted_values = values[np.lexsort((values, groups))]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(fractions), group_count), np.nan)
+    present = counts > 0
+    for row, fraction in enumerate(fractions):
+        positions = starts + np.floor(fraction * (counts - 1)).astype(np.int64)
+        result[row, present] = sorted_values[positions[present]]
+    return result
+
+
+def correlation_by_group(groups, x, y, group_count):
+    """
+    Returns the Pearson correlation of x and y within every group, NaN where it's undefined.
+    """
+    def total(weights):
+        return np.bincount(groups, weights=weights, minlength=group_count)
+
+    n, sum_x, sum_y = total(None), total(x), total(y)
+    covariance = n * total(x * y) - sum_x * sum_y
+    variance = (n * total(x * x) - sum_x ** 2) * (n * total(y * y) - sum_y ** 2)
+    return np.divide(covariance, np.sqrt(np.maximum(variance, 0)), out=np.full(group_count, np.nan),
+                     where=variance > 0)
+
+
+class AnswerAnalytics:
+    """
+    The statistics of an AnswerTable, checked against the answers of its question bank.
+    """
+
+    def __init__(self, table, bank=None):
+        """
+        Attributes:
+            table (AnswerTable): The answers.
+            bank (QuestionBank): The questions the games were played with, the table's question file by default.
+            truth (ndarray): The right answer of every question, 1 for true and 0 for false.
+            correct (ndarray): Whether every answer of the table was right, a timeout is wrong.
+        """
+        self.table = table
+        self.bank = bank if bank is not None else QuestionManager(table.question_file).bank
+        self.question_count = self.bank.question_count
+        self.truth = np.array([self.bank.record(question_id)[2] for question_id in range(self.question_count)],
+                              dtype=np.int8)
+        if len(table) and table.question.max() >= self.question_count:
+            raise ValueError(f"the answers are to questions missing from {table.question_file}")
+        self.correct = table.answered & (table.answer == self.truth[table.question])
+
+    def question_stats(self):
+        """
+        Returns the statistics of every question, as arrays indexed by the question id:
+            attempts: the players who had to answer it, timeouts included.
+            accuracy: the fraction of the attempts answered right.
+            timeout_rate: the fraction of the attempts not answered.
+            discrimination: the correlation between answering it right and the player's accuracy on the other
+                questions. Near 0 the question is luck, below 0 the strong players miss it (check its answer).
+            latency_median, latency_p90: the seconds the answers took.
+        """
+        question, player = self.table.question, self.table.player
+        count = self.question_count
+        correct = self.correct.astype(np.float64)
+        attempts = np.bincount(question, minlength=count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            accuracy = np.bincount(question, weights=correct, minlength=count) / attempts
+            timeout_rate = np.bincount(question, weights=~self.table.answered, minlength=count) / attempts
+
+        # The players' accuracy on the other questions (their "rest score"), for every answer
+        player_attempts = np.bincount(player)
+        player_correct = np.bincount(player, weights=correct)
+        others = player_attempts[player] - 1
+        rest_score = np.divide(player_correct[player] - correct, others, out=np.full(len(correct), np.nan),
+                               where=others > 0)
+        scored = ~np.isnan(rest_score)
+        discrimination = correlation_by_group(question[scored], correct[scored], rest_score[scored], count)
+
+        latency_median, latency_p90 = group_percentiles(question, self.table.latency.astype(np.float64), count,
+                                                        (0.5, 0.9))
+        return {"attempts": attempts, "accuracy": accuracy, "timeout_rate": timeout_rate,
+                "discrimination": discrimination, "latency_median": latency_median, "latency_p90": latency_p90}
+
+    def player_accuracy_over_time(self, window=3600):
+        """
+        Returns (attempts, accuracy, trend): the attempts and the accuracy of every player (rows) in every window
+        of window seconds (columns), NaN where the player didn't play, and the change of every player's accuracy
+        per window (a least squares slope over the windows it played).
+        """
+        player, correct = self.table.player, self.correct
+        player_count = len(self.table.names)
+        windows = (self.table.time // window).astype(np.int64)
+        window_count = int(windows.max()) + 1 if len(windows) else 1
+        cells = player.astype(np.int64) * window_count + windows
+        attempts = np.bincount(cells, minlength=player_count * window_count).reshape(player_count, window_count)
+        right = np.bincount(cells, weights=correct, minlength=player_count * window_count).reshape(attempts.shape)
+        accuracy = np.divide(right, attempts, out=np.full(attempts.shape, np.nan), where=attempts > 0)
+
+        played = attempts > 0
+        t = np.where(played, np.arange(window_count), 0.0)
+        a = np.where(played, accuracy, 0.0)
+        n = played.sum(axis=1)
+        spread = n * (t * t).sum(axis=1) - t.sum(axis=1) ** 2
+        trend = np.divide(n * (t * a).sum(axis=1) - t.sum(axis=1) * a.sum(axis=1), spread,
+                          out=np.full(player_count, np.nan), where=spread > 0)
+        return attempts, accuracy, trend
+
+    def difficulty_levels(self, stats, min_answers=30):
+        """
+        Returns the difficulty level of every question, from 1 (answered right by most) to DIFFICULTY_LEVELS, by
+        bands of accuracy. A question with fewer than min_answers attempts keeps the level of the bank.
+        """
+        bank_levels = np.array([self.bank.record(question_id)[4] for question_id in range(self.question_count)],
+                               dtype=np.int64)
+        rated = stats["attempts"] >= max(1, min_answers)
+        levels = 1 + np.floor((1 - np.nan_to_num(stats["accuracy"])) * DIFFICULTY_LEVELS).astype(np.int64)
+        return np.where(rated, np.clip(levels, 1, DIFFICULTY_LEVELS), bank_levels)
+
+    def write_table(self, path, stats, levels):
+        """
+        Writes the difficulty table as CSV, one row per question.
+        """
+        with open(path, "w", newline="") as table_file:
+            writer = csv.writer(table_file)
+            writer.writerow(["question_id", "difficulty", "attempts", "accuracy", "timeout_rate", "discrimination",
+                             "latency_median", "latency_p90", "question"])
+            for question_id in range(self.question_count):
+                writer.writerow([question_id, levels[question_id], stats["attempts"][question_id]]
+                                + [f"{stats[name][question_id]:.4f}" for name in
+                                   ("accuracy", "timeout_rate", "discrimination", "latency_median", "latency_p90")]
+                                + [self.bank.question(question_id)["question"]])
+
+    def write_bank(self, path, levels):
+        """
+        Writes the questions with their measured difficulty levels as a bank file (see QuestionBank.py).
+        """
+        questions = []
+        for question_id in range(self.question_count):
+            question = self.bank.question(question_id)
+            question["difficulty"] = int(levels[question_id])
+            questions.append(question)
+        with open(path, "wb") as bank_file:
+            bank_file.write(build_bank(questions))
+
+
+def format_number(value, spec):
+    return "-" if np.isnan(value) else format(value, spec)
+
+
+def report(analytics, stats, levels, over_time, top=5):
+    """
+    Returns the analytics as text: the hardest and the easiest questions, the questions that don't discriminate
+    and the players whose accuracy changed the most.
+    """
+    table = analytics.table
+    attempts, _, trend = over_time
+    asked = np.flatnonzero(stats["attempts"] > 0)
+    by_accuracy = asked[np.argsort(stats["accuracy"][asked], kind="stable")]
+
+    def describe(question_id):
+        text = analytics.bank.question(int(question_id))["question"].strip().splitlines()[-1][:70]
+        return (f"  {question_id}: {stats['accuracy'][question_id]:.0%} right of {stats['attempts'][question_id]}, "
+                f"discrimination {format_number(stats['discrimination'][question_id], '+.2f')}, "
+                f"median {format_number(stats['latency_median'][question_id], '.2f')} s, level {levels[question_id]} - {text}")
+
+    lines = [f"{len(table)} answers of {len(table.names)} players to {len(asked)} questions, "
+             f"{analytics.correct.mean() if len(table) else 0:.0%} right, "
+             f"{(~table.answered).mean() if len(table) else 0:.0%} timed out"]
+    lines.append("Hardest questions:")
+    lines += [describe(question_id) for question_id in by_accuracy[:top]]
+    lines.append("Easiest questions:")
+    lines += [describe(question_id) for question_id in by_accuracy[::-1][:top]]
+    suspicious = asked[stats["discrimination"][asked] < 0]
+    if len(suspicious):
+        lines.append(f"{len(suspicious)} questions the stronger players miss more often (check their answers):")
+        lines += [describe(question_id) for question_id in suspicious[np.argsort(stats["discrimination"][suspicious])][:top]]
+    lines.append("Questions by difficulty level: " + ", ".join(
+        f"{level}: {count}" for level, count in enumerate(np.bincount(levels, minlength=DIFFICULTY_LEVELS + 1)) if count))
+    trending = np.flatnonzero(~np.isnan(trend))
+    if len(trending):
+        lines.append("Players whose accuracy changed the most per window:")
+        for player in trending[np.argsort(-np.abs(trend[trending]))][:top]:
+            lines.append(f"  {table.names[player]}: {trend[player]:+.3f} over {int((attempts[player] > 0).sum())} "
+                         f"windows, {int(attempts[player].sum())} answers")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyses the recorded answers and rates the questions' difficulty.")
+    parser.add_argument("sessions", nargs="+", help="the session files (see Recorder.py), or a single cached .npz table")
+    parser.add_argument("--cache", default=None, metavar="PATH", help="save the loaded answers to this .npz file")
+    parser.add_argument("--table", default=None, metavar="PATH", help="write the difficulty table to this CSV file")
+    parser.add_argument("--bank", default=None, metavar="PATH",
+                        help="write the questions with their difficulty levels to this bank file, for QuestionManager")
+    parser.add_argument("--min-answers", type=int, default=30,
+                        help="the attempts a question needs to be rated, the others keep their level")
+    parser.add_argument("--window", type=float, default=3600, help="the seconds of each window of the players' accuracy")
+    parser.add_argument("--top", type=int, default=5, help="the questions and players listed in the report")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("the analytics need NumPy: pip install numpy")
+    start = time.perf_counter()
+    answer_table = AnswerTable.open(args.sessions)
+    loaded = time.perf_counter()
+    if args.cache:
+        answer_table.save(args.cache)
+    answer_analytics = AnswerAnalytics(answer_table)
+    question_stats = answer_analytics.question_stats()
+    difficulty = answer_analytics.difficulty_levels(question_stats, args.min_answers)
+    accuracy_over_time = answer_analytics.player_accuracy_over_time(args.window)
+    analysed = time.perf_counter()
+    print(report(answer_analytics, question_stats, difficulty, accuracy_over_time, args.top))
+    if args.table:
+        answer_analytics.write_table(args.table, question_stats, difficulty)
+    if args.bank:
+        answer_analytics.write_bank(args.bank, difficulty)
+    colour = GREEN if len(answer_table) else YELLOW
+    print(colour + f"Loaded {len(answer_table)} answers in {loaded - start:.2f} seconds, "
+                   f"analysed them in {analysed - loaded:.2f} seconds" + RESET)
+    if not len(answer_table):
+        print(RED + "No answers in the sessions, nothing was rated" + RESET)
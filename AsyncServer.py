@@ -0,0 +1,183 @@
+import asyncio
+import socket
+from Server import Server, RED, GREEN, YELLOW, RESET
+from RoomManager import RoomManager
+from Sessions import SessionRegistry
+from Clock import LoopClock
+from Beacon import OfferBeacon
+import Protocol
+import Metrics
+import Log
+
+
+class AsyncServer(Server):
+    """
+    A single-threaded asyncio engine for the trivia game.
+
+    Instead of one thread per player blocking on events and barriers, every phase of the game
+    (joining, question, answers, results and the winner) runs as a coroutine on one event loop.
+    The games are played in rooms (see GameRoom.py), so players who connect while a game is running
+    start their own game instead of waiting for it to end.
+    The messages sent to the players are built by the same Server methods, so the wire protocol is
+    exactly the one Client.py and Bot.py already speak. The threaded Server stays available as a fallback.
+    """
+
+    def __init__(self, autostart=True, lobby_timeout=10, answer_timeout=10, round_deadline=12, room_size=None, host=None,
+                 max_rooms=None, stats_path=None, metrics_port=None, record_path=None, resume_grace=10, fill_window=None,
+                 max_queue=None, listen_backlog=128, handshake_timeout=2):
+        """
+        Initializes the server attributes through Server (without starting it) and the rooms of the games.
+        At most max_rooms rooms play at once (no limit by default), once they are all full the offers stop and the
+        players who still connect are queued (up to max_queue) for the next room whose game is over.
+
+        Attributes:
+            room_manager (RoomManager): Keeps the game rooms and assigns new players to them.
+            connections_accepted (int): The number of players that joined the server.
+            sessions (SessionRegistry): The session tokens of all the rooms' players, on the event loop's clock.
+            pending_joins (list): The players waiting for a room (player_name, reader, writer, codec, client_address).
+        """
+        super().__init__(autostart=False, round_deadline=round_deadline, lobby_timeout=lobby_timeout,
+                         answer_timeout=answer_timeout, host=host, stats_path=stats_path,
+                         metrics_port=metrics_port, record_path=record_path, max_queue=max_queue,
+                         listen_backlog=listen_backlog, handshake_timeout=handshake_timeout)
+        self.sessions = SessionRegistry(resume_grace, LoopClock())
+        self.room_manager = RoomManager(lobby_timeout, answer_timeout, round_deadline, room_size, max_rooms,
+                                        self.stats_store, self.recorder, self.sessions, fill_window,
+                                        on_room_free=self.admit_queued)
+        self.connections_accepted = 0
+        if autostart:
+            asyncio.run(self.serve())
+
+    async def serve(self, port_number=None, reuse_port=False, broadcast=True):
+        """
+        Starts the UDP broadcast and accepts the players' TCP connections forever.
+        :param port_number: the port to listen on, a free port is found if it's None.
+        :param reuse_port: listen with SO_REUSEPORT, so several worker processes share the port (see ShardedServer.py).
+        :param broadcast: whether this server sends the UDP offers itself.
+        """
+        self.port_number = port_number if port_number is not None else self.find_free_port()
+        self.start_metrics()
+        tcp_server = await asyncio.start_server(self.client_handler, self.host or str(self.get_server_ip()), self.port_number,
+                                                reuse_port=reuse_port or None, backlog=self.listen_backlog)
+        self.broadcast_udp_flag = 1
+        udp_task = asyncio.create_task(self.udp_broadcast()) if broadcast else None
+        try:
+            async with tcp_server:
+                await tcp_server.serve_forever()
+        finally:
+            if udp_task is not None:
+                udp_task.cancel()
+            if self.stats_store is not None:
+                self.stats_store.compact()
+            if self.recorder is not None:
+                self.recorder.close()
+
+    def stats(self):
+        """
+        Returns the counters of the server: accepted connections, rooms playing, games played, waiting players,
+        free seats, queued players and the admissions (see LobbyScheduler.AdmissionCounter).
+        """
+        rooms = self.room_manager.rooms.values()
+        return {"connections": self.connections_accepted,
+                "active_rooms": self.room_manager.active_rooms(),
+                "games_played": self.room_manager.games_played,
+                "waiting_players": sum(len(room.lobby) for room in rooms),
+                "free_seats": self.room_manager.free_seats(),
+                "queued_players": len(self.pending_joins),
+                **self.admissions.report()}
+
+    def offer_load(self):
+        """
+        Returns the load sent with the offers: free seats, rooms playing and round phase.
+        An asyncio server with free seats always has a room in its lobby phase.
+        """
+        free_seats = self.room_manager.free_seats()
+        phase = Protocol.PHASE_LOBBY if free_seats > 0 else Protocol.PHASE_QUESTION
+        return free_seats, self.room_manager.active_rooms(), phase
+
+    async def udp_broadcast(self):
+        """
+        Sends the offer message and its load extension as the beacon decides (see Server.start_udp_broadcast).
+        """
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        server_socket.setblocking(False)
+        beacon = OfferBeacon()
+
+        Log.info("server_started", "Server started, listening on IP address {ip}", GREEN, ip=self.get_server_ip())
+        try:
+            while True:
+                free_seats, active_rooms, phase = self.offer_load()
+                if self.broadcast_udp_flag == 1 and beacon.tick(free_seats):
+                    try:
+                        for message in beacon.packets(self.server_name, self.port_number, free_seats, active_rooms, phase):
+                            server_socket.sendto(message, ('<broadcast>', 13117))
+                    except OSError as e:
+                        Log.error("offer_failed", "Error sending offer: {error}", RED, error=e)
+                await asyncio.sleep(beacon.burst_interval)
+        finally:
+            server_socket.close()
+
+    async def client_handler(self, reader, writer):
+        """
+        Receives the name of a new player and adds the player to a room that is waiting for players.
+        A player reconnecting with the token of a live session gets its seat back in its room instead.
+        If every room is playing or full the player is queued for the next free room, or rejected if the queue is full.
+        """
+        client_address = writer.get_extra_info('peername')
+        try:
+            data = await asyncio.wait_for(reader.read(1024), self.handshake_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            Log.warning("hello_timeout", "Timeout waiting for a player name from {address}", RED, address=client_address)
+            self.admissions.reject()
+            writer.close()
+            return
+
+        Metrics.BYTES_RECEIVED.inc(len(data))
+        player_name, codec = Protocol.parse_hello(data)
+        token = Protocol.parse_resume(data)
+        if token is not None:
+            session = self.sessions.find(token)
+            if session is not None and session.owner.resume_player(session, reader, writer, codec):
+                Metrics.CONNECTIONS.inc()
+                return
+            Log.warning("resume_rejected", "{player} has no seat to resume, joining a new game", YELLOW,
+                        player=player_name)
+        room = self.room_manager.get_open_room()
+        if room is not None:
+            self.admit_player(room, player_name, reader, writer, codec, client_address)
+        elif self.max_queue is not None and len(self.pending_joins) >= self.max_queue:
+            Log.warning("rooms_full", "Every room and the queue are full, turning away {player}", RED, player=player_name)
+            self.admissions.reject()
+            writer.write(codec.encode(Protocol.TEXT, "The server is full, please come back later\n"))
+            writer.close()
+        else:
+            self.pending_joins.append((player_name, reader, writer, codec, client_address))
+            self.admissions.queue()
+            notice = f"Every room is playing, you are number {len(self.pending_joins)} in the queue for the next game\n"
+            writer.write(codec.encode(Protocol.TEXT, notice))
+
+    def admit_player(self, room, player_name, reader, writer, codec, client_address):
+        self.connections_accepted += 1
+        self.admissions.admit()
+        Metrics.CONNECTIONS.inc()
+        room.add_player(player_name, reader, writer, codec, client_address)
+
+    def admit_queued(self):
+        """
+        Called once a room's game is over: the queued players join the free rooms in the order they connected,
+        the ones who left while queued are skipped.
+        """
+        while self.pending_joins:
+            room = self.room_manager.get_open_room()
+            if room is None:
+                return
+            player_name, reader, writer, codec, client_address = self.pending_joins.pop(0)
+            if writer.is_closing() or reader.at_eof():
+                writer.close()
+                continue
+            self.admit_player(room, player_name, reader, writer, codec, client_address)
+
+
+if __name__ == "__main__":
+    AsyncServer()
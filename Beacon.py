@@ -0,0 +1,121 @@
+import socket
+import time
+import Protocol
+
+
+class OfferBeacon:
+    """
+    Decides when the server sends its UDP offers, according to its load.
+
+    When a lobby opens (the server goes from no free seats to free seats) the offers are sent in a fast burst,
+    so the waiting clients find the server right away, then once per idle_interval. While every seat is
+    taken (all the games are full) the beacon is silent, there is nothing to offer.
+    """
+
+    def __init__(self, burst_interval=0.2, burst_duration=2.0, idle_interval=1.0):
+        """
+        Attributes:
+            burst_interval (float): Seconds between two offers during a burst, also the beacon's tick.
+            burst_duration (float): How long a burst lasts after a lobby opened.
+            idle_interval (float): Seconds between two offers the rest of the time.
+            lobby_open (bool): Whether the server had free seats at the last tick.
+            burst_until (float): The monotonic time the current burst ends.
+            next_offer (float): The monotonic time of the next offer.
+            offers_sent (int): The number of offers sent.
+        """
+        self.burst_interval = burst_interval
+        self.burst_duration = burst_duration
+        self.idle_interval = idle_interval
+        self.lobby_open = False
+        self.burst_until = 0.0
+        self.next_offer = 0.0
+        self.offers_sent = 0
+
+    def tick(self, free_seats, now=None):
+        """
+        Called every burst_interval seconds with the server's free seats.
+        Returns True if an offer must be sent now.
+        """
+        now = time.monotonic() if now is None else now
+        is_open = free_seats > 0
+        if is_open and not self.lobby_open:
+            self.burst_until = now + self.burst_duration
+            self.next_offer = now
+        self.lobby_open = is_open
+        if not is_open or now < self.next_offer:
+            return False
+        self.next_offer = now + (self.burst_interval if now < self.burst_until else self.idle_interval)
+        self.offers_sent += 1
+        return True
+
+    def packets(self, server_name, server_port, free_seats, active_rooms, phase):
+        """
+        Returns the datagrams of an offer: the offer itself and its load extension.
+        """
+        return [Protocol.build_offer(server_name, server_port),
+                Protocol.build_load(server_port, free_seats, active_rooms, phase)]
+
+
+def collect_offers(udp_socket, window=1.0, offers=None, loads=None):
+    """
+    Gathers the offers received on udp_socket for window seconds (blocking), after the offers and loads
+    already received (see add_datagram).
+    Returns {(server ip, server port): {'name', 'free_seats', 'active_rooms', 'phase'}}, the load fields are
+    None for servers that don't send the load extension.
+    """
+    offers = {} if offers is None else offers
+    loads = {} if loads is None else loads
+    deadline = time.monotonic() + window
+    previous_timeout = udp_socket.gettimeout()
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            udp_socket.settimeout(remaining)
+            try:
+                data, addr = udp_socket.recvfrom(1024)
+            except socket.timeout:
+                break
+            add_datagram(offers, loads, data, addr)
+    finally:
+        udp_socket.settimeout(previous_timeout)
+    return merge_loads(offers, loads)
+
+
+def add_datagram(offers, loads, data, addr):
+    """
+    Sorts a received datagram into the offers {(ip, port): name} or the loads {(ip, port): load}.
+    """
+    offer = Protocol.parse_offer(data)
+    if offer is not None:
+        server_name, server_port = offer
+        offers[(addr[0], server_port)] = server_name
+        return
+    load = Protocol.parse_load(data)
+    if load is not None:
+        server_port, free_seats, active_rooms, phase = load
+        loads[(addr[0], server_port)] = {'free_seats': free_seats, 'active_rooms': active_rooms, 'phase': phase}
+
+
+def merge_loads(offers, loads):
+    """
+    Joins every offer with its load extension.
+    """
+    unknown = {'free_seats': None, 'active_rooms': None, 'phase': None}
+    return {address: dict(loads.get(address, unknown), name=server_name) for address, server_name in offers.items()}
+
+
+def pick_least_loaded(offers):
+    """
+    Returns the address of the least loaded server: the most free seats, then the fewest active rooms.
+    Servers without the load extension come after the ones that have free seats.
+    """
+    def load_key(item):
+        _, offer = item
+        if offer['free_seats'] is None:
+            return 1, 0, 0
+        if offer['free_seats'] == 0:
+            return 2, 0, 0
+        return 0, -offer['free_seats'], offer['active_rooms']
+    return min(offers.items(), key=load_key)[0] if offers else None
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from Server import Server, GREEN, YELLOW, RESET
+from AsyncServer import AsyncServer
+import Protocol
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+"""
+An end-to-end loopback benchmark: starts a server with short timers in its own process and drives it with
+N synthetic clients, then writes the results as JSON so they can be compared between commits.
+
+Measured for every N:
+    joins_per_sec: players that completed the name handshake (got their HELLO frame) per second.
+    fanout_ms: for each question, how long after the first player each player received it (p50/p99).
+    answer_to_result_ms: from sending an answer to receiving the round results (p50/p99).
+    bytes_per_round: the bytes all the players received in a round.
+    question_bytes_per_round: the part of bytes_per_round that carried the questions and the roster.
+    peak_rss_kb: the peak resident memory of the server process.
+"""
+
+DEFAULT_PLAYERS = [10, 100, 1000, 5000]
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction (0.5 for the median) of the sorted values, None if there are none.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident memory of this process in KB, None if the platform can't tell.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+def run_server(engine, port_number, options, control):
+    """
+    The main function of the server process: runs the server until the benchmark asks for its peak memory.
+    The server's prints go to os.devnull to keep the benchmark output readable.
+    """
+    sys.stdout = open(os.devnull, "w")
+    if engine == "threaded":
+        server = Server(autostart=False, host="127.0.0.1", **options)
+
+        def target():
+            server.start(port_number, broadcast=False)
+    else:
+        server = AsyncServer(autostart=False, host="127.0.0.1", **options)
+
+        def target():
+            asyncio.run(server.serve(port_number, broadcast=False))
+    threading.Thread(target=target, daemon=True).start()
+    control.send("ready")
+    control.recv()
+    control.send(peak_rss_kb())
+
+
+class BenchClient:
+    """
+    A synthetic player that answers right away and records the times it received and sent messages.
+    """
+
+    def __init__(self, player_name, framed=True):
+        self.player_name = player_name
+        self.framed = framed
+        self.joined_at = None
+        self.question_times = []
+        self.answer_to_result = []
+        self.bytes_received = 0
+        self.question_bytes = 0
+        self.finished = False
+        self.failed = False
+
+    async def run(self, port_number, join_semaphore):
+        async with join_semaphore:
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port_number)
+            except OSError:
+                self.failed = True
+                return
+            if self.framed:
+                writer.write(Protocol.build_hello(self.player_name))
+            else:
+                writer.write((self.player_name + "\n").encode())
+                self.joined_at = time.perf_counter()
+            await writer.drain()
+        try:
+            await self.play(reader, writer)
+        except (ConnectionError, OSError, Protocol.ProtocolError):
+            pass
+        finally:
+            writer.close()
+
+    async def play(self, reader, writer):
+        my_name = self.player_name.lower()
+        viewer_player = False
+        answer_sent = None
+        codec = None
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            now = time.perf_counter()
+            self.bytes_received += len(data)
+            if codec is None:
+                codec = Protocol.detect_codec(data)
+            for kind, server_msg in codec.feed(data):
+                message = server_msg.lower()
+                # Checked first: an old text server's results may arrive in the same read as the next question
+                if kind in (Protocol.RESULT, Protocol.TEXT) and answer_sent is not None and "is correct" in message:
+                    self.answer_to_result.append(now - answer_sent)
+                    answer_sent = None
+                if kind == Protocol.HELLO:
+                    self.joined_at = now
+                    my_name = message
+                elif kind == Protocol.WINNER or "game over" in message:
+                    self.finished = True
+                    return
+                elif kind in (Protocol.ROSTER, Protocol.ROSTER_DELTA):
+                    self.question_bytes += Protocol.HEADER.size + len(server_msg.encode())
+                elif kind == Protocol.QUESTION or (kind == Protocol.TEXT and "true or false" in message):
+                    self.question_bytes += (Protocol.HEADER.size if codec.framed else 0) + len(server_msg.encode())
+                    self.question_times.append(now)
+                    if not viewer_player:
+                        writer.write(codec.encode(Protocol.ANSWER, random.choice(['Y', 'N'])))
+                        answer_sent = time.perf_counter()
+                if my_name + " is incorrect" in message and "is correct" in message:
+                    viewer_player = True
+
+
+async def drive_clients(players, port_number, framed, join_concurrency, timeout):
+    """
+    Connects the clients, plays the game and returns them.
+    """
+    join_semaphore = asyncio.Semaphore(join_concurrency)
+    clients = [BenchClient(f"Bench{index}", framed) for index in range(players)]
+    tasks = [asyncio.create_task(client.run(port_number, join_semaphore)) for client in clients]
+    await asyncio.wait(tasks, timeout=timeout)
+    for task in tasks:
+        task.cancel()
+    return clients
+
+
+def benchmark(players, engine="async", framed=True, join_concurrency=100, timeout=120, options=None):
+    """
+    Runs the benchmark with the given number of players against a fresh server process and returns its results.
+    """
+    options = options or {}
+    port_number = Server(autostart=False).find_free_port()
+    control, server_control = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(target=run_server, args=(engine, port_number, options, server_control))
+    server_process.start()
+    control.recv()
+    time.sleep(0.2)
+
+    start = time.perf_counter()
+    clients = asyncio.run(drive_clients(players, port_number, framed, join_concurrency, timeout))
+    duration = time.perf_counter() - start
+
+    control.send("stop")
+    server_rss = control.recv()
+    server_process.terminate()
+    server_process.join()
+
+    joined = [client.joined_at for client in clients if client.joined_at is not None]
+    rounds = max((len(client.question_times) for client in clients), default=0)
+    fanout = []
+    for round_index in range(rounds):
+        times = [client.question_times[round_index] for client in clients if len(client.question_times) > round_index]
+        first = min(times)
+        fanout.extend(received - first for received in times)
+    answer_to_result = [latency for client in clients for latency in client.answer_to_result]
+    total_bytes = sum(client.bytes_received for client in clients)
+    question_bytes = sum(client.question_bytes for client in clients)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "players": players,
+        "joined": len(joined),
+        "failed_joins": sum(1 for client in clients if client.failed),
+        "finished": sum(1 for client in clients if client.finished),
+        "joins_per_sec": round(len(joined) / (max(joined) - start), 1) if joined else 0,
+        "rounds": rounds,
+        "fanout_p50_ms": ms(percentile(fanout, 0.5)),
+        "fanout_p99_ms": ms(percentile(fanout, 0.99)),
+        "answer_to_result_p50_ms": ms(percentile(answer_to_result, 0.5)),
+        "answer_to_result_p99_ms": ms(percentile(answer_to_result, 0.99)),
+        "bytes_per_round": total_bytes // rounds if rounds else total_bytes,
+        "question_bytes_per_round": question_bytes // rounds if rounds else question_bytes,
+        "peak_rss_kb": server_rss,
+        "duration_sec": round(duration, 2),
+    }
+
+
+def git_commit():
+    """
+    Returns the commit the benchmark ran on, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the trivia server on the loopback interface.")
+    parser.add_argument("--players", type=int, nargs="+", default=DEFAULT_PLAYERS, help="the numbers of players to run")
+    parser.add_argument("--engine", choices=["async", "threaded"], default="async", help="the server engine")
+    parser.add_argument("--text", action="store_true", help="the clients speak the old text protocol")
+    parser.add_argument("--join-concurrency", type=int, default=100, help="the number of clients connecting at once")
+    parser.add_argument("--lobby-timeout", type=float, default=1, help="the server's lobby timer in seconds")
+    parser.add_argument("--round-deadline", type=float, default=5, help="the server's round deadline in seconds")
+    parser.add_argument("--answer-timeout", type=float, default=5, help="the server's answer timeout in seconds")
+    parser.add_argument("--output", default="benchmark_results.json", help="the JSON file to write the results to")
+    args = parser.parse_args()
+
+    server_options = {"lobby_timeout": args.lobby_timeout, "round_deadline": args.round_deadline,
+                      "answer_timeout": args.answer_timeout}
+    results = []
+    for player_count in args.players:
+        result = benchmark(player_count, args.engine, not args.text, args.join_concurrency, options=server_options)
+        print(YELLOW + json.dumps(result) + RESET)
+        results.append(result)
+
+    report = {"commit": git_commit(), "engine": args.engine, "framed": not args.text,
+              "server_options": server_options, "results": results}
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(GREEN + f"Results written to {args.output}" + RESET)
@@ -1,9 +1,6 @@
+import argparse
 import random
-import socket
-import struct
-import time
-from Statistics import Statistics
-global player_name, stati
+from ClientSession import ClientSession
 
 RED = "\033[31m"
 GREEN = "\033[32m"
@@ -12,8 +9,10 @@ BLUE = "\033[34m"
 MAGENTA = "\033[35m"
 CYAN = "\033[36m"
 RESET = "\033[0m"
-Stati = Statistics()
-viewer_player = 0
+
+
+ANSWERS = ['N', 'Y', 'T', 'F', '0', '1']
+OFFER_WINDOW = 1.0
 
 
 def generate_random_name():
@@ -31,107 +30,36 @@ def generate_random_name():
 player_name = generate_random_name()
 
 
-def listen_for_offers():
+def choose_answer(question):
     """
-     Listen for offers from the server and send data to the connect_to_server() function
-     once a connection offer is received.
-     It will construct the data for the connection according to the project's requirements.
-
-     input - nothing, we just wait for the server to send data for connection.
+    Returns a random answer to the question.
+    """
+    return random.choice(ANSWERS)
 
-     output - nothing, we just gather the data, and send it in the correct way
-     to the connect_to_server() to establish connection.
 
-     the data received from the server has to be constructed in the following way:
-     Magic cookie (4 bytes): 0xabcddcba, Message type (1 byte), ->
-     Server name (32 character string, Unicode encoded), Server port (2 bytes)
-     if the data is not constructed in this way then we don't connect to the sever.
-    """
-    print(YELLOW + "Client started, listening for offer requests..." + RESET)
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    client_socket.bind(("", 13117))
-
-    while True:
-        data, addr = client_socket.recvfrom(1024)
-        print("Received data: ", data)
-        try:
-            magic_cookie, message_type, server_name, server_port = struct.unpack('!Ib32sH', data)
-            server_name = server_name.decode('utf-8').rstrip()
-            if magic_cookie == 0xabcddcba and message_type == 0x2:
-                print(GREEN + f"Received offer from server '{server_name}' at address {addr[0]}, attempting to connect..." + RESET)
-                time.sleep(1)
-                connect_to_server(addr[0], server_port)
-        except struct.error as e:
-            print(f"Error unpacking data: {e}")
-
-
-def game_mode(sock):
+def listen_for_offers(server_address=None, max_games=0, report_every=10000):
     """
-    The game mode is what runs the game itself.
-    The messages that the client receives once the game starts are being sorted (with if clauses)
-    and the client "acts" according to the messages content.
-    If the message is a question then it will randomly select an answer and send it.
+     Plays games with random answers until max_games games were played (0 for ever), see ClientSession.py:
+     listens for the servers' offers, connects to the least loaded server (or to server_address),
+     plays the game and listens for offers again.
+     The session loops instead of calling itself back, so a bot can run for days. Every report_every games
+     it prints the memory and the stack depth, which stay the same however many games were played.
     """
-    global player_name, viewer_player
-    viewer_player = 0
-    count_correct_answers = 0
-    count_num_rounds = 1
-
-    try:
-        server_msg = sock.recv(1024).decode()
-        flag = 0
-        while True:
-            if flag != 0:
-                sock.settimeout(40)
-                server_msg = sock.recv(1024).decode()
-            if flag == 0:
-                flag = 1
-            print(CYAN + server_msg + RESET)
-            if player_name.lower().strip('\n') + " is correct" in server_msg.lower():
-                count_correct_answers += 1
-            if Stati.extract_round_number(server_msg) :
-                count_num_rounds = Stati.extract_round_number(server_msg)
-            if "game over" in server_msg.lower():
-                percentage = 100 * (count_correct_answers / count_num_rounds)
-                print("Your success rate: " + str(percentage) + " %")
-                print("Server disconnected, listening for offer requests...")
-                listen_for_offers()
-            if "game over" in server_msg.lower():
-                print(YELLOW + "Server disconnected, listening for offer requests..." + RESET)
-                listen_for_offers()
-            elif "true or false" in server_msg.lower():
-                if viewer_player == 0:
-                    answer = random.choice(['N', 'Y', 'T', 'F', '0', '1'])
-                    print(answer)
-                    sock.sendall(answer.strip().encode())
-            elif player_name.lower().strip('\n') + " is incorrect" in server_msg.lower()\
-                    and "is correct" in server_msg.lower():
-                viewer_player = 1
-    except Exception as e:
-        print(MAGENTA + "Disconnected from server." + RESET)
-        print(RED + f"An error occurred during the game: {e}" + RESET)
-        listen_for_offers()
-
-
-def connect_to_server(server_ip, server_port):
-    """
-    Connects to the server and starts calls the game_mode() function to start the game.
-    :param server_ip: the IP address of the server we want to connect to.
-    :param server_port: the port address of the server we want to connect to.
-    """
-    global player_name
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.connect((server_ip, server_port))
-        print(BLUE + "Connected to the server." + RESET)
-        sock.sendall(player_name.encode())
-
-        try:
-            while True:
-                time.sleep(0.5)
-                game_mode(sock)
-        except Exception as e:
-            print(f"An error occurred during the game: {e}")
-
-
-listen_for_offers()
+    session = ClientSession(player_name, choose_answer, OFFER_WINDOW, server_address, max_games, report_every)
+    session.run()
+    return session
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a trivia bot that answers at random.")
+    parser.add_argument("--server", help="the server as ip:port, skips listening for offers")
+    parser.add_argument("--games", type=int, default=0, help="the number of games to play, 0 for ever")
+    parser.add_argument("--report-every", type=int, default=10000,
+                        help="print the memory and the stack depth every N games, 0 never")
+    args = parser.parse_args()
+
+    address = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        address = (host, int(port))
+    listen_for_offers(address, args.games, args.report_every)
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import random
+import socket
+import time
+from Bot import ANSWERS, generate_random_name, RED, GREEN, YELLOW, RESET
+import Protocol
+import Beacon
+
+"""
+A load generator: thousands of independent bot sessions playing in one process.
+
+Bot.py keeps its state in module globals and blocks a whole interpreter per bot. Here every bot is a BotSession
+coroutine with its own name, answer strategy and think time, and all of them discover the server through one
+shared OfferListener.
+"""
+
+STRATEGIES = {
+    "random": lambda: random.choice(ANSWERS),
+    "true": lambda: random.choice(['Y', 'T', '1']),
+    "false": lambda: random.choice(['N', 'F', '0']),
+}
+
+
+class SwarmStats:
+    """The counters of the whole swarm."""
+
+    def __init__(self):
+        self.joins = 0
+        self.questions = 0
+        self.answers = 0
+        self.games = 0
+        self.wins = 0
+        self.disconnects = 0
+        self.failed_joins = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def report(self):
+        return ", ".join(f"{name}={value}" for name, value in self.as_dict().items())
+
+
+class OfferListener(asyncio.DatagramProtocol):
+    """
+    Listens for the UDP offers on port 13117 once for all the bots of the swarm.
+    The offers of the first window seconds are gathered before any bot connects, then every bot picks
+    the least loaded server that sent an offer in the last expiry seconds (see Beacon.pick_least_loaded).
+    A full server stops offering, so its last load goes stale.
+    """
+
+    def __init__(self, window=1.0, expiry=3.0):
+        self.window = window
+        self.expiry = expiry
+        self.offers = {}
+        self.loads = {}
+        self.last_seen = {}
+        self.offer_event = asyncio.Event()
+
+    def datagram_received(self, data, addr):
+        first_offer = not self.offers
+        Beacon.add_datagram(self.offers, self.loads, data, addr)
+        offer = Protocol.parse_offer(data)
+        if offer is not None:
+            self.last_seen[(addr[0], offer[1])] = time.monotonic()
+        if first_offer and self.offers:
+            server_name = next(iter(self.offers.values()))
+            print(GREEN + f"Received offer from server '{server_name}' at address {addr[0]}" + RESET)
+            asyncio.get_running_loop().call_later(self.window, self.offer_event.set)
+
+    async def wait_for_offer(self):
+        """
+        Returns the address of the least loaded server, waiting for the first offers if none arrived yet.
+        """
+        await self.offer_event.wait()
+        offers = Beacon.merge_loads(self.offers, self.loads)
+        now = time.monotonic()
+        fresh = {address: offer for address, offer in offers.items() if now - self.last_seen[address] < self.expiry}
+        return Beacon.pick_least_loaded(fresh or offers)
+
+    @classmethod
+    async def listen(cls):
+        """
+        Binds the shared offer socket and returns the listener.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", 13117))
+        _, listener = await asyncio.get_running_loop().create_datagram_endpoint(cls, sock=sock)
+        return listener
+
+
+class FixedServer:
+    """
+    Stands in for the OfferListener when the server address is given, so the bots skip the discovery.
+    """
+
+    def __init__(self, server_address):
+        self.server_address = server_address
+
+    async def wait_for_offer(self):
+        return self.server_address
+
+
+class BotSession:
+    """
+    A single bot: connects to the server, answers the questions with its strategy after its think time,
+    and plays the given number of games.
+    """
+
+    def __init__(self, player_name, stats, strategy="random", think_time=(0.0, 1.0), framed=True, games=1):
+        """
+        Attributes:
+            player_name (str): The name the bot joins with.
+            stats (SwarmStats): The counters shared by the swarm.
+            strategy (str): How the bot answers, one of STRATEGIES.
+            think_time (tuple): The minimum and maximum number of seconds the bot thinks before answering.
+            framed (bool): Whether the bot offers the framed protocol or speaks the old text one.
+            games (int): The number of games to play, 0 to play forever.
+        """
+        self.player_name = player_name
+        self.stats = stats
+        self.answer = STRATEGIES[strategy]
+        self.think_time = think_time
+        self.framed = framed
+        self.games = games
+
+    async def run(self, discovery):
+        """
+        Plays games until the wanted number of games was played.
+        """
+        games_played = 0
+        while self.games == 0 or games_played < self.games:
+            server_ip, server_port = await discovery.wait_for_offer()
+            try:
+                reader, writer = await asyncio.open_connection(server_ip, server_port)
+            except OSError:
+                self.stats.failed_joins += 1
+                await asyncio.sleep(1)
+                continue
+            self.stats.joins += 1
+            try:
+                if await self.play(reader, writer):
+                    self.stats.games += 1
+                else:
+                    self.stats.disconnects += 1
+            except (ConnectionError, OSError, Protocol.ProtocolError):
+                self.stats.disconnects += 1
+            finally:
+                writer.close()
+            games_played += 1
+
+    async def play(self, reader, writer):
+        """
+        Plays a single game. Returns True if the game ended with a winner, False if the server disconnected.
+        """
+        if self.framed:
+            writer.write(Protocol.build_hello(self.player_name))
+        else:
+            writer.write((self.player_name + "\n").encode())
+        await writer.drain()
+        my_name = self.player_name.lower()
+        viewer_player = False
+        codec = None
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return False
+            if codec is None:
+                codec = Protocol.detect_codec(data)
+            for kind, server_msg in codec.feed(data):
+                message = server_msg.lower()
+                if kind == Protocol.HELLO:
+                    my_name = message
+                elif kind == Protocol.WINNER or "game over" in message:
+                    if "winner: " + my_name in message:
+                        self.stats.wins += 1
+                    return True
+                elif kind == Protocol.QUESTION or (kind == Protocol.TEXT and "true or false" in message):
+                    self.stats.questions += 1
+                    if not viewer_player:
+                        await asyncio.sleep(random.uniform(*self.think_time))
+                        writer.write(codec.encode(Protocol.ANSWER, self.answer()))
+                        await writer.drain()
+                        self.stats.answers += 1
+                if my_name + " is incorrect" in message and "is correct" in message:
+                    viewer_player = True
+
+
+async def run_swarm(bots, server_address=None, strategy="random", think_time=(0.0, 1.0), framed=True, games=1,
+                    report_interval=5):
+    """
+    Runs the given number of bot sessions and prints the swarm counters every report_interval seconds.
+    Returns the final counters.
+    """
+    stats = SwarmStats()
+    discovery = FixedServer(server_address) if server_address else await OfferListener.listen()
+    sessions = [BotSession(f"{generate_random_name().strip()} {index}", stats, strategy, think_time, framed, games)
+                for index in range(1, bots + 1)]
+    tasks = [asyncio.create_task(session.run(discovery)) for session in sessions]
+    start = time.monotonic()
+    while True:
+        done, pending = await asyncio.wait(tasks, timeout=report_interval)
+        print(YELLOW + f"[{time.monotonic() - start:.0f}s] {stats.report()}" + RESET)
+        if not pending:
+            break
+    for task in done:
+        if task.exception() is not None:
+            print(RED + f"A bot failed: {task.exception()}" + RESET)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a swarm of trivia bots in one process.")
+    parser.add_argument("--bots", type=int, default=100, help="the number of bot sessions")
+    parser.add_argument("--games", type=int, default=1, help="the number of games each bot plays, 0 for ever")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random", help="how the bots answer")
+    parser.add_argument("--think-min", type=float, default=0.0, help="the minimum think time in seconds")
+    parser.add_argument("--think-max", type=float, default=1.0, help="the maximum think time in seconds")
+    parser.add_argument("--server", help="the server as ip:port, skips listening for offers")
+    parser.add_argument("--text", action="store_true", help="speak the old text protocol instead of the framed one")
+    args = parser.parse_args()
+
+    address = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        address = (host, int(port))
+    final_stats = asyncio.run(run_swarm(args.bots, address, args.strategy, (args.think_min, args.think_max),
+                                        not args.text, args.games))
+    print(GREEN + f"Swarm done: {final_stats.report()}" + RESET)
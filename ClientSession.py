@@ -0,0 +1,313 @@
+import gc
+import platform
+import socket
+import sys
+import time
+import Beacon
+import Protocol
+from Statistics import Statistics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RED = "\033[31m"
+GREEN = "\033[32m"
+YELLOW = "\033[33m"
+BLUE = "\033[34m"
+MAGENTA = "\033[35m"
+CYAN = "\033[36m"
+RESET = "\033[0m"
+
+# The states of a client session
+DISCOVER = "DISCOVER"  # gather the servers' offers and pick the least loaded server
+CONNECT = "CONNECT"  # open the TCP connection and send the name handshake
+PLAY = "PLAY"  # play a game until the winner is declared or the server disconnects
+RESUME = "RESUME"  # reconnect to the game after the connection dropped, with the session token
+SUMMARY = "SUMMARY"  # print the game's success rate, then go back to DISCOVER
+
+
+def stack_depth():
+    """
+    Returns the number of frames on the caller's stack.
+    """
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident memory of this process in KB, None if the platform can't tell.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+class GameSummary:
+    """The outcome of a single game, as seen by the player."""
+
+    def __init__(self):
+        self.rounds = 1
+        self.correct_answers = 0
+        self.finished = False
+        self.won = False
+        self.viewer = False
+
+    def success_rate(self):
+        return 100 * (self.correct_answers / self.rounds)
+
+
+class ClientSession:
+    """
+    The life of a player (a human client or a bot) as a state machine:
+    DISCOVER -> CONNECT -> PLAY -> SUMMARY -> DISCOVER...
+    A game whose connection drops goes PLAY -> RESUME -> PLAY: the player reconnects to the same server with its
+    session token and gets its seat back, without discovering the servers again.
+
+    Each state returns the next one, and run() loops over them, so a session plays any number of games
+    in constant memory and stack depth. The UDP offer socket is opened once for the whole session, and the
+    TCP socket of a game is closed before the next discovery.
+    """
+
+    def __init__(self, player_name, choose_answer, offer_window=1.0, server_address=None, max_games=0,
+                 report_every=10000, resume_window=10):
+        """
+        Attributes:
+            player_name (str): The name the player joins with.
+            choose_answer (callable): Called with the question's text, returns the answer to send or None to skip it.
+            offer_window (float): Seconds the offers are gathered for after the first one arrives.
+            server_address (tuple): The (ip, port) of the server to play on, discovered through the offers if None.
+            max_games (int): The number of games to play, 0 to play forever.
+            report_every (int): Print the memory and the stack depth every report_every games, 0 never.
+            resume_window (float): The seconds the player tries to reconnect to its game for after a dropped connection.
+            session_token (str): The token the server gave the player for its current game, None if it gave none.
+            state (str): The current state of the session.
+            games_played (int): The number of games played (or cut by a disconnection).
+            udp_socket (socket.socket): The offer socket, shared by all the discoveries.
+            tcp_socket (socket.socket): The connection of the current game.
+        """
+        self.player_name = player_name
+        self.choose_answer = choose_answer
+        self.offer_window = offer_window
+        self.fixed_address = server_address
+        self.max_games = max_games
+        self.report_every = report_every
+        self.resume_window = resume_window
+        self.session_token = None
+        self.statistics = Statistics()
+        self.state = DISCOVER
+        self.games_played = 0
+        self.server_address = None
+        self.summary = None
+        self.udp_socket = None
+        self.tcp_socket = None
+
+    def run(self):
+        """
+        Runs the session until max_games games were played, or forever.
+        """
+        states = {DISCOVER: self.discover, CONNECT: self.connect, PLAY: self.play, RESUME: self.resume,
+                  SUMMARY: self.summarize}
+        try:
+            while self.max_games == 0 or self.games_played < self.max_games:
+                self.state = states[self.state]()
+        except KeyboardInterrupt as k:
+            print(f"Client aborted connection: {k}")
+        finally:
+            self.close_game()
+            if self.udp_socket is not None:
+                self.udp_socket.close()
+                self.udp_socket = None
+
+    def discover(self):
+        """
+        Waits for the servers' offers and picks the least loaded server (see Beacon.pick_least_loaded).
+        Offers that were queued during the last game are dropped first, their loads are out of date.
+        """
+        if self.fixed_address is not None:
+            self.server_address = self.fixed_address
+            return CONNECT
+        if self.udp_socket is None:
+            print(YELLOW + "Client started, listening for offer requests..." + RESET)
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.udp_socket.bind(("", 13117))
+        self.drain_offers()
+
+        offers = {}
+        loads = {}
+        self.udp_socket.settimeout(None)
+        while not offers:
+            data, addr = self.udp_socket.recvfrom(1024)
+            Beacon.add_datagram(offers, loads, data, addr)
+        offers = Beacon.collect_offers(self.udp_socket, self.offer_window, offers, loads)
+        self.server_address = Beacon.pick_least_loaded(offers)
+        server_name = offers[self.server_address]['name']
+        print(GREEN + f"Received offer from server '{server_name}' at address {self.server_address[0]}, attempting to connect..." + RESET)
+        return CONNECT
+
+    def drain_offers(self):
+        """
+        Drops the datagrams waiting on the offer socket.
+        """
+        self.udp_socket.setblocking(False)
+        try:
+            while True:
+                self.udp_socket.recvfrom(1024)
+        except (BlockingIOError, InterruptedError):
+            pass
+        finally:
+            self.udp_socket.setblocking(True)
+
+    def connect(self):
+        """
+        Connects to the chosen server and sends the name handshake, which offers the framed protocol.
+        """
+        try:
+            self.tcp_socket = socket.create_connection(self.server_address, timeout=5)
+            self.tcp_socket.settimeout(None)  # the game may only start after the lobby timer
+            self.tcp_socket.sendall(Protocol.build_hello(self.player_name))
+        except OSError as e:
+            print(RED + f"Could not connect to the server: {e}" + RESET)
+            self.close_game()
+            time.sleep(1)
+            return DISCOVER
+        print(BLUE + "Connected to the server." + RESET)
+        return PLAY
+
+    def play(self):
+        """
+        Plays a single game: the messages are sorted by their kind (or by their content for an old text server)
+        and the questions are answered with choose_answer. A game resumed after a dropped connection goes on with
+        the same summary.
+        """
+        if self.summary is None:
+            self.summary = GameSummary()
+        try:
+            self.play_game(self.tcp_socket, self.summary)
+        except (OSError, ConnectionError, Protocol.ProtocolError, UnicodeDecodeError) as e:
+            print(MAGENTA + "Disconnected from server." + RESET)
+            print(RED + f"An error occurred during the game: {e}" + RESET)
+            if self.session_token is not None:
+                return RESUME
+        finally:
+            self.close_game()
+        return SUMMARY
+
+    def resume(self):
+        """
+        Reconnects to the server of the game with the session token, for up to resume_window seconds.
+        The server answers the handshake with the player's seat, the roster and the question of the round.
+        """
+        deadline = time.monotonic() + self.resume_window
+        while time.monotonic() < deadline:
+            try:
+                self.tcp_socket = socket.create_connection(self.server_address, timeout=2)
+                self.tcp_socket.settimeout(None)
+                self.tcp_socket.sendall(Protocol.build_hello(self.player_name, self.session_token))
+            except OSError:
+                self.close_game()
+                time.sleep(0.5)
+                continue
+            print(BLUE + "Reconnected to the server, resuming the game." + RESET)
+            return PLAY
+        print(RED + "Could not reconnect to the game." + RESET)
+        self.session_token = None
+        return SUMMARY
+
+    def play_game(self, sock, summary):
+        """
+        The game mode is what runs the game itself, until the winner is declared.
+        The first bytes from the server tell if it speaks the framed protocol (see Protocol.py).
+        """
+        my_name = self.player_name.lower().strip('\n')
+        codec = None
+        roster = []
+        players_left = set()
+        while True:
+            data = sock.recv(1024)
+            if not data:
+                raise ConnectionError("The server closed the connection")
+            if codec is None:
+                codec = Protocol.detect_codec(data)
+                sock.settimeout(40)
+
+            for kind, server_msg in codec.feed(data):
+                if kind == Protocol.HELLO:
+                    my_name = server_msg.lower()
+                    print(BLUE + f"You are playing as {server_msg}" + RESET)
+                    continue
+                if kind == Protocol.SESSION:
+                    self.session_token = server_msg
+                    continue
+                if kind == Protocol.ROSTER:
+                    roster = server_msg.split("\n")
+                    players_left = set(roster)
+                    print(CYAN + "Players: " + ", ".join(roster) + RESET)
+                    continue
+                if kind == Protocol.ROSTER_DELTA:
+                    eliminated, disconnected = Protocol.apply_roster_delta(roster, players_left, server_msg)
+                    out = [f"{player_name} (wrong answer)" for player_name in eliminated]
+                    out += [f"{player_name} (left)" for player_name in disconnected]
+                    print(CYAN + f"Out: {', '.join(out)}. {len(players_left)} players left" + RESET)
+                    continue
+                print(CYAN + server_msg + RESET)
+                message = server_msg.lower()
+
+                if my_name + " is correct" in message:
+                    summary.correct_answers += 1
+                round_number = self.statistics.extract_round_number(server_msg)
+                if round_number:
+                    summary.rounds = round_number
+
+                if kind == Protocol.WINNER or "game over" in message:
+                    summary.finished = True
+                    summary.won = "winner: " + my_name in message
+                    return
+                elif kind == Protocol.QUESTION or (kind == Protocol.TEXT and "true or false" in message):
+                    if not summary.viewer:
+                        answer = self.choose_answer(server_msg)
+                        if answer is not None:
+                            sock.sendall(codec.encode(Protocol.ANSWER, answer.strip()))
+                            print('Your answer is: ' + str(answer))
+                        else:
+                            print("You did not answer in the time limit, you are assigned as viewer")
+                            summary.viewer = True
+                elif my_name + " is incorrect" in message and "is correct" in message:
+                    summary.viewer = True
+
+    def summarize(self):
+        """
+        Prints the success rate of the game that ended, and the session's report every report_every games.
+        """
+        self.games_played += 1
+        self.session_token = None
+        if self.summary.finished:
+            print("Your success rate: " + str(self.summary.success_rate()) + " %")
+        print(YELLOW + "Server disconnected, listening for offer requests..." + RESET)
+        if self.report_every and self.games_played % self.report_every == 0:
+            print(YELLOW + self.report() + RESET)
+        self.summary = None
+        return DISCOVER
+
+    def report(self):
+        """
+        Returns the games played, the peak memory, the live objects and the stack depth of the session.
+        """
+        return (f"{self.games_played} games played, peak memory {peak_rss_kb()} KB, "
+                f"{len(gc.get_objects())} live objects, stack depth {stack_depth()}")
+
+    def close_game(self):
+        """
+        Closes the connection of the current game.
+        """
+        if self.tcp_socket is not None:
+            self.tcp_socket.close()
+            self.tcp_socket = None
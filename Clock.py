@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import time
+
+
+class Clock:
+    """
+    The real time, the clock of the threaded server.
+
+    The game logic reads the time and schedules its timers only through a clock, so it doesn't depend on the
+    wall clock: the asyncio engine uses LoopClock, which a simulation runs on virtual time (see Simulation.py).
+    """
+
+    def now(self):
+        """
+        Returns the current time in seconds, only differences between two times are meaningful.
+        """
+        return time.monotonic()
+
+    def call_later(self, delay, callback):
+        """
+        Calls callback after delay seconds. Returns a handle whose cancel() stops the call.
+        """
+        timer = threading.Timer(delay, callback)
+        timer.start()
+        return timer
+
+
+class LoopClock(Clock):
+    """
+    The time of the running asyncio event loop, the clock of the asyncio engine's rooms.
+    The timers are the loop's own, so under a VirtualEventLoop (see Simulation.py) the whole game runs on virtual time.
+    """
+
+    def now(self):
+        return asyncio.get_running_loop().time()
+
+    def call_later(self, delay, callback):
+        return asyncio.get_running_loop().call_later(delay, callback)
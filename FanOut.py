@@ -0,0 +1,76 @@
+import Metrics
+from Clock import Clock
+
+
+class FanOutWriter:
+    """
+    Pushes the same encoded message to many players of the asyncio engine without waiting for any of them.
+
+    Every player gets the very same bytes object (one per protocol), which the transport sends right away
+    without copying it if the socket can take it. What the socket can't take stays in that player's own
+    write queue (the transport buffer), so the other players are never delayed. A player whose queue grows
+    over max_queued_bytes, or that hasn't emptied it for stall_timeout seconds, is a slow reader and is evicted.
+    """
+
+    def __init__(self, max_queued_bytes=256 * 1024, stall_timeout=5.0, clock=None):
+        """
+        Attributes:
+            max_queued_bytes (int): The most bytes a player may have waiting in its write queue.
+            stall_timeout (float): The most seconds a player's write queue may stay non-empty.
+            clock (Clock): The time the stalls are measured with (see Clock.py).
+            stalled_since (dict): The time each stalled player's queue stopped emptying {player_name: time}.
+            evicted (int): The number of slow or disconnected players evicted.
+        """
+        self.max_queued_bytes = max_queued_bytes
+        self.stall_timeout = stall_timeout
+        self.clock = clock or Clock()
+        self.stalled_since = {}
+        self.evicted = 0
+
+    def send(self, players, payloads):
+        """
+        Queues the message for every player, payloads is {framed (bool): bytes} (see Server.encode_question).
+        Returns the players that were evicted, it's up to the caller to remove them from the game.
+        """
+        evicted = []
+        now = self.clock.now()
+        for player in list(players.values()):
+            transport = player.writer.transport
+            if transport is None or transport.is_closing():
+                evicted.append(player)
+                continue
+            payload = payloads[player.codec.framed]
+            transport.write(payload)
+            Metrics.BYTES_SENT.inc(len(payload))
+            if self.is_slow(player.player_name, transport.get_write_buffer_size(), now):
+                evicted.append(player)
+        for player in evicted:
+            self.evict(player)
+        return evicted
+
+    def is_slow(self, player_name, queued, now):
+        """
+        Returns True if a player with queued bytes waiting must be evicted.
+        """
+        if queued == 0:
+            self.stalled_since.pop(player_name, None)
+            return False
+        if queued > self.max_queued_bytes:
+            return True
+        stalled_since = self.stalled_since.setdefault(player_name, now)
+        return now - stalled_since > self.stall_timeout
+
+    def evict(self, player):
+        """
+        Drops a player's connection along with its write queue.
+        """
+        self.stalled_since.pop(player.player_name, None)
+        self.evicted += 1
+        if player.writer.transport is not None:
+            player.writer.transport.abort()
+
+    def forget(self, player_name):
+        """
+        Forgets a player that left the game.
+        """
+        self.stalled_since.pop(player_name, None)
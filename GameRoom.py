@@ -0,0 +1,354 @@
+import asyncio
+from Server import Server, RED, YELLOW, CYAN, BLUE, RESET
+from FanOut import FanOutWriter
+from Clock import LoopClock
+import Protocol
+import Metrics
+import Log
+
+
+class PlayerConnection:
+    """
+    The connection of a single player: its streams, the codec of the protocol it speaks and the
+    message telling it which name it was assigned (old text protocol only).
+    A framed player also has a session (see Sessions.py): while its connection is down it's away, and its seat
+    waits for it to reconnect with new streams.
+    """
+
+    def __init__(self, player_name, reader, writer, codec, duplicate_player=""):
+        self.player_name = player_name
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+        self.duplicate_player = duplicate_player
+        self.session = None
+        self.away = False
+        self.resumed = asyncio.Event()
+
+
+class GameRoom(Server):
+    """
+    A single game of the asyncio engine (see AsyncServer.py).
+
+    Each room owns its whole game state: its players, the remaining players, the answers of the round,
+    the current question and its own QuestionManager, so many rooms can play at the same time in one process.
+    The game logic and the messages come from Server, so the players get exactly the same game.
+    """
+
+    def __init__(self, room_id, lobby_timeout=10, answer_timeout=10, round_deadline=12, max_players=None, on_finished=None,
+                 stats_store=None, recorder=None, sessions=None, fill_window=None):
+        """
+        Initializes the game state through Server (without starting it) and the room specific attributes.
+        The room's timers and deadlines run on its event loop's clock (see Clock.LoopClock), and its lobby
+        scheduler (see LobbyScheduler.py) fills it up to max_players within fill_window seconds.
+
+        Attributes:
+            room_id (int): The number of the room in the server.
+            lobby (dict): The players waiting for the game of this room {player_name: PlayerConnection}.
+            lobby_timer (asyncio.TimerHandle): The room's single lobby timer, armed once for the lobby's deadline.
+            game_task (asyncio.Task): The task running the game of the room, None while the room is waiting for players.
+            max_players (int): The number of players that fill the room, None for no limit.
+            on_finished (callable): Called with the room once its game is over.
+            fan_out (FanOutWriter): Sends each message to all the players at once and evicts the slow readers.
+            stats_store (StatsStore): The players' statistics, shared by all the rooms of the server.
+            recorder (SessionRecorder): Records the games to the server's session file, shared by all the rooms.
+            sessions (SessionRegistry): The session tokens of the framed players, shared by all the rooms so a
+                reconnecting player is found by its token. None to not keep the seats of disconnected players.
+            players (dict): The players of the running game {player_name: PlayerConnection}, away players included.
+        """
+        super().__init__(autostart=False, round_deadline=round_deadline, lobby_timeout=lobby_timeout,
+                         answer_timeout=answer_timeout, clock=LoopClock(), fill_window=fill_window,
+                         max_lobby=max_players)
+        self.room_id = room_id
+        self.lobby = {}
+        self.lobby_timer = None
+        self.game_task = None
+        self.max_players = max_players
+        self.on_finished = on_finished
+        self.fan_out = FanOutWriter(clock=self.clock)
+        self.stats_store = stats_store
+        self.recorder = recorder
+        self.sessions = sessions
+        self.players = {}
+
+    def is_open(self):
+        """
+        Returns True if new players can join the room: its game hasn't started and it isn't full.
+        """
+        return self.game_task is None and (self.max_players is None or len(self.lobby) < self.max_players)
+
+    def add_player(self, player_name, reader, writer, codec, client_address):
+        """
+        Adds a player to the room, giving it a unique name if it's already taken in the room.
+        Players who offered the framed protocol in the handshake get a HELLO frame with their name.
+        A full room starts its game right away.
+        """
+        duplicate_player = ""
+        if player_name in self.lobby:
+            suffix = len(self.lobby)
+            while player_name + str(suffix) in self.lobby:
+                suffix += 1
+            player_name = player_name + str(suffix)
+            duplicate_player = f"You have been assigned {player_name}\n"
+        self.addresses.add(client_address[0])
+        player = self.lobby[player_name] = PlayerConnection(player_name, reader, writer, codec, duplicate_player)
+        Log.info("player_joined", "{player} has joined room {room} from {address}", CYAN,
+                 player=player_name, room=self.room_id, address=client_address)
+        if self.recorder is not None:
+            self.recorder.join(player_name)
+        if codec.framed:
+            hello = codec.encode(Protocol.HELLO, player_name)
+            if self.sessions is not None:
+                player.session = self.sessions.issue(player_name, self)
+                hello += codec.encode(Protocol.SESSION, player.session.token)
+            writer.write(hello)
+            Metrics.BYTES_SENT.inc(len(hello))
+        if self.lobby_scheduler.admit():
+            self.start_game()
+        else:
+            self.arm_lobby_timer()
+
+    def arm_lobby_timer(self):
+        """
+        Arms the lobby timer if it isn't armed yet. A join only moves the lobby's deadline (see LobbyScheduler),
+        so a storm of joins doesn't cancel and create a timer each.
+        """
+        if self.lobby_timer is None:
+            self.lobby_timer = self.clock.call_later(self.lobby_scheduler.time_left(), self.lobby_deadline)
+
+    def lobby_deadline(self):
+        """
+        Called by the lobby timer: starts the game if the lobby's deadline passed, or waits for the moved deadline.
+        """
+        self.lobby_timer = None
+        if self.lobby_scheduler.is_due():
+            self.start_game()
+        elif self.lobby_scheduler.size:
+            self.arm_lobby_timer()
+
+    def start_game(self):
+        """
+        Starts the game of the room with the players in its lobby.
+        """
+        if self.lobby_timer:
+            self.lobby_timer.cancel()
+        self.lobby_timer = None
+        self.lobby_scheduler.close()
+        if self.game_task is not None or not self.lobby:
+            return
+        Log.info("game_starting", "Room {room} is starting its game...", RED, room=self.room_id)
+        self.game_task = asyncio.create_task(self.game_loop())
+
+    async def game_loop(self):
+        """
+        Runs a whole game with the players of the room.
+
+        Steps:
+        1. Moves the lobby into the game, the room is closed to new players from now on.
+        2. While more than one player remains correct, sends the question (the welcome message in the first round),
+           collects the answers of the players who are still in the game and evaluates them.
+        3. Sends the results of each round to every connected player, eliminated players keep watching,
+           and prepares the next question while the results are on their way.
+        4. Declares the winner, closes the players' connections and tells the server the room is free again.
+        """
+        players = self.players = self.lobby
+        self.lobby = {}
+        game_players = list(players)
+        self.connected_clients = {(player_name, player.writer) for player_name, player in players.items()}
+        self.correct_players = set(players)
+        self.General_round = 1
+        self.round_answers.clear()
+        self.round_scheduler.new_game()
+        self.start_recording(game_players)
+
+        try:
+            while len(self.correct_players) > 1:
+                round_start = self.clock.now()
+                if self.General_round == 1:
+                    self.broadcast_game_start()
+                    self.General_round = 2
+                else:
+                    self.broadcast_question()
+                    self.General_round += 1
+
+                await self.play_round(players)
+                with Metrics.EVALUATE_DURATION.time():
+                    self.evaluate_and_update_scores()
+                self.broadcast(players, self.encode_message(Protocol.RESULT, self.result_message))
+                Metrics.ROUND_DURATION.observe(self.clock.now() - round_start)
+                if len(self.correct_players) > 1:
+                    self.prepare_question()
+
+            winner = list(self.correct_players)[0] if len(self.correct_players) == 1 else None
+            self.record_game(game_players, winner)
+            if winner is not None:
+                Log.info("game_over", "Room {room} game over!\nCongratulations to the winner: {winner}", BLUE,
+                         room=self.room_id, winner=winner)
+                self.broadcast(players, self.encode_message(Protocol.WINNER, self.winner_message(winner)))
+        finally:
+            for player in players.values():
+                self.fan_out.forget(player.player_name)
+                player.writer.close()
+                if not player.away:
+                    Metrics.CONNECTIONS.dec()
+            if self.sessions is not None:
+                self.sessions.close_all(self)
+            self.players = {}
+            self.game_roster = []
+            self.General_round = 1
+            self.connected_clients = set()
+            self.correct_players = set()
+            self.game_task = None
+            if self.on_finished is not None:
+                self.on_finished(self)
+
+    async def play_round(self, players):
+        """
+        Sends the current question to every player, then waits for the answers of the players still in the game.
+        The round ends as soon as every live player answered or when the round deadline passes (see RoundScheduler).
+        """
+        self.round_answers.clear()
+        self.answer_latencies.clear()
+        self.round_scheduler.open_round(self.correct_players)
+        for player in players.values():
+            if player.duplicate_player and not player.codec.framed:
+                # Framed players already got their assigned name in the HELLO frame
+                notice = player.codec.encode(Protocol.TEXT, player.duplicate_player)
+                player.writer.write(notice)
+                Metrics.BYTES_SENT.inc(len(notice))
+            player.duplicate_player = ""
+        self.broadcast(players, self.question_payloads)
+
+        answer_tasks = [asyncio.create_task(self.receive_answer(self.correct_answer, player))
+                        for player_name, player in players.items() if player_name in self.correct_players]
+        if answer_tasks:
+            # Every player's answer_timeout starts with the round, so a single timer covers the whole round
+            timeout = min(self.answer_timeout, self.round_scheduler.time_left())
+            _, pending = await asyncio.wait(answer_tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        saved = self.round_scheduler.close_round()
+        if saved > 0:
+            Log.info("round_closed_early", "All answers are in, room {room} closed its round {saved:.1f} seconds early",
+                     YELLOW, room=self.room_id, saved=saved)
+
+    def broadcast(self, players, payloads):
+        """
+        Sends an encoded message {framed (bool): bytes} to every player of the game without waiting for any of them.
+        A player that disconnected or reads too slowly is evicted and out of the game, unless it has a session:
+        then it's away and keeps its seat until it reconnects or its grace window is over.
+        """
+        connected = {player_name: player for player_name, player in players.items() if not player.away}
+        for player in self.fan_out.send(connected, payloads):
+            if self.hold_seat(player):
+                continue
+            Log.warning("player_disconnected", "player:{player} disconnected", player=player.player_name, room=self.room_id)
+            Metrics.CONNECTIONS.dec()
+            if player.player_name in self.correct_players:
+                self.record_timeout(player.player_name)
+            self.correct_players.discard(player.player_name)
+            players.pop(player.player_name, None)
+            self.round_scheduler.mark_done(player.player_name)
+
+    def hold_seat(self, player):
+        """
+        Keeps the seat of a player whose connection dropped, if it has a session. Returns False if it has none.
+        """
+        if player.away:
+            return True
+        if player.session is None or not self.sessions.drop(player.session):
+            return False
+        player.away = True
+        player.resumed.clear()
+        Metrics.CONNECTIONS.dec()
+        Log.info("player_away", "{player} disconnected, keeping its seat for {grace} seconds", YELLOW,
+                 player=player.player_name, room=self.room_id, grace=self.sessions.grace)
+        return True
+
+    def resume_player(self, session, reader, writer, codec):
+        """
+        Gives a reconnecting player its seat back on its new streams, sending it its name, the roster of the game
+        and, if it hasn't answered it yet, the question of the round, all at once.
+        Returns False if the player has no seat in this room anymore.
+        """
+        player = (self.players if self.game_task is not None else self.lobby).get(session.player_name)
+        if player is None or player.session is not session:
+            return False
+        old_writer = player.writer
+        player.reader, player.writer, player.codec = reader, writer, codec
+        if not player.away:
+            Metrics.CONNECTIONS.dec()  # the old connection is closed below
+        old_writer.close()
+        player.away = False
+        self.fan_out.forget(player.player_name)
+        self.sessions.resume(session)
+        catch_up = codec.encode(Protocol.HELLO, player.player_name) + codec.encode(Protocol.SESSION, session.token)
+        if self.game_task is not None:
+            catch_up += self.roster_catch_up()
+            if (self.round_scheduler.round_start is not None and player.player_name in self.correct_players
+                    and player.player_name not in self.round_answers):
+                catch_up += self.question_payloads[True]
+        writer.write(catch_up)
+        Metrics.BYTES_SENT.inc(len(catch_up))
+        player.resumed.set()
+        Log.info("player_resumed", "{player} is back in room {room}", CYAN, player=player.player_name, room=self.room_id)
+        return True
+
+    async def wait_for_resume(self, player):
+        """
+        Waits for an away player to reconnect, raises ConnectionError once its grace window is over.
+        """
+        try:
+            await asyncio.wait_for(player.resumed.wait(), max(0.0, self.sessions.time_left(player.session)))
+        except asyncio.TimeoutError:
+            self.sessions.close(player.session)
+            raise ConnectionError("the player didn't come back in time")
+
+    async def receive_answer(self, correct_answer, player):
+        """
+        Waits for the answer of a player until play_round cancels it (after answer_timeout seconds or at the round
+        deadline), a player who didn't answer or disconnected is out of the game.
+        """
+        player_name = player.player_name
+        try:
+            answer = await self.read_answer(player)
+            self.round_answers[player_name] = (answer, correct_answer)
+            self.answer_latencies[player_name] = self.round_scheduler.elapsed()
+            if self.recorder is not None:
+                self.recorder.answer(self.recorded_game, player_name, answer)
+        except (asyncio.CancelledError, ConnectionError, OSError, Protocol.ProtocolError):
+            # Cancelled means the answer timeout or the round deadline passed before the player answered
+            Metrics.ANSWER_TIMEOUTS.inc()
+            if player_name in self.correct_players:
+                Log.warning("answer_timeout", "Timeout waiting for answer from {player}", YELLOW,
+                            player=player_name, room=self.room_id)
+                self.correct_players.remove(player_name)
+                self.record_timeout(player_name)
+        finally:
+            self.round_scheduler.mark_done(player_name)
+
+    async def read_answer(self, player):
+        """
+        Reads from the player's stream until a whole answer arrived, partial frames and the messages received after
+        the answer are kept by the codec (see Protocol.take_message).
+        A player with a session whose connection drops is waited for, and read from its new stream once it's back.
+        """
+        while True:
+            answer = Protocol.take_message(player.codec, (Protocol.ANSWER, Protocol.TEXT))
+            if answer is not None:
+                return answer
+            if player.away:
+                await self.wait_for_resume(player)
+            reader = player.reader
+            try:
+                data = await reader.read(1024)
+            except OSError:
+                data = b""
+            if not data:
+                if player.reader is not reader or self.hold_seat(player):
+                    continue  # reconnected, or waiting for it
+                raise ConnectionError("connection closed")
+            Metrics.BYTES_RECEIVED.inc(len(data))
+            player.codec.undelivered.extend(player.codec.feed(data))
@@ -0,0 +1,69 @@
+import threading
+import types
+
+"""
+The published state of a game of the threaded server.
+
+The game state is owned by a single writer, the server's game thread: the connection handlers never change it,
+they post their events (joins, answers, timeouts, disconnections) to the writer's inbox. After each step of the
+game the writer publishes an immutable RoundSnapshot, linked to the previous one, so a handler reads the
+question, the results and the winner from its snapshots without any lock and never misses a step, however far
+behind the other handlers it is.
+"""
+
+# The kinds of snapshots, in the order of a game: LOBBY -> (QUESTION -> RESULTS)... -> OVER
+LOBBY = "LOBBY"
+QUESTION = "QUESTION"
+RESULTS = "RESULTS"
+OVER = "OVER"
+
+
+class RoundSnapshot:
+    """
+    The game as it was at one step: never changed once published, only linked to the next snapshot.
+    """
+
+    def __init__(self, kind, round_number=0, roster=(), players=(), payloads=None, correct_answer=(),
+                 answers=(), result_message="", winner=None, opened_at=None):
+        """
+        Attributes:
+            kind (str): LOBBY, QUESTION, RESULTS or OVER.
+            round_number (int): The round the snapshot belongs to.
+            roster (tuple): The players of the round, in the order they are listed.
+            players (frozenset): The players still in the game, the ones expected to answer a QUESTION.
+            payloads (mappingproxy): The encoded message to send at this step {framed (bool): bytes},
+                empty if there is nothing to send (e.g. a game over without a winner).
+            correct_answer (tuple): The accepted answers to the question of the round.
+            answers (tuple): The (player_name, answer) pairs the round was evaluated with (RESULTS).
+            result_message (str): The results of the round (RESULTS).
+            winner (str): The winner of the game (OVER), None if no one won.
+            opened_at (float): The clock time the question was published at, to measure the answer latencies.
+            next (RoundSnapshot): The snapshot published after this one, None until it is published.
+        """
+        self.kind = kind
+        self.round_number = round_number
+        self.roster = tuple(roster)
+        self.players = frozenset(players)
+        self.payloads = types.MappingProxyType(dict(payloads or {}))
+        self.correct_answer = tuple(correct_answer)
+        self.answers = tuple(answers)
+        self.result_message = result_message
+        self.winner = winner
+        self.opened_at = opened_at
+        self.next = None
+        self.published = threading.Event()
+
+    def link(self, snapshot):
+        """
+        Publishes the next snapshot. Only the writer calls it, once per snapshot.
+        """
+        self.next = snapshot
+        self.published.set()
+
+    def wait_next(self, timeout=None):
+        """
+        Blocks until the next snapshot is published and returns it, None if timeout seconds passed first.
+        """
+        if not self.published.wait(timeout):
+            return None
+        return self.next
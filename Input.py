@@ -1,48 +1,376 @@
-import tkinter as tk
-from tkinter import simpledialog
+import argparse
+import os
+import queue
+import select
+import sys
+import threading
+import time
 
+try:
+    import tkinter as tk
+except ImportError:  # Python built without Tk
+    tk = None
 
-class TimedInputDialog(simpledialog.Dialog):
+try:
+    import msvcrt
+except ImportError:  # not Windows
+    msvcrt = None
+
+"""
+The ways a player answers the questions, as interchangeable input backends for GameClient:
+    TkInput: a single window, created once and shown again for every question.
+    TerminalInput: reads the answer from the terminal without blocking past the answer deadline, for headless boxes.
+    FeedInput: answers fed by the program itself, for scripted clients and tests.
+Every backend measures how long its prompt takes to be ready and how long a submitted answer takes to be returned.
+"""
+
+RED = "\033[31m"
+GREEN = "\033[32m"
+YELLOW = "\033[33m"
+RESET = "\033[0m"
+
+
+class InputUnavailable(RuntimeError):
+    """The backend can't run here, e.g. Tk without a display."""
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction (0.5 for the median) of the sorted values, None if there are none.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class InputBackend:
+    """
+    Asks the player for the answer to a question, until a deadline.
+    Subclasses implement read_answer, call prompt_ready once the player can answer and set submitted_at to the
+    time the player submitted the answer.
+    """
+    name = "input"
+
+    def __init__(self):
+        """
+        Attributes:
+            ready_latencies (list): The seconds from being asked for an answer to the prompt being ready.
+            submit_latencies (list): The seconds from the player submitting an answer to it being returned.
+            answered (int): The questions answered in time.
+            timed_out (int): The questions not answered in time.
+            asked_at (float): The time (time.perf_counter) the current question was asked at.
+            submitted_at (float): The time the player submitted the current answer, None if it didn't.
+        """
+        self.ready_latencies = []
+        self.submit_latencies = []
+        self.answered = 0
+        self.timed_out = 0
+        self.asked_at = None
+        self.submitted_at = None
+
+    def get_answer(self, question, timeout=10):
+        """
+        Returns the player's answer to the question, None if the player did not answer within timeout seconds.
+        The deadline counts from the call, so the time the backend takes to show its prompt is part of it.
+        """
+        self.asked_at = time.perf_counter()
+        self.submitted_at = None
+        answer = self.read_answer(question, self.asked_at + timeout)
+        if answer is None:
+            self.timed_out += 1
+        else:
+            self.answered += 1
+            if self.submitted_at is not None:
+                self.submit_latencies.append(time.perf_counter() - self.submitted_at)
+        return answer
+
+    def read_answer(self, question, deadline):
+        raise NotImplementedError
+
+    def prompt_ready(self):
+        self.ready_latencies.append(time.perf_counter() - self.asked_at)
+
+    def close(self):
+        pass
+
+    def report(self):
+        """
+        Returns the answers and the latencies of the backend as text.
+        """
+        def milliseconds(values, fraction):
+            value = percentile(values, fraction)
+            return "-" if value is None else f"{value * 1000:.2f}"
+
+        return (f"{self.name}: {self.answered} answered, {self.timed_out} timed out, "
+                f"prompt ready in {milliseconds(self.ready_latencies, 0.5)} ms "
+                f"(p99 {milliseconds(self.ready_latencies, 0.99)}), "
+                f"answer returned {milliseconds(self.submit_latencies, 0.5)} ms after it was submitted "
+                f"(p99 {milliseconds(self.submit_latencies, 0.99)})")
+
+
+class TkInput(InputBackend):
+    """
+    A single answer window for the whole session: it's created on the first question, shown with the question
+    for the next ones and hidden between them, instead of a new Tk root and dialog per question.
+    Must be used from the thread that created it, Tk isn't thread safe.
+    """
+    name = "tk"
+
+    def __init__(self):
+        super().__init__()
+        self.root = None
+        self.answer = None
+
+    def open(self):
+        """
+        Creates the (hidden) window. Raises InputUnavailable if Tk can't run here.
+        """
+        if tk is None:
+            raise InputUnavailable("tkinter is not installed")
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as e:
+            raise InputUnavailable(f"Tk can't open a window: {e}")
+        self.root.title("Input")
+        self.root.wm_attributes("-topmost", 1)
+        self.root.protocol("WM_DELETE_WINDOW", self.skip)
+        self.question_label = tk.Label(self.root, justify="left", wraplength=480)
+        self.question_label.pack(padx=10, pady=5)
+        self.entry = tk.Entry(self.root)
+        self.entry.pack(padx=10)
+        self.entry.bind("<Return>", lambda event: self.submit())
+        self.entry.bind("<Escape>", lambda event: self.skip())
+        tk.Button(self.root, text="OK", width=10, command=self.submit).pack(pady=5)
+        self.done = tk.BooleanVar(self.root, False)
+        self.root.withdraw()
+
+    def read_answer(self, question, deadline):
+        if self.root is None:
+            self.open()
+        self.answer = None
+        self.done.set(False)
+        self.question_label.config(text=question.strip())
+        self.entry.delete(0, tk.END)
+        self.root.deiconify()
+        self.root.lift()
+        self.entry.focus_force()
+        self.root.update_idletasks()
+        self.prompt_ready()
+        timer = self.root.after(max(0, int((deadline - time.perf_counter()) * 1000)), self.skip)
+        self.root.wait_variable(self.done)
+        self.root.after_cancel(timer)
+        self.root.withdraw()
+        return self.answer
+
+    def submit(self):
+        self.submitted_at = time.perf_counter()
+        self.answer = self.entry.get()
+        self.done.set(True)
+
+    def skip(self):
+        self.done.set(True)
+
+    def close(self):
+        if self.root is not None:
+            self.root.destroy()
+            self.root = None
+
+
+class TerminalInput(InputBackend):
     """
-    A class that manages the input dialog for answering questions.
+    Reads the answer as a line from the terminal (or any file descriptor), waiting no longer than the deadline.
+    A line typed after the deadline of a question is dropped when the next question is asked, so it's never
+    taken as the answer to the wrong question.
     """
-    def __init__(self, parent, title, timeout=10):
-        self.timeout = timeout
-        super().__init__(parent, title)
+    name = "terminal"
+
+    def __init__(self, stream=None, prompt="Your answer: "):
+        """
+        Attributes:
+            stream: The file (or file descriptor) the answers are read from, the standard input by default.
+            prompt (str): Printed when the player is asked for an answer.
+            pending (bytes): What was read after the last whole line.
+        """
+        super().__init__()
+        self.stream = sys.stdin if stream is None else stream
+        self.fd = self.stream if isinstance(self.stream, int) else self.stream.fileno()
+        self.prompt = prompt
+        self.pending = b""
+
+    def read_answer(self, question, deadline):
+        self.drain()
+        print(self.prompt, end="", flush=True)
+        self.prompt_ready()
+        if msvcrt is not None and self.fd == 0:
+            line = self.read_console_line(deadline)
+        else:
+            line = self.read_line(deadline)
+        if line is None:
+            print()
+        return line
 
-    def body(self, master):
-        self.label = tk.Label(master, text="Enter something:")
-        self.label.pack()
-        self.entry = tk.Entry(master)
-        self.entry.pack()
-        self.entry.focus_set()
-        return self.entry
+    def read_line(self, deadline):
+        """
+        Returns the next line, None if it isn't complete by the deadline or the stream was closed.
+        """
+        while b"\n" not in self.pending:
+            time_left = deadline - time.perf_counter()
+            if time_left <= 0 or not select.select([self.fd], [], [], time_left)[0]:
+                return None
+            data = os.read(self.fd, 1024)
+            if not data:
+                return None
+            self.pending += data
+        self.submitted_at = time.perf_counter()
+        line, self.pending = self.pending.split(b"\n", 1)
+        return line.decode(errors="replace").rstrip("\r")
 
-    def buttonbox(self):
-        super().buttonbox()
-        self.wm_attributes("-topmost", 1)
-        self.timeout_event = self.after(self.timeout * 1000, self.on_timeout)
+    def read_console_line(self, deadline):
+        """
+        The Windows console can't be waited on with select, so it's polled for keys until the deadline.
+        """
+        while time.perf_counter() < deadline:
+            while msvcrt.kbhit():
+                key = msvcrt.getwche()
+                if key in "\r\n":
+                    self.submitted_at = time.perf_counter()
+                    print()
+                    line, self.pending = self.pending, b""
+                    return line.decode(errors="replace")
+                self.pending += key.encode()
+            time.sleep(0.01)
+        return None
 
-    def on_timeout(self):
-        self.cancel()
+    def drain(self):
+        """
+        Drops what was typed since the last question.
+        """
+        self.pending = b""
+        if msvcrt is not None and self.fd == 0:
+            while msvcrt.kbhit():
+                msvcrt.getwch()
+            return
+        while select.select([self.fd], [], [], 0)[0]:
+            if not os.read(self.fd, 1024):
+                return
+
+
+class FeedInput(InputBackend):
+    """
+    Answers fed by the program, from any thread, e.g. a scripted client or a test driving a GameClient.
+    An answer fed before the question is asked is the answer to the next question.
+    """
+    name = "feed"
 
-    def cancel(self):
-        if self.timeout_event is not None:
-            self.after_cancel(self.timeout_event)
-            self.timeout_event = None
-        super().cancel()
+    def __init__(self, answers=()):
+        super().__init__()
+        self.answers = queue.Queue()
+        for answer in answers:
+            self.feed(answer)
 
-    def apply(self):
-        self.result = self.entry.get()
+    def feed(self, answer):
+        self.answers.put((answer, time.perf_counter()))
+
+    def read_answer(self, question, deadline):
+        self.prompt_ready()
+        try:
+            answer, fed_at = self.answers.get(timeout=max(0.0, deadline - time.perf_counter()))
+        except queue.Empty:
+            return None
+        self.submitted_at = max(fed_at, self.asked_at)
+        return answer
+
+
+BACKENDS = {"tk": TkInput, "terminal": TerminalInput, "feed": FeedInput}
+
+
+def open_backend(name=None):
+    """
+    Returns the input backend of the given name, or the Tk window if it can open one and the terminal otherwise.
+    """
+    if name is not None:
+        backend = BACKENDS[name]()
+        if isinstance(backend, TkInput):
+            backend.open()
+        return backend
+    try:
+        return open_backend("tk")
+    except InputUnavailable:
+        return TerminalInput()
+
+
+shared_window = None
 
 
 def get_input_with_timeout(timeout=10):
     """
-    A function that calls and manages the input dialog for answering questions.
+    Asks for an answer in the session's answer window, returns None if the player did not answer in the time limit.
     """
-    root = tk.Tk()
-    root.withdraw()
-    input_dialog = TimedInputDialog(root, "Input", timeout)
-    root.destroy()
-    return input_dialog.result
+    global shared_window
+    if shared_window is None:
+        shared_window = TkInput()
+    return shared_window.get_answer("Enter something:", timeout)
+
+
+def measure(rounds, delay):
+    """
+    Answers rounds questions with every backend that can run here, each answer submitted delay seconds after the
+    question, and returns the reports. A Tk window is driven by its own timer, the terminal by a pipe.
+    """
+    reports = []
+
+    feed = FeedInput()
+    for _ in range(rounds):
+        threading.Timer(delay, feed.feed, ("T",)).start()
+        feed.get_answer("Feed question", 10)
+    reports.append(feed.report())
+
+    read_fd, write_fd = os.pipe()
+    terminal = TerminalInput(read_fd, prompt="")
+    for _ in range(rounds):
+        threading.Timer(delay, os.write, (write_fd, b"T\n")).start()
+        terminal.get_answer("Terminal question", 10)
+    os.close(write_fd)
+    os.close(read_fd)
+    reports.append(terminal.report())
+
+    window = TkInput()
+    try:
+        window.open()
+    except InputUnavailable as e:
+        reports.append(f"tk: not measured, {e}")
+        return reports
+
+    def type_answer():
+        window.entry.insert(0, "T")
+        window.entry.event_generate("<Return>")
+
+    for _ in range(rounds):
+        window.root.after(int(delay * 1000), type_answer)
+        window.get_answer("Tk question", 10)
+    window.close()
+    reports.append(window.report())
+
+    # What the persistent window saves: a new Tk root for every question
+    new_root_times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        root = tk.Tk()
+        root.withdraw()
+        root.update_idletasks()
+        root.destroy()
+        new_root_times.append(time.perf_counter() - start)
+    reports.append(f"tk: a new Tk root per question takes {percentile(new_root_times, 0.5) * 1000:.2f} ms "
+                   f"(p99 {percentile(new_root_times, 0.99) * 1000:.2f}) before the question is even shown")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the answer latency of the input backends.")
+    parser.add_argument("--rounds", type=int, default=50, help="the questions answered with every backend")
+    parser.add_argument("--delay", type=float, default=0.05, help="the seconds before each answer is submitted")
+    args = parser.parse_args()
 
+    for line in measure(args.rounds, args.delay):
+        print((RED if "not measured" in line else GREEN) + line + RESET)
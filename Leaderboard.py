@@ -0,0 +1,302 @@
+import argparse
+import gc
+import math
+import random
+
+"""
+The global leaderboard of the players, ranked by wins and by accuracy.
+
+Each ranking is a RankedList, an indexable skip list: adding, removing and finding the rank of a player
+are O(log n) and reading the players at given ranks costs O(log n) plus the number of players read,
+so the leaderboard is updated at the end of every game and queried without ever sorting the whole table.
+"""
+
+
+class _Infinity:
+    """The key of the skip list's tail, greater than every key."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+INFINITY = _Infinity()
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [0] * levels  # the number of positions each link skips
+
+
+class RankedList:
+    """
+    A sorted list of unique keys (an indexable skip list) with O(log n) insert, remove, rank and index.
+    The list can be built from already sorted keys in O(n), e.g. when the server starts.
+    """
+
+    def __init__(self, sorted_keys=(), max_levels=32):
+        self.size = 0
+        self.max_levels = max_levels
+        self.tail = _Node(INFINITY, 0)
+        self.head = _Node(None, max_levels)
+        self.head.next = [self.tail] * max_levels
+        self.head.width = [1] * max_levels
+        self.build(sorted_keys)
+
+    def __len__(self):
+        return self.size
+
+    def random_levels(self):
+        return min(self.max_levels, 1 - int(math.log(1.0 - random.random(), 2.0)))
+
+    def build(self, sorted_keys):
+        """
+        Fills the empty list with sorted unique keys in O(n), linking every level from left to right.
+        """
+        last = [self.head] * self.max_levels
+        last_position = [0] * self.max_levels
+        position = 0
+        for position, key in enumerate(sorted_keys, 1):
+            node = _Node(key, self.random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(self.max_levels):
+            last[level].next[level] = self.tail
+            last[level].width[level] = position + 1 - last_position[level]
+        self.size = position
+
+    def insert(self, key):
+        """
+        Adds a key, which must not already be in the list.
+        """
+        chain = [None] * self.max_levels
+        steps_at_level = [0] * self.max_levels
+        node = self.head
+        for level in reversed(range(self.max_levels)):
+            while node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self.random_levels()
+        new_node = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.max_levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        """
+        Removes a key, raises KeyError if it's not in the list.
+        """
+        chain = [None] * self.max_levels
+        node = self.head
+        for level in reversed(range(self.max_levels)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is self.tail or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.max_levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """
+        Returns the 0-based position of a key, None if it's not in the list.
+        """
+        position = 0
+        node = self.head
+        for level in reversed(range(self.max_levels)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        target = node.next[0]
+        return position if target is not self.tail and target.key == key else None
+
+    def node_at(self, index):
+        node = self.head
+        steps = index + 1
+        for level in reversed(range(self.max_levels)):
+            while node.width[level] <= steps:
+                steps -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("RankedList index out of range")
+        return self.node_at(index).key
+
+    def slice(self, start, stop):
+        """
+        Returns the keys from position start up to (but not including) position stop.
+        """
+        start = max(0, start)
+        stop = min(self.size, stop)
+        if start >= stop:
+            return []
+        node = self.node_at(start)
+        keys = []
+        for _ in range(stop - start):
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+BOARDS = ("wins", "accuracy")
+
+
+class Leaderboard:
+    """
+    Ranks the players of a Statistics (see Statistics.py) by wins and by accuracy.
+
+    The wins board is ordered by wins, then accuracy, then name. The accuracy board is ordered by accuracy,
+    then the number of rounds played, then name, and only holds the players who answered at least
+    min_rounds rounds, so a single lucky answer doesn't top it.
+    """
+
+    def __init__(self, statistics, min_rounds=10):
+        """
+        Attributes:
+            statistics (Statistics): The players' totals.
+            min_rounds (int): The rounds a player must have answered to be on the accuracy board.
+            boards (dict): The rankings {board name: RankedList}.
+            keys (dict): The current key of every player on each board {player_name: {board name: key}}.
+        """
+        self.statistics = statistics
+        self.min_rounds = min_rounds
+        self.keys = {}
+        board_keys = {board: [] for board in BOARDS}
+        # Millions of new objects and no cycles among them: the cyclic garbage collector would only slow the build
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for player_name in set(statistics.player_stats) | set(statistics.player_games_played):
+                self.keys[player_name] = self.player_keys(player_name)
+                for board, key in self.keys[player_name].items():
+                    board_keys[board].append(key)
+            self.boards = {board: RankedList(sorted(keys)) for board, keys in board_keys.items()}
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def player_keys(self, player_name):
+        """
+        Returns the keys of a player on the boards it belongs to {board name: key}.
+        """
+        summary = self.statistics.player_summary(player_name)
+        keys = {"wins": (-summary["wins"], -summary["accuracy"], player_name)}
+        if summary["rounds"] >= self.min_rounds:
+            keys["accuracy"] = (-summary["accuracy"], -summary["rounds"], player_name)
+        return keys
+
+    def update(self, player_name):
+        """
+        Moves a player to its current place on every board, in O(log n).
+        """
+        new_keys = self.player_keys(player_name)
+        old_keys = self.keys.get(player_name, {})
+        for board, ranked in self.boards.items():
+            if board in old_keys:
+                ranked.remove(old_keys[board])
+            if board in new_keys:
+                ranked.insert(new_keys[board])
+        self.keys[player_name] = new_keys
+
+    def rank(self, player_name, board="wins"):
+        """
+        Returns the 1-based rank of a player on a board, None if the player isn't on it.
+        """
+        key = self.keys.get(player_name, {}).get(board)
+        if key is None:
+            return None
+        return self.boards[board].rank(key) + 1
+
+    def entries(self, start, stop, board="wins"):
+        """
+        Returns the players ranked start + 1 to stop as summaries with their rank.
+        """
+        entries = []
+        for position, key in enumerate(self.boards[board].slice(start, stop), start + 1):
+            entry = self.statistics.player_summary(key[-1])
+            entry["rank"] = position
+            entries.append(entry)
+        return entries
+
+    def top(self, k=10, board="wins"):
+        """
+        Returns the k best players of a board.
+        """
+        return self.entries(0, k, board)
+
+    def around(self, player_name, k=2, board="wins"):
+        """
+        Returns the k players ranked above a player, the player and the k players ranked below.
+        """
+        rank = self.rank(player_name, board)
+        if rank is None:
+            return []
+        return self.entries(rank - 1 - k, rank + k, board)
+
+    def format(self, k=5, board="wins"):
+        """
+        Returns the k best players of a board as text, one player per line.
+        """
+        lines = [f"Leaderboard ({board}):"]
+        for entry in self.top(k, board):
+            lines.append(format_entry(entry))
+        return "\n".join(lines)
+
+
+def format_entry(entry):
+    """
+    Returns a leaderboard entry as a line of text.
+    """
+    return (f"{entry['rank']}. {entry['player']} - {entry['wins']} wins in {entry['games_played']} games, "
+            f"{entry['accuracy']:.1f}% correct")
+
+
+if __name__ == "__main__":
+    from Statistics import StatsStore
+
+    parser = argparse.ArgumentParser(description="Queries the leaderboard of the server's player statistics.")
+    parser.add_argument("stats", nargs="*", default=["player_stats.log"],
+                        help="the statistics logs (one per worker of a sharded server)")
+    parser.add_argument("--board", choices=BOARDS, default="wins", help="the ranking to query")
+    parser.add_argument("--top", type=int, default=10, help="show the K best players")
+    parser.add_argument("--rank", metavar="PLAYER", help="show the rank of a player")
+    parser.add_argument("--around", metavar="PLAYER", help="show the players ranked around a player")
+    parser.add_argument("--k", type=int, default=2, help="the number of players above and below for --around")
+    args = parser.parse_args()
+
+    leaderboard = StatsStore.read(args.stats).leaderboard
+    if args.rank:
+        print(f"{args.rank}: rank {leaderboard.rank(args.rank, args.board)} of {len(leaderboard.boards[args.board])}")
+    elif args.around:
+        for around_entry in leaderboard.around(args.around, args.k, args.board):
+            print(format_entry(around_entry))
+    else:
+        print(leaderboard.format(args.top, args.board))
@@ -0,0 +1,135 @@
+from Clock import Clock
+import Metrics
+
+"""
+The admission of the players to a game's lobby, shared by both servers.
+
+A lobby has a single deadline instead of a timer per join: the game starts once no one joined for the quiet
+window, once the fill window since the first join is over (so a storm of joins can't push the start back forever)
+or as soon as the lobby is full. The players who don't fit are queued for the next lobby.
+"""
+
+
+class LobbyScheduler:
+    """
+    Decides when the players of a lobby start their game: after quiet seconds without a new player, at most
+    fill_window seconds after the first player joined, or as soon as max_size players joined.
+    Only the lobby's owner calls it (the threaded server's game thread or a room's event loop), so it needs no lock.
+    """
+
+    def __init__(self, quiet=10, fill_window=None, max_size=None, clock=None):
+        """
+        Attributes:
+            quiet (float): The seconds without a new player before the game starts (the server's lobby_timeout).
+            fill_window (float): The most seconds from the first player joining to the game starting, None for no limit.
+            max_size (int): The number of players that fill the lobby, None for no limit.
+            clock (Clock): The time the lobby is measured with (see Clock.py), the real time by default.
+            size (int): The number of players in the lobby.
+            opened_at (float): The clock's time the first player joined the lobby at, None while it's empty.
+            last_join (float): The clock's time the last player joined the lobby at.
+        """
+        self.quiet = quiet
+        self.fill_window = fill_window
+        self.max_size = max_size
+        self.clock = clock or Clock()
+        self.size = 0
+        self.opened_at = None
+        self.last_join = None
+
+    def admit(self):
+        """
+        A player joined the lobby. Returns True if the lobby is full now.
+        """
+        now = self.clock.now()
+        if self.size == 0:
+            self.opened_at = now
+        self.last_join = now
+        self.size += 1
+        return self.is_full()
+
+    def leave(self):
+        """
+        A player left the lobby before its game started.
+        """
+        self.size = max(0, self.size - 1)
+        if self.size == 0:
+            self.opened_at = self.last_join = None
+
+    def is_full(self):
+        return self.max_size is not None and self.size >= self.max_size
+
+    def time_left(self):
+        """
+        Returns the seconds left until the game starts, None while the lobby is empty.
+        """
+        if self.size == 0:
+            return None
+        if self.is_full():
+            return 0.0
+        deadline = self.last_join + self.quiet
+        if self.fill_window is not None:
+            deadline = min(deadline, self.opened_at + self.fill_window)
+        return max(0.0, deadline - self.clock.now())
+
+    def is_due(self):
+        """
+        Returns True if the players of the lobby should start their game now.
+        """
+        return self.size > 0 and self.time_left() <= 0
+
+    def close(self):
+        """
+        The game started: the next players join an empty lobby. Returns the number of players of the game.
+        """
+        size = self.size
+        self.size = 0
+        self.opened_at = self.last_join = None
+        return size
+
+
+class AdmissionCounter:
+    """
+    Counts what happened to the players who connected: admitted to a lobby, queued for the next one, or rejected
+    (no name within the handshake deadline, or the queue was full).
+    """
+
+    def __init__(self, clock=None):
+        """
+        Attributes:
+            clock (Clock): The time the admission rate is measured with.
+            started_at (float): The clock's time the counting started at.
+            admitted (int): The players admitted to a lobby, queued players included once their lobby opened.
+            queued (int): The players queued because a game was running or the lobby was full.
+            rejected (int): The connections turned away.
+        """
+        self.clock = clock or Clock()
+        self.started_at = self.clock.now()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def admit(self):
+        self.admitted += 1
+        Metrics.LOBBY_ADMISSIONS.labels("admitted").inc()
+
+    def queue(self):
+        self.queued += 1
+        Metrics.LOBBY_ADMISSIONS.labels("queued").inc()
+
+    def reject(self):
+        self.rejected += 1
+        Metrics.LOBBY_ADMISSIONS.labels("rejected").inc()
+
+    def admission_rate(self):
+        """
+        Returns the players admitted per second since the counting started.
+        """
+        elapsed = self.clock.now() - self.started_at
+        return self.admitted / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """
+        Returns the counters as a dict, e.g. for AsyncServer.stats.
+        """
+        return {"admitted": self.admitted, "queued": self.queued, "rejected": self.rejected,
+                "admission_rate": round(self.admission_rate(), 1)}
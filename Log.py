@@ -0,0 +1,183 @@
+import atexit
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+"""
+The server's logging: the game never writes to the terminal itself.
+
+A log call only checks the level and the sampling, then appends the event (its name, a message template and its
+fields) to a queue, without taking any lock and without formatting anything. A background writer thread takes
+the events from the queue in batches, formats them and writes each batch to the terminal (optionally coloured)
+or to a file (one JSON object per line) with a single write, so the volume of the logs never slows down a round.
+When the queue is full the new events are dropped and counted rather than making the game wait.
+"""
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+RESET = "\033[0m"
+
+
+class Logger:
+    """
+    A queue-based logger with a background writer, see the module docstring.
+    """
+
+    def __init__(self, level=INFO, path=None, colour=None, sample_rates=None, max_queued=100000, flush_interval=0.05):
+        """
+        Attributes:
+            level (int): The lowest level written.
+            path (str): The file the events are written to as JSON lines, None for the terminal (stdout).
+            colour (bool): Whether the terminal output is coloured, None to colour it only if stdout is a terminal.
+            sample_rates (dict): The fraction of the events of a given name that are kept {event: rate}, e.g.
+                {"answer": 0.01} keeps one answer event in a hundred. Events without a rate are all kept.
+            max_queued (int): The most events waiting for the writer, new events are dropped beyond it.
+            flush_interval (float): Seconds the writer sleeps when the queue is empty.
+            queue (collections.deque): The events waiting for the writer.
+            dropped (int): The events dropped because the queue was full.
+            sampled_out (int): The events dropped by the sampling.
+        """
+        self.queue = collections.deque()
+        self.writer = None
+        self.write_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.output = None
+        self.dropped = 0
+        self.sampled_out = 0
+        self.configure(level, path, colour, sample_rates, max_queued, flush_interval)
+
+    def configure(self, level=INFO, path=None, colour=None, sample_rates=None, max_queued=100000, flush_interval=0.05):
+        """
+        Changes the logger's options (see __init__), e.g. from the command line.
+        """
+        self.flush()
+        self.level = LEVELS.get(level, level) if isinstance(level, str) else level
+        self.path = path
+        self.colour = colour
+        self.sample_rates = dict(sample_rates or {})
+        self.max_queued = max_queued
+        self.flush_interval = flush_interval
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def log(self, level, event, message, colour="", **fields):
+        """
+        Queues an event. message is a str.format template of the fields, formatted by the writer.
+        """
+        if level < self.level:
+            return
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            self.sampled_out += 1
+            return
+        if len(self.queue) >= self.max_queued:
+            self.dropped += 1
+            return
+        self.queue.append((time.time(), level, event, message, colour, fields))
+        if self.writer is None:
+            self.start()
+
+    def debug(self, event, message, colour="", **fields):
+        self.log(DEBUG, event, message, colour, **fields)
+
+    def info(self, event, message, colour="", **fields):
+        self.log(INFO, event, message, colour, **fields)
+
+    def warning(self, event, message, colour="", **fields):
+        self.log(WARNING, event, message, colour, **fields)
+
+    def error(self, event, message, colour="", **fields):
+        self.log(ERROR, event, message, colour, **fields)
+
+    def start(self):
+        """
+        Starts the writer thread (once).
+        """
+        with self.start_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name="log-writer", daemon=True)
+                self.writer.start()
+
+    def run(self):
+        while True:
+            if not self.flush():
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """
+        Writes every queued event. Returns the number of events written.
+        """
+        with self.write_lock:
+            batch = []
+            while self.queue:
+                batch.append(self.queue.popleft())
+            if not batch:
+                return 0
+            stream = self.stream()
+            stream.write("".join(self.format(record) for record in batch))
+            stream.flush()
+            return len(batch)
+
+    def stream(self):
+        if self.path is None:
+            return sys.stdout  # looked up at every write, so redirecting stdout redirects the logs
+        if self.output is None:
+            self.output = open(self.path, "a", encoding="utf-8")
+        return self.output
+
+    def format(self, record):
+        """
+        Formats an event as a line of the terminal or as a JSON line of the log file.
+        """
+        timestamp, level, event, message, colour, fields = record
+        try:
+            text = message.format(**fields)
+        except (KeyError, IndexError, ValueError):
+            text = message
+        if self.path is not None:
+            entry = {"time": round(timestamp, 6), "level": LEVEL_NAMES.get(level, level), "event": event,
+                     "message": text}
+            entry.update((name, value if isinstance(value, (int, float, str, bool, type(None))) else str(value))
+                         for name, value in fields.items())
+            return json.dumps(entry) + "\n"
+        use_colour = self.colour if self.colour is not None else sys.stdout.isatty()
+        if use_colour and colour:
+            return colour + text + RESET + "\n"
+        return text + "\n"
+
+    def after_fork(self):
+        # The writer thread doesn't exist in a forked child (e.g. a worker of ShardedServer)
+        self.writer = None
+        self.queue = collections.deque()
+        self.write_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.output = None
+
+
+LOGGER = Logger()
+atexit.register(LOGGER.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=LOGGER.after_fork)
+
+
+def configure(**options):
+    """
+    Configures the server's logger, see Logger.__init__.
+    """
+    LOGGER.configure(**options)
+
+
+debug = LOGGER.debug
+info = LOGGER.info
+warning = LOGGER.warning
+error = LOGGER.error
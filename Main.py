@@ -1,9 +1,62 @@
+import argparse
 from Server import Server
-import threading
+from AsyncServer import AsyncServer
+from ShardedServer import ShardedServer
+import Log
 
 """The starting of the game server"""
-server = Server()
-server.start_udp_broadcast()
-udp_broadcast_thread = threading.Thread(target=server.start_udp_broadcast())
-udp_broadcast_thread.start()
-server.accept_tcp_connections()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the trivia game server.")
+    parser.add_argument("--engine", choices=["async", "threaded"], default="async",
+                        help="async runs every player on one event loop, threaded is the original thread per player server")
+    parser.add_argument("--room-size", type=int, default=None,
+                        help="the number of players that fill a game, a room of the async engine or the lobby of the "
+                             "threaded one (no limit by default), the next players are queued for the next game")
+    parser.add_argument("--fill-window", type=float, default=None,
+                        help="the most seconds a lobby stays open after its first player joined (no limit by default)")
+    parser.add_argument("--max-queue", type=int, default=None,
+                        help="the most players queued for the next game, the next ones are rejected (no limit by default)")
+    parser.add_argument("--listen-backlog", type=int, default=128,
+                        help="the connections the kernel queues before the server accepts them")
+    parser.add_argument("--handshake-timeout", type=float, default=2,
+                        help="the seconds a new connection has to send its player name")
+    parser.add_argument("--max-rooms", type=int, default=None,
+                        help="the most game rooms each async server plays at once (no limit by default)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="the number of async worker processes sharing the port with SO_REUSEPORT (0 for one per core)")
+    parser.add_argument("--stats", default="player_stats.log",
+                        help="the log file of the players' statistics, an empty string to not keep them")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="export the metrics in the Prometheus text format on this local HTTP port")
+    parser.add_argument("--record", default=None, metavar="PATH",
+                        help="record every game to this session file, to replay it with Replay.py")
+    parser.add_argument("--resume-grace", type=float, default=10,
+                        help="the seconds a disconnected player's seat is kept for it to reconnect, 0 to not keep it")
+    parser.add_argument("--log-level", choices=list(Log.LEVELS), default="INFO", help="the lowest level of the logs written")
+    parser.add_argument("--log-file", default=None,
+                        help="write the logs to this file as JSON lines instead of to the terminal")
+    parser.add_argument("--no-colour", action="store_true", help="don't colour the logs written to the terminal")
+    parser.add_argument("--log-sample", action="append", default=[], metavar="EVENT=RATE",
+                        help="keep only this fraction of an event's logs, e.g. answer_timeout=0.01 (repeatable)")
+    args = parser.parse_args()
+
+    sample_rates = {}
+    for sample in args.log_sample:
+        event, _, rate = sample.partition("=")
+        sample_rates[event] = float(rate)
+    Log.configure(level=args.log_level, path=args.log_file, colour=False if args.no_colour else None,
+                  sample_rates=sample_rates)
+
+    admission_options = {"fill_window": args.fill_window, "max_queue": args.max_queue,
+                         "listen_backlog": args.listen_backlog, "handshake_timeout": args.handshake_timeout}
+    if args.engine == "threaded":
+        Server(stats_path=args.stats, metrics_port=args.metrics_port, record_path=args.record,
+               resume_grace=args.resume_grace, **admission_options, max_lobby=args.room_size)
+    elif args.workers != 1:
+        ShardedServer(workers=args.workers, room_size=args.room_size, max_rooms=args.max_rooms,
+                      stats_path=args.stats, metrics_port=args.metrics_port, record_path=args.record,
+                      resume_grace=args.resume_grace, **admission_options)
+    else:
+        AsyncServer(room_size=args.room_size, max_rooms=args.max_rooms, stats_path=args.stats,
+                    metrics_port=args.metrics_port, record_path=args.record, resume_grace=args.resume_grace,
+                    **admission_options)
@@ -0,0 +1,279 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+The game's instrumentation: counters, gauges and histograms, exported in the Prometheus text format
+on a local HTTP port (see MetricsServer), e.g. http://127.0.0.1:9100/metrics.
+
+The metrics of the game are defined once at the bottom of this file and shared by every engine and room
+of the process. Recording a value only takes the metric's own short lock, never a lock of the game.
+"""
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    The base of every metric: a name, a help text and optional label names.
+    A metric with label names holds one child per label values (see labels()).
+    """
+    kind = "untyped"
+
+    def __init__(self, name, help_text, label_names=(), registry=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.label_values = ()
+        self.children = {}
+        self.lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Returns the child of the given label values, creating it the first time.
+        """
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self.new_child()
+                child.label_values = tuple(zip(self.label_names, values))
+            return child
+
+    def samples(self):
+        """
+        Returns the (name suffix, labels, value) samples of the metric.
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        metrics = list(self.children.values()) if self.label_names else [self]
+        for metric in metrics:
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=(), registry=None):
+        super().__init__(name, help_text, label_names, registry)
+        self.value = 0
+
+    def new_child(self):
+        return Counter(self.name, self.help_text)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [("", self.label_values, self.value)]
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, label_names=(), registry=None):
+        super().__init__(name, help_text, label_names, registry)
+        self.value = 0
+
+    def new_child(self):
+        return Gauge(self.name, self.help_text)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def samples(self):
+        return [("", self.label_values, self.value)]
+
+
+class Histogram(Metric):
+    """Counts the observed values (durations in seconds) in cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names, registry)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+
+    def new_child(self):
+        return Histogram(self.name, self.help_text, buckets=self.buckets[:-1])
+
+    def observe(self, value):
+        with self.lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+            self.total += value
+
+    def time(self):
+        """
+        Returns a context manager that observes the seconds spent in its block.
+        """
+        return Timer(self)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.total
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            samples.append(("_bucket", self.label_values + (("le", format_value(bound)),), cumulative))
+        samples.append(("_sum", self.label_values, total))
+        samples.append(("_count", self.label_values, cumulative))
+        return samples
+
+
+class Timer:
+    """Observes the seconds spent in a with block on a histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MeteredSocket:
+    """
+    Wraps a client socket of the threaded server and counts the bytes sent and received through it.
+    Every other socket method is passed through.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def recv(self, buffer_size, *flags):
+        data = self.sock.recv(buffer_size, *flags)
+        BYTES_RECEIVED.inc(len(data))
+        return data
+
+    def sendall(self, data, *flags):
+        self.sock.sendall(data, *flags)
+        BYTES_SENT.inc(len(data))
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class Registry:
+    """The metrics exported together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text format.
+        """
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry on GET /metrics."""
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # a scrape every few seconds would flood the game's output
+
+
+class MetricsServer:
+    """
+    Exports a registry over HTTP from a daemon thread, so it works next to any engine.
+    """
+
+    def __init__(self, port, host="127.0.0.1", registry=None):
+        handler = type("RegistryHandler", (MetricsHandler,), {"registry": registry or REGISTRY})
+        self.http_server = ThreadingHTTPServer((host, port), handler)
+        self.http_server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.http_server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+
+REGISTRY = Registry()
+
+# The metrics of the game
+ROUND_DURATION = Histogram("trivia_round_duration_seconds",
+                           "Seconds from sending a question to the end of its results.", registry=REGISTRY)
+EVALUATE_DURATION = Histogram("trivia_evaluate_seconds",
+                              "Seconds spent in evaluate_and_update_scores.", registry=REGISTRY)
+STATE_EVENT_DELAY = Histogram("trivia_state_event_delay_seconds",
+                              "Seconds from a handler posting an event to the threaded server's game thread applying it.",
+                              registry=REGISTRY)
+ROUND_GAP = Histogram("trivia_round_gap_seconds",
+                      "Seconds from the end of a round's answers to the next question of the game.", registry=REGISTRY)
+BYTES_SENT = Counter("trivia_bytes_sent_total", "Bytes sent to the players.", registry=REGISTRY)
+BYTES_RECEIVED = Counter("trivia_bytes_received_total", "Bytes received from the players.", registry=REGISTRY)
+ANSWER_TIMEOUTS = Counter("trivia_answer_timeouts_total",
+                          "Players that timed out or disconnected while the server waited for their answer.",
+                          registry=REGISTRY)
+LOBBY_ADMISSIONS = Counter("trivia_lobby_admissions_total",
+                           "Players who connected, by outcome: admitted to a lobby, queued for the next one or rejected.",
+                           label_names=("outcome",), registry=REGISTRY)
+CONNECTIONS = Gauge("trivia_connections", "Live player connections.", registry=REGISTRY)
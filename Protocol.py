@@ -0,0 +1,287 @@
+import codecs
+import collections
+import struct
+
+"""
+The framed wire protocol between the server and the clients.
+
+Every message is a frame: a header with a magic byte, the protocol version, the message kind and the
+payload length, followed by the UTF-8 payload. The magic byte can never start a UTF-8 text, so a client can tell
+a framed server from an old text server by the first byte it receives.
+
+The protocol is negotiated in the name handshake: a new client sends its name followed by HANDSHAKE_TOKEN on the
+next line. A server that accepts it answers with a HELLO frame, old clients that send only their name keep
+getting the free text messages. A framed player also gets a SESSION frame with its session token: after a
+dropped connection, it sends the token on a RESUME_PREFIX line of a new handshake to get its seat back
+(see Sessions.py).
+"""
+
+FRAME_MAGIC = 0xA5
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct('!BBBI')  # magic, version, kind, payload length
+MAX_PAYLOAD = 1 << 20
+HANDSHAKE_TOKEN = f"TRIVIA/{PROTOCOL_VERSION}"
+RESUME_PREFIX = "RESUME "
+
+# Message kinds
+TEXT = 0  # a free text message of the old protocol
+HELLO = 1  # server -> client: the framed protocol is accepted, the payload is the player's (assigned) name
+QUESTION = 2  # server -> client: a question to answer
+ANSWER = 3  # client -> server: the answer to the current question
+RESULT = 4  # server -> client: the results of a round
+WINNER = 5  # server -> client: the game is over, the payload announces the winner
+ROSTER = 6  # server -> client: the players of the game, one name per line, sent with the first question
+ROSTER_DELTA = 7  # server -> client: the players out since the last question, see encode_roster_delta
+SESSION = 8  # server -> client: the session token to reconnect with, sent right after HELLO
+
+# The UDP offer: magic cookie, message type, server name (32 bytes) and the server's TCP port
+OFFER = struct.Struct('!Ib32sH')
+OFFER_MAGIC_COOKIE = 0xabcddcba
+OFFER_MESSAGE_TYPE = 0x2
+
+# The load extension, sent right after each offer: magic cookie, message type, the server's TCP port, free seats,
+# active rooms and round phase. It has the size of an offer and its own message type, so old clients that only
+# accept OFFER_MESSAGE_TYPE unpack it and skip it.
+LOAD = struct.Struct('!IbHIHB25x')
+LOAD_MESSAGE_TYPE = 0x3
+FREE_SEATS_UNLIMITED = 0xFFFFFFFF
+
+# Round phases in the load extension
+PHASE_LOBBY = 0
+PHASE_QUESTION = 1
+PHASE_RESULTS = 2
+
+KIND_NAMES = {TEXT: "TEXT", HELLO: "HELLO", QUESTION: "QUESTION", ANSWER: "ANSWER",
+              RESULT: "RESULT", WINNER: "WINNER", ROSTER: "ROSTER", ROSTER_DELTA: "ROSTER_DELTA",
+              SESSION: "SESSION"}
+
+# How a player left the game in a ROSTER_DELTA
+ELIMINATED = "-"  # answered wrong
+DISCONNECTED = "!"  # didn't answer in time or disconnected
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends bytes that are not a valid frame."""
+
+
+def encode_frame(kind, payload):
+    """
+    Encodes a single frame. payload is a str (encoded as UTF-8) or bytes.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, kind, len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    An incremental frame decoder. Bytes are fed as they arrive from the socket, split or coalesced frames
+    are handled, and every complete frame is returned as a (kind, text) tuple.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds the received data to the buffer and returns the list of frames completed by it.
+        """
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            magic, version, kind, length = HEADER.unpack_from(self.buffer)
+            if magic != FRAME_MAGIC:
+                raise ProtocolError(f"Bad frame magic {magic:#x}")
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"Unsupported protocol version {version}")
+            if length > MAX_PAYLOAD:
+                raise ProtocolError(f"Frame of {length} bytes is too long")
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append((kind, bytes(self.buffer[HEADER.size:end]).decode('utf-8')))
+            del self.buffer[:end]
+        return frames
+
+
+class TextCodec:
+    """
+    The old free text protocol: a message is its text, the kind is only known to the sender.
+    The roster is part of the question text in this protocol, so ROSTER messages are not sent.
+
+    Attributes:
+        decoder (codecs.IncrementalDecoder): Keeps the first bytes of a UTF-8 character split between two reads.
+        undelivered (collections.deque): The messages received but not read yet (see take_message).
+    """
+    framed = False
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.undelivered = collections.deque()
+
+    def encode(self, kind, text):
+        if kind in (ROSTER, ROSTER_DELTA, HELLO, SESSION):
+            return b''
+        return text.encode()
+
+    def feed(self, data):
+        text = self.decoder.decode(data)
+        return [(TEXT, text)] if text else []
+
+
+class FrameCodec:
+    """
+    The framed protocol, see encode_frame and FrameDecoder.
+
+    Attributes:
+        decoder (FrameDecoder): Keeps the partial frame received last.
+        undelivered (collections.deque): The frames received but not read yet (see take_message).
+    """
+    framed = True
+
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.undelivered = collections.deque()
+
+    def encode(self, kind, text):
+        return encode_frame(kind, text)
+
+    def feed(self, data):
+        return self.decoder.feed(data)
+
+
+def build_hello(player_name, session_token=None):
+    """
+    Builds the client's side of the name handshake, which offers the framed protocol to the server.
+    A player reconnecting to its game adds the session token the server gave it.
+    """
+    hello = player_name.strip('\n') + "\n" + HANDSHAKE_TOKEN + "\n"
+    if session_token:
+        hello += RESUME_PREFIX + session_token + "\n"
+    return hello.encode()
+
+
+def parse_hello(data):
+    """
+    Parses the name handshake received by the server.
+    Returns the player name and the codec to talk to that player with.
+    """
+    lines = data.decode().strip().split('\n')
+    player_name = lines[0].strip()
+    if HANDSHAKE_TOKEN in (line.strip() for line in lines[1:]):
+        return player_name, FrameCodec()
+    return player_name, TextCodec()
+
+
+def parse_resume(data):
+    """
+    Returns the session token of a handshake from a reconnecting player, None for a new player.
+    """
+    for line in data.decode().split('\n')[2:]:
+        if line.startswith(RESUME_PREFIX):
+            return line[len(RESUME_PREFIX):].strip()
+    return None
+
+
+def encode_roster_delta(eliminated, disconnected):
+    """
+    Builds the payload of a ROSTER_DELTA: a line per player out of the game since the last question, ELIMINATED
+    or DISCONNECTED followed by the player's position in the ROSTER of the game (from 0).
+    The names are only sent once, in the ROSTER with the first question, so a player out costs 2 to 5 bytes.
+    """
+    return "\n".join([f"{ELIMINATED}{position}" for position in eliminated]
+                     + [f"{DISCONNECTED}{position}" for position in disconnected])
+
+
+def apply_roster_delta(roster, players_left, payload):
+    """
+    Takes the players of a ROSTER_DELTA payload out of a client's view of the game: roster is the list of names
+    of the game's ROSTER and players_left the set of names still in the game.
+    Returns (eliminated, disconnected), the names of the players who answered wrong and of those who left.
+    """
+    eliminated = []
+    disconnected = []
+    for line in payload.split("\n"):
+        if not line:
+            continue
+        player_name = roster[int(line[1:])]
+        (eliminated if line[0] == ELIMINATED else disconnected).append(player_name)
+        players_left.discard(player_name)
+    return eliminated, disconnected
+
+
+def detect_codec(first_data):
+    """
+    Picks the codec from the first bytes a client receives from the server.
+    """
+    if first_data and first_data[0] == FRAME_MAGIC:
+        return FrameCodec()
+    return TextCodec()
+
+
+def build_offer(server_name, server_port):
+    """
+    Builds a UDP offer, the server name is padded to 32 bytes.
+    """
+    return OFFER.pack(OFFER_MAGIC_COOKIE, OFFER_MESSAGE_TYPE, server_name.ljust(32).encode('utf-8'), server_port)
+
+
+def parse_offer(data):
+    """
+    Parses a UDP offer. Returns the server name and port, or None if the data is not a valid offer.
+    """
+    if len(data) < OFFER.size:
+        return None
+    magic_cookie, message_type, server_name, server_port = OFFER.unpack_from(data)
+    if magic_cookie != OFFER_MAGIC_COOKIE or message_type != OFFER_MESSAGE_TYPE:
+        return None
+    return server_name.decode('utf-8', 'replace').rstrip(), server_port
+
+
+def build_load(server_port, free_seats, active_rooms, phase):
+    """
+    Builds the load extension of an offer.
+    """
+    return LOAD.pack(OFFER_MAGIC_COOKIE, LOAD_MESSAGE_TYPE, server_port, min(free_seats, FREE_SEATS_UNLIMITED),
+                     min(active_rooms, 0xFFFF), phase)
+
+
+def parse_load(data):
+    """
+    Parses the load extension of an offer.
+    Returns the server port, free seats, active rooms and round phase, or None if the data is not a load extension.
+    """
+    if len(data) < LOAD.size:
+        return None
+    magic_cookie, message_type, server_port, free_seats, active_rooms, phase = LOAD.unpack_from(data)
+    if magic_cookie != OFFER_MAGIC_COOKIE or message_type != LOAD_MESSAGE_TYPE:
+        return None
+    return server_port, free_seats, active_rooms, phase
+
+
+def take_message(codec, kinds):
+    """
+    Returns the text of the first message of one of the given kinds the codec received but wasn't read yet,
+    None if there is none. The messages of other kinds before it are dropped, the ones after it stay in
+    codec.undelivered for the next read, so a message coalesced with another one in the same recv isn't lost.
+    """
+    while codec.undelivered:
+        kind, text = codec.undelivered.popleft()
+        if kind in kinds:
+            return text
+    return None
+
+
+def receive_message_text(client_socket, codec, kinds=(ANSWER, TEXT)):
+    """
+    Reads from a blocking socket until a message of one of the given kinds is complete and returns its text.
+    Raises ConnectionError if the peer closed the connection.
+    """
+    text = take_message(codec, kinds)
+    while text is None:
+        data = client_socket.recv(1024)
+        if not data:
+            raise ConnectionError("connection closed")
+        codec.undelivered.extend(codec.feed(data))
+        text = take_message(codec, kinds)
+    return text
@@ -0,0 +1,263 @@
+import argparse
+import importlib.util
+import mmap
+import os
+import struct
+
+"""
+A compact, indexed question bank.
+
+The bank file is memory-mapped, so opening it only reads its header and index tables, no matter how many
+questions it holds. A question is read from the file the first time it's asked.
+
+File layout (big-endian):
+    header: magic, version, question count, offset of the index tables, offset of the string table
+    records: one fixed-size record per question (text offset, text length, answer, category id, difficulty)
+    index tables: the categories (name and the ids of their questions) and the difficulty levels (level and ids)
+    id arrays: the question ids of every category and difficulty level
+    string table: the UTF-8 texts of all the questions
+"""
+
+MAGIC = b'TQB1'
+VERSION = 1
+HEADER = struct.Struct('!4sHIII')  # magic, version, question count, index tables offset, string table offset
+RECORD = struct.Struct('!IHBBB')  # text offset, text length, answer (1 true / 0 false), category id, difficulty
+ID = struct.Struct('!I')
+TABLE_COUNT = struct.Struct('!H')
+CATEGORY_NAME = struct.Struct('!H')  # followed by the name and an ID_RANGE
+DIFFICULTY = struct.Struct('!B')  # followed by an ID_RANGE
+ID_RANGE = struct.Struct('!II')  # offset of the id array, number of ids
+
+TRUE_ANSWER = ['Y', 'T', '1']
+FALSE_ANSWER = ['N', 'F', '0']
+DEFAULT_CATEGORY = "General"
+UNKNOWN_DIFFICULTY = 0
+
+
+class QuestionBankError(Exception):
+    """Raised when a question bank file is not valid."""
+
+
+def build_bank(questions, default_category=DEFAULT_CATEGORY):
+    """
+    Builds the bytes of a bank file from a list of question dicts ({'question', 'answer'} and optionally
+    'category' and 'difficulty'), the format of Questions.py.
+    Questions without a category get default_category.
+    """
+    categories = {}
+    difficulties = {}
+    records = []
+    strings = bytearray()
+    for question_id, question in enumerate(questions):
+        text = question['question'].encode('utf-8')
+        answer = 1 if str(question['answer'][0]).upper() in TRUE_ANSWER else 0
+        category = question.get('category', default_category)
+        category_id = list(categories).index(category) if category in categories else len(categories)
+        categories.setdefault(category, []).append(question_id)
+        if len(categories) > 255:
+            raise QuestionBankError("A bank can't have more than 255 categories")
+        difficulty = int(question.get('difficulty', UNKNOWN_DIFFICULTY))
+        difficulties.setdefault(difficulty, []).append(question_id)
+        records.append(RECORD.pack(len(strings), len(text), answer, category_id, difficulty))
+        strings += text
+
+    tables_offset = HEADER.size + RECORD.size * len(records)
+    tables_size = (TABLE_COUNT.size * 2
+                   + sum(CATEGORY_NAME.size + len(name.encode('utf-8')) + ID_RANGE.size for name in categories)
+                   + (DIFFICULTY.size + ID_RANGE.size) * len(difficulties))
+    ids_offset = tables_offset + tables_size
+
+    tables = bytearray(TABLE_COUNT.pack(len(categories)))
+    ids = bytearray()
+    for name, question_ids in categories.items():
+        encoded_name = name.encode('utf-8')
+        tables += CATEGORY_NAME.pack(len(encoded_name)) + encoded_name
+        tables += ID_RANGE.pack(ids_offset + len(ids), len(question_ids))
+        ids += b''.join(ID.pack(question_id) for question_id in question_ids)
+    tables += TABLE_COUNT.pack(len(difficulties))
+    for difficulty, question_ids in sorted(difficulties.items()):
+        tables += DIFFICULTY.pack(difficulty) + ID_RANGE.pack(ids_offset + len(ids), len(question_ids))
+        ids += b''.join(ID.pack(question_id) for question_id in question_ids)
+
+    strings_offset = ids_offset + len(ids)
+    header = HEADER.pack(MAGIC, VERSION, len(records), tables_offset, strings_offset)
+    return header + b''.join(records) + bytes(tables) + bytes(ids) + bytes(strings)
+
+
+def load_questions_module(path):
+    """
+    Loads the questions list of a python questions file like Questions.py.
+    """
+    spec = importlib.util.spec_from_file_location("questions_module", path)
+    questions_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(questions_module)
+    return questions_module.questions
+
+
+class QuestionBank:
+    """
+    A read-only view of a bank file (or of the bytes built by build_bank).
+    Questions are read by id in O(1), and the ids of a category or of a difficulty level are read from
+    their index without scanning the bank.
+    """
+
+    def __init__(self, data):
+        """
+        Attributes:
+            data (bytes or mmap.mmap): The bank.
+            question_count (int): The number of questions in the bank.
+            categories (dict): {category name: (category id, ids offset, number of ids)}.
+            difficulties (dict): {difficulty level: (ids offset, number of ids)}.
+        """
+        self.data = data
+        if len(data) < HEADER.size:
+            raise QuestionBankError("The question bank is too short")
+        magic, version, self.question_count, tables_offset, self.strings_offset = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise QuestionBankError("Not a question bank, or an unsupported version")
+
+        self.categories = {}
+        self.category_names = []
+        position = tables_offset
+        (category_count,) = TABLE_COUNT.unpack_from(data, position)
+        position += TABLE_COUNT.size
+        for category_id in range(category_count):
+            (name_length,) = CATEGORY_NAME.unpack_from(data, position)
+            position += CATEGORY_NAME.size
+            name = bytes(data[position:position + name_length]).decode('utf-8')
+            position += name_length
+            ids_offset, ids_count = ID_RANGE.unpack_from(data, position)
+            position += ID_RANGE.size
+            self.categories[name] = (category_id, ids_offset, ids_count)
+            self.category_names.append(name)
+
+        self.difficulties = {}
+        (difficulty_count,) = TABLE_COUNT.unpack_from(data, position)
+        position += TABLE_COUNT.size
+        for _ in range(difficulty_count):
+            (difficulty,) = DIFFICULTY.unpack_from(data, position)
+            ids_offset, ids_count = ID_RANGE.unpack_from(data, position + DIFFICULTY.size)
+            position += DIFFICULTY.size + ID_RANGE.size
+            self.difficulties[difficulty] = (ids_offset, ids_count)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-maps a bank file.
+        """
+        with open(path, 'rb') as bank_file:
+            return cls(mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_questions(cls, questions):
+        """
+        Builds an in-memory bank from a list of question dicts.
+        """
+        return cls(build_bank(questions))
+
+    def record(self, question_id):
+        """
+        Returns the record of a question: (text offset, text length, answer, category id, difficulty).
+        """
+        if not 0 <= question_id < self.question_count:
+            raise IndexError(f"No question {question_id} in the bank")
+        return RECORD.unpack_from(self.data, HEADER.size + RECORD.size * question_id)
+
+    def question(self, question_id):
+        """
+        Returns a question as a dict, the format of Questions.py.
+        """
+        text_offset, text_length, answer, category_id, difficulty = self.record(question_id)
+        start = self.strings_offset + text_offset
+        return {'question': bytes(self.data[start:start + text_length]).decode('utf-8'),
+                'answer': list(TRUE_ANSWER if answer else FALSE_ANSWER),
+                'category': self.category_names[category_id],
+                'difficulty': difficulty}
+
+    def index(self, category=None, difficulty=None):
+        """
+        Returns the (ids offset, number of ids) of a category or a difficulty level, None for the whole bank.
+        """
+        if category is not None:
+            if category not in self.categories:
+                raise KeyError(f"No category {category!r} in the bank")
+            return self.categories[category][1:]
+        if difficulty is not None:
+            return self.difficulties.get(difficulty, (0, 0))
+        return None
+
+    def indexed_id(self, index, position):
+        """
+        Returns the question id at the given position of an index, or the position itself for the whole bank.
+        """
+        if index is None:
+            return position
+        return ID.unpack_from(self.data, index[0] + ID.size * position)[0]
+
+    def deck(self, rng, category=None, difficulty=None):
+        """
+        Returns a new shuffled deck of the bank's questions, optionally of a single category and/or difficulty.
+        """
+        if category is not None:
+            index = self.index(category=category)
+        else:
+            index = self.index(difficulty=difficulty)
+        size = self.question_count if index is None else index[1]
+        return QuestionDeck(self, index, size, rng, difficulty if category is not None else None)
+
+
+class QuestionDeck:
+    """
+    A shuffled deck over an index of the bank, drawn without repeats.
+
+    The deck is a lazy Fisher-Yates shuffle: drawing swaps a random remaining position with the current one,
+    and only the swapped positions are kept, so creating a deck is O(1) and every draw is O(1) in time and memory.
+    """
+
+    def __init__(self, bank, index, size, rng, difficulty=None):
+        self.bank = bank
+        self.index = index
+        self.size = size
+        self.rng = rng
+        self.difficulty = difficulty
+        self.drawn = 0
+        self.swaps = {}
+
+    def remaining(self):
+        return self.size - self.drawn
+
+    def draw(self):
+        """
+        Returns the id of the next question of the deck, None once the deck is empty.
+        """
+        while self.drawn < self.size:
+            position = self.rng.randrange(self.drawn, self.size)
+            picked = self.swaps.get(position, position)
+            self.swaps[position] = self.swaps.pop(self.drawn, self.drawn)
+            self.drawn += 1
+            question_id = self.bank.indexed_id(self.index, picked)
+            # A deck of a category and a difficulty skips the category's questions of other levels
+            if self.difficulty is None or self.bank.record(question_id)[4] == self.difficulty:
+                return question_id
+        return None
+
+
+def convert(source, destination, default_category=DEFAULT_CATEGORY):
+    """
+    Converts a python questions file (like Questions.py) to a bank file.
+    """
+    questions = load_questions_module(source)
+    data = build_bank(questions, default_category)
+    with open(destination, 'wb') as bank_file:
+        bank_file.write(data)
+    return len(questions), len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts a python questions file to a question bank file.")
+    parser.add_argument("source", help="the python questions file, e.g. Questions.py")
+    parser.add_argument("destination", help="the bank file to write, e.g. questions.tqb")
+    parser.add_argument("--category", default=DEFAULT_CATEGORY, help="the category of questions that don't have one")
+    args = parser.parse_args()
+    count, size = convert(os.path.abspath(args.source), args.destination, args.category)
+    print(f"Wrote {count} questions ({size} bytes) to {args.destination}")
@@ -1,37 +1,63 @@
 import os
 import random
-import importlib.util
+from QuestionBank import QuestionBank, load_questions_module
+
+# The banks already loaded {path: QuestionBank}, shared by all the rooms of the server
+_banks = {}
 
 
 class QuestionManager:
     """
     A class that manages the connection between the Questions and the game server.
+    The questions come from a question bank (see QuestionBank.py): either a bank file (.tqb) or a python file
+    like Questions.py. Each game draws its questions from a shuffled deck, so no question repeats in a game.
     """
-    def __init__(self, questions_filename='questions.py'):
+    def __init__(self, questions_filename='Questions.py', category=None, difficulty=None, seed=None):
         # Dynamically set the path to the questions file
         dir_path = os.path.dirname(os.path.realpath(__file__))  # Gets the directory where this script is located
         self.question_file = os.path.join(dir_path, questions_filename)
+        self.category = category
+        self.difficulty = difficulty
+        self.rng = random.Random(seed)
+        self.bank = None
+        self.deck = None
         self.questions = []
         self.load_questions()
         self.current_question = None
+        self.current_question_id = None
 
     def load_questions(self):
-        """Loads the questions from the Question.py file"""
+        """Loads the question bank, a bank file or a python file like Questions.py"""
         try:
-            spec = importlib.util.spec_from_file_location("questions_module", self.question_file)
-            questions_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(questions_module)
-            self.questions = questions_module.questions  # Make sure this line correctly assigns the questions
+            if self.question_file not in _banks:
+                if self.question_file.endswith('.py'):
+                    _banks[self.question_file] = QuestionBank.from_questions(load_questions_module(self.question_file))
+                else:
+                    _banks[self.question_file] = QuestionBank.open(self.question_file)
+            self.bank = _banks[self.question_file]
+            self.questions = range(self.bank.question_count)
+            self.new_game()
         except Exception as e:
             print(f"Error loading questions: {e}")
 
+    def new_game(self):
+        """Starts a new shuffled deck of questions, called at the start of each game"""
+        if self.bank is not None:
+            self.deck = self.bank.deck(self.rng, self.category, self.difficulty)
+
     def get_random_question(self):
-        """Returns a random question from the questions"""
-        if self.questions:
-            self.current_question = random.choice(self.questions)
-            return self.current_question['question']
-        else:
+        """Returns the next question of the deck, a new deck is shuffled once every question was asked"""
+        if self.deck is None:
+            return "No questions available."
+        question_id = self.deck.draw()
+        if question_id is None:
+            self.new_game()
+            question_id = self.deck.draw()
+        if question_id is None:
             return "No questions available."
+        self.current_question = self.bank.question(question_id)
+        self.current_question_id = question_id
+        return self.current_question['question']
 
     def get_correct_answer(self):
         """returns the correct answer for the current question"""
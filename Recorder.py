@@ -0,0 +1,275 @@
+import random
+import threading
+import time
+
+"""
+The game session recorder: every join, game, question, answer, result and winner of a server is written to a
+compact binary session file, so a real game can be replayed offline (see Replay.py).
+
+A session file starts with a header (SESSION_MAGIC, the format version and the question file of the server)
+followed by the records. A record is its kind (one byte), the microseconds since the previous record
+(monotonic clock), the game it belongs to, and its fields. Numbers are unsigned varints (7 bits per byte) and
+strings are a varint length followed by UTF-8, so most records take 4 to 8 bytes. A player is written as a
+number: a NAME record gives the player's name the first time it's seen.
+"""
+
+SESSION_MAGIC = b"TRVS"
+SESSION_VERSION = 1
+
+# The kinds of records and their fields (after the time and the game)
+NAME = 0  # player, name
+JOIN = 1  # player (the game is 0: the player's game isn't known yet)
+GAME = 2  # seed, player count, players
+QUESTION = 3  # round, question id
+ANSWER = 4  # player, answer
+TIMEOUT = 5  # player (didn't answer in time or disconnected)
+RESULT = 6  # round, player count, the players still in the game
+FINISH = 7  # winner + 1, 0 if no one won
+
+KIND_NAMES = {NAME: "name", JOIN: "join", GAME: "game", QUESTION: "question", ANSWER: "answer",
+              TIMEOUT: "timeout", RESULT: "result", FINISH: "finish"}
+
+
+class SessionFileError(ValueError):
+    """The file isn't a session file, or a version this code can't read."""
+
+
+def encode_varint(value, out):
+    """
+    Appends an unsigned int to a bytearray, 7 bits per byte.
+    """
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, position):
+    """
+    Reads an unsigned int at data[position], returns (value, position after it).
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def encode_string(text, out):
+    raw = text.encode()
+    encode_varint(len(raw), out)
+    out += raw
+
+
+def decode_string(data, position):
+    length, position = decode_varint(data, position)
+    return data[position:position + length].decode(), position + length
+
+
+class SessionRecorder:
+    """
+    Records the games of a server (every room of the asyncio engine, or the threaded server) to a session file.
+
+    The records are packed into a memory buffer, which is written to the file once a game is over or the
+    buffer is full, so recording a round costs a few microseconds and no disk access.
+    """
+
+    def __init__(self, path, question_file="Questions.py", buffer_size=65536):
+        """
+        Attributes:
+            path (str): The session file.
+            question_file (str): The question file of the server, written in the header for the replay.
+            buffer_size (int): The bytes buffered before they are written to the file.
+            buffer (bytearray): The records not written yet.
+            player_ids (dict): The number of every player already named in the file {player_name: id}.
+            next_game (int): The number of the next game, games are numbered from 1.
+            records (int): The number of records written.
+        """
+        self.path = path
+        self.question_file = question_file
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.player_ids = {}
+        self.next_game = 1
+        self.records = 0
+        self.last_time = time.monotonic_ns()
+        self.lock = threading.Lock()
+        self.session_file = None
+
+    @classmethod
+    def open(cls, path, question_file="Questions.py"):
+        """
+        Creates (or replaces) a session file and writes its header.
+        """
+        recorder = cls(path, question_file)
+        recorder.session_file = open(path, "wb")
+        recorder.buffer += SESSION_MAGIC
+        recorder.buffer.append(SESSION_VERSION)
+        encode_string(question_file, recorder.buffer)
+        recorder.flush()
+        return recorder
+
+    def record(self, kind, game, *fields):
+        """
+        Appends a record of the given kind, its fields are ints. A full buffer is written to the file first.
+        Must be called with self.lock held.
+        """
+        if len(self.buffer) >= self.buffer_size:
+            self.write_buffer()
+        now = time.monotonic_ns()
+        out = self.buffer
+        out.append(kind)
+        encode_varint((now - self.last_time) // 1000, out)
+        encode_varint(game, out)
+        self.last_time = now
+        for field in fields:
+            encode_varint(field, out)
+        self.records += 1
+
+    def player_id(self, player_name):
+        """
+        Returns the number of a player, naming it in the file the first time.
+        Must be called with self.lock held.
+        """
+        player_id = self.player_ids.get(player_name)
+        if player_id is None:
+            player_id = self.player_ids[player_name] = len(self.player_ids)
+            self.record(NAME, 0, player_id)
+            encode_string(player_name, self.buffer)
+        return player_id
+
+    def join(self, player_name):
+        with self.lock:
+            self.record(JOIN, 0, self.player_id(player_name))
+
+    def start_game(self, players):
+        """
+        Records the start of a game of the given players and returns (game number, seed).
+        The caller seeds the game's QuestionManager with the seed, so the replay draws the same questions.
+        """
+        seed = random.getrandbits(32)
+        with self.lock:
+            game = self.next_game
+            self.next_game += 1
+            player_ids = [self.player_id(player_name) for player_name in players]
+            self.record(GAME, game, seed, len(player_ids), *player_ids)
+        return game, seed
+
+    def question(self, game, round_number, question_id):
+        with self.lock:
+            self.record(QUESTION, game, round_number, question_id)
+
+    def answer(self, game, player_name, answer):
+        with self.lock:
+            self.record(ANSWER, game, self.player_id(player_name))
+            encode_string(str(answer), self.buffer)
+
+    def timeout(self, game, player_name):
+        with self.lock:
+            self.record(TIMEOUT, game, self.player_id(player_name))
+
+    def result(self, game, round_number, players):
+        with self.lock:
+            player_ids = sorted(self.player_id(player_name) for player_name in players)
+            self.record(RESULT, game, round_number, len(player_ids), *player_ids)
+
+    def finish(self, game, winner):
+        """
+        Records the end of a game (winner is None if no one won) and writes the buffer to the file.
+        """
+        with self.lock:
+            self.record(FINISH, game, 0 if winner is None else self.player_id(winner) + 1)
+        self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records to the file.
+        """
+        with self.lock:
+            self.write_buffer()
+            if self.session_file is not None:
+                self.session_file.flush()
+
+    def write_buffer(self):
+        if self.buffer and self.session_file is not None:
+            self.session_file.write(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        if self.session_file is not None:
+            self.flush()
+            self.session_file.close()
+            self.session_file = None
+
+
+def read_session(path):
+    """
+    Reads a session file. Returns (question file, records), each record is a tuple
+    (kind, seconds since the start of the session, game, fields) with the players as names.
+    An incomplete last record (the server stopped in the middle of writing it) is skipped.
+    """
+    with open(path, "rb") as session_file:
+        data = session_file.read()
+    if data[:len(SESSION_MAGIC)] != SESSION_MAGIC:
+        raise SessionFileError(f"{path} is not a session file")
+    if data[len(SESSION_MAGIC)] != SESSION_VERSION:
+        raise SessionFileError(f"{path} has session version {data[len(SESSION_MAGIC)]}, expected {SESSION_VERSION}")
+    question_file, position = decode_string(data, len(SESSION_MAGIC) + 1)
+
+    names = {}
+    records = []
+    elapsed = 0
+    end = len(data)
+    try:
+        while position < end:
+            kind = data[position]
+            delta, position = decode_varint(data, position + 1)
+            game, position = decode_varint(data, position)
+            elapsed += delta
+            if kind == NAME:
+                player_id, position = decode_varint(data, position)
+                names[player_id], position = decode_string(data, position)
+                continue
+            if kind in (JOIN, TIMEOUT):
+                player_id, position = decode_varint(data, position)
+                fields = (names[player_id],)
+            elif kind == GAME:
+                seed, position = decode_varint(data, position)
+                players, position = read_players(data, position, names)
+                fields = (seed, players)
+            elif kind == QUESTION:
+                round_number, position = decode_varint(data, position)
+                question_id, position = decode_varint(data, position)
+                fields = (round_number, question_id)
+            elif kind == ANSWER:
+                player_id, position = decode_varint(data, position)
+                answer, position = decode_string(data, position)
+                fields = (names[player_id], answer)
+            elif kind == RESULT:
+                round_number, position = decode_varint(data, position)
+                players, position = read_players(data, position, names)
+                fields = (round_number, players)
+            elif kind == FINISH:
+                winner, position = decode_varint(data, position)
+                fields = (names[winner - 1] if winner else None,)
+            else:
+                raise SessionFileError(f"Unknown record kind {kind} at byte {position} of {path}")
+            if position > end:
+                break
+            records.append((kind, elapsed / 1e6, game, fields))
+    except (IndexError, KeyError, UnicodeDecodeError):
+        pass  # the incomplete last record
+    return question_file, records
+
+
+def read_players(data, position, names):
+    count, position = decode_varint(data, position)
+    players = []
+    for _ in range(count):
+        player_id, position = decode_varint(data, position)
+        players.append(names[player_id])
+    return players, position
@@ -0,0 +1,153 @@
+import argparse
+import cProfile
+import pstats
+import sys
+import time
+from Server import Server, RED, GREEN, YELLOW, RESET
+from QuestionManager import QuestionManager
+from Recorder import read_session, GAME, QUESTION, ANSWER, TIMEOUT, RESULT, FINISH
+import Log
+
+"""
+Replays a recorded game session (see Recorder.py) through the game logic of Server, as fast as possible.
+"""
+
+
+class ReplayEngine:
+    """
+    Feeds the games of a session file back into the game logic, without sockets, threads or timers.
+
+    Each game's QuestionManager is seeded with the recorded seed, so the same questions are drawn, and the
+    recorded answers and timeouts are given to evaluate_and_update_scores round by round. The players left after
+    each round and the winner are checked against the recording, so the replay doubles as a regression test
+    and a profile of real traffic.
+    """
+
+    def __init__(self, path, stats_path=None):
+        """
+        Attributes:
+            path (str): The session file.
+            question_file (str): The question file the games were played with.
+            games (dict): The records of every game of the session, in order {game: [records]}.
+            server (Server): The game logic the games are replayed through (never started).
+            mismatches (list): The differences with the recording (game, round, what, recorded, replayed).
+            games_replayed, rounds_replayed, answers_replayed (int): What was replayed.
+        """
+        self.path = path
+        self.question_file, records = read_session(path)
+        self.games = {}
+        for record in records:
+            if record[2]:
+                self.games.setdefault(record[2], []).append(record)
+        self.server = Server(autostart=False, stats_path=stats_path)
+        self.server.qm = QuestionManager(self.question_file)
+        self.mismatches = []
+        self.games_replayed = 0
+        self.rounds_replayed = 0
+        self.answers_replayed = 0
+
+    def run(self):
+        """
+        Replays every game of the session. Returns the seconds it took.
+        """
+        start = time.perf_counter()
+        for game, records in self.games.items():
+            self.replay_game(game, records)
+        return time.perf_counter() - start
+
+    def replay_game(self, game, records):
+        """
+        Replays the records of a single game, in the order they were recorded.
+        """
+        server = self.server
+        players = []
+        question_time = 0.0
+        round_open = False
+        for kind, at, _, fields in records:
+            if kind == GAME:
+                seed, players = fields
+                server.qm.rng.seed(seed)
+                server.connected_clients = [(player_name, None) for player_name in players]
+                server.correct_players = set(players)
+                server.General_round = 1
+                server.prepared_round = None
+                server.round_answers.clear()
+            elif kind == QUESTION:
+                round_number, question_id = fields
+                server.round_answers.clear()
+                server.answer_latencies.clear()
+                if round_number == 1:
+                    server.broadcast_game_start()
+                else:
+                    server.General_round = round_number
+                    server.broadcast_question()
+                server.General_round = round_number + 1
+                if server.qm.current_question_id != question_id:
+                    self.mismatches.append((game, round_number, "question", question_id, server.qm.current_question_id))
+                question_time = at
+                round_open = True
+                self.rounds_replayed += 1
+            elif kind == ANSWER:
+                player_name, answer = fields
+                # An answer that came after the results isn't part of any round
+                if round_open and player_name in server.correct_players:
+                    server.round_answers[player_name] = (answer, server.correct_answer)
+                    server.answer_latencies[player_name] = at - question_time
+                    self.answers_replayed += 1
+            elif kind == TIMEOUT:
+                server.correct_players.discard(fields[0])
+            elif kind == RESULT:
+                round_number, remaining = fields
+                server.evaluate_and_update_scores()
+                round_open = False
+                if set(server.correct_players) != set(remaining):
+                    self.mismatches.append((game, round_number, "players left", sorted(remaining),
+                                            sorted(server.correct_players)))
+                    server.correct_players = set(remaining)  # keep replaying the rest of the game as it was played
+            elif kind == FINISH:
+                winner = list(server.correct_players)[0] if len(server.correct_players) == 1 else None
+                if winner != fields[0]:
+                    self.mismatches.append((game, server.General_round - 1, "winner", fields[0], winner))
+                server.record_game(players, winner)
+                self.games_replayed += 1
+
+    def report(self, seconds):
+        """
+        Returns a summary of the replay: what was replayed, how fast, and the differences with the recording.
+        """
+        lines = [f"Replayed {self.games_replayed} games, {self.rounds_replayed} rounds and {self.answers_replayed} answers "
+                 f"in {seconds:.3f} seconds ({self.games_replayed / seconds if seconds else 0:.0f} games per second)"]
+        unfinished = len(self.games) - self.games_replayed
+        if unfinished:
+            lines.append(f"{unfinished} games were not finished when the recording stopped")
+        for game, round_number, what, recorded, replayed in self.mismatches:
+            lines.append(f"Game {game} round {round_number}: {what} recorded {recorded}, replayed {replayed}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays a recorded game session through the game logic.")
+    parser.add_argument("session", help="the session file, recorded with python Main.py --record PATH")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the session N times, e.g. to profile it")
+    parser.add_argument("--profile", action="store_true", help="print the functions the replay spent the most time in")
+    parser.add_argument("--stats", default=None, help="also record the replayed games in this statistics log")
+    parser.add_argument("--verbose", action="store_true", help="print the game's logs while replaying")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        Log.configure(level="WARNING")
+    profiler = cProfile.Profile() if args.profile else None
+    total_seconds = 0.0
+    engine = None
+    for _ in range(args.repeat):
+        engine = ReplayEngine(args.session, args.stats)
+        if profiler is not None:
+            profiler.enable()
+        total_seconds += engine.run()
+        if profiler is not None:
+            profiler.disable()
+    print((RED if engine.mismatches else GREEN) + engine.report(total_seconds / args.repeat) + RESET)
+    if profiler is not None:
+        print(YELLOW + "Most time spent in:" + RESET)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    sys.exit(1 if engine.mismatches else 0)
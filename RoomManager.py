@@ -0,0 +1,91 @@
+from GameRoom import GameRoom
+import Protocol
+
+
+class RoomManager:
+    """
+    Keeps the game rooms of the asyncio engine.
+    A new player goes to a room that is still waiting for players. When every room is playing (or full)
+    a new room is opened, so players never wait for someone else's game to end, up to max_rooms rooms.
+    """
+
+    def __init__(self, lobby_timeout=10, answer_timeout=10, round_deadline=12, room_size=None, max_rooms=None, stats_store=None,
+                 recorder=None, sessions=None, fill_window=None, on_room_free=None):
+        """
+        Attributes:
+            rooms (dict): The rooms of the server {room_id: GameRoom}.
+            next_room_id (int): The id of the next room to open.
+            games_played (int): The number of games finished in all rooms.
+            lobby_timeout, answer_timeout, round_deadline: The timings of every room (see GameRoom).
+            room_size (int): The number of players that fill a room, None for no limit.
+            max_rooms (int): The most rooms the server runs at once, None for no limit.
+            stats_store (StatsStore): The players' statistics, shared by all the rooms.
+            recorder (SessionRecorder): Records the games of all the rooms, None to not record them.
+            sessions (SessionRegistry): The session tokens of all the rooms' players, None to not keep seats.
+            fill_window (float): The most seconds a room's lobby stays open after its first player joined.
+            on_room_free (callable): Called once a room's game is over, so the queued players can join its lobby.
+        """
+        self.rooms = {}
+        self.next_room_id = 1
+        self.games_played = 0
+        self.lobby_timeout = lobby_timeout
+        self.answer_timeout = answer_timeout
+        self.round_deadline = round_deadline
+        self.room_size = room_size
+        self.max_rooms = max_rooms
+        self.stats_store = stats_store
+        self.recorder = recorder
+        self.sessions = sessions
+        self.fill_window = fill_window
+        self.on_room_free = on_room_free
+
+    def open_room(self):
+        """
+        Opens a new empty room and returns it.
+        """
+        room = GameRoom(self.next_room_id, self.lobby_timeout, self.answer_timeout, self.round_deadline,
+                        self.room_size, on_finished=self.room_finished, stats_store=self.stats_store,
+                        recorder=self.recorder, sessions=self.sessions, fill_window=self.fill_window)
+        self.rooms[room.room_id] = room
+        self.next_room_id += 1
+        return room
+
+    def get_open_room(self):
+        """
+        Returns a room new players can join, opening one if all the rooms are playing or full.
+        Returns None if every room is playing or full and no more rooms can be opened.
+        """
+        for room in self.rooms.values():
+            if room.is_open():
+                return room
+        if self.max_rooms is not None and len(self.rooms) >= self.max_rooms:
+            return None
+        return self.open_room()
+
+    def room_finished(self, room):
+        """
+        Called by a room once its game is over. An empty room is closed if another room is already waiting for players.
+        """
+        self.games_played += 1
+        if not room.lobby and any(other.is_open() for other in self.rooms.values() if other is not room):
+            del self.rooms[room.room_id]
+        if self.on_room_free is not None:
+            self.on_room_free()
+
+    def active_rooms(self):
+        """
+        Returns the number of rooms in the middle of a game.
+        """
+        return sum(1 for room in self.rooms.values() if room.game_task is not None)
+
+    def free_seats(self):
+        """
+        Returns the number of players that can still join, Protocol.FREE_SEATS_UNLIMITED if there is no limit.
+        """
+        open_rooms = [room for room in self.rooms.values() if room.is_open()]
+        if self.max_rooms is None:
+            return Protocol.FREE_SEATS_UNLIMITED
+        closed_rooms = max(0, self.max_rooms - len(self.rooms))
+        if self.room_size is None:
+            return Protocol.FREE_SEATS_UNLIMITED if open_rooms or closed_rooms else 0
+        return sum(self.room_size - len(room.lobby) for room in open_rooms) + closed_rooms * self.room_size
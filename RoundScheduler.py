@@ -0,0 +1,86 @@
+from Clock import Clock
+import Metrics
+
+
+class RoundScheduler:
+    """
+    Decides when a round is over: as soon as every live player has answered (or timed out, or disconnected),
+    or when the round deadline passes, whichever comes first.
+    It also keeps track of the gap between the end of a round and the next question, which must stay the same
+    however many players join, time out or disconnect during the game.
+    Only the game's owner calls it (the threaded server's game thread or a room's event loop), so it needs no lock.
+    """
+
+    def __init__(self, deadline=12, clock=None):
+        """
+        Attributes:
+            deadline (float): The maximum number of seconds a round lasts.
+            clock (Clock): The time the rounds are measured with (see Clock.py), the real time by default.
+            pending (set): The players whose answer we are still waiting for in the current round.
+            round_start (float): The clock's time at which the current round was opened.
+            closed_at (float): The clock's time at which the last round of the current game was closed.
+            gaps (list): The seconds from the end of every round of the current game to its next question.
+        """
+        self.deadline = deadline
+        self.clock = clock or Clock()
+        self.pending = set()
+        self.round_start = None
+        self.closed_at = None
+        self.gaps = []
+
+    def new_game(self):
+        """
+        Starts a new game: its first round isn't measured against the last round of the previous game, and only
+        its own gaps are kept, so a long-running server doesn't keep the gaps of every game it played.
+        """
+        self.closed_at = None
+        self.gaps = []
+
+    def open_round(self, players):
+        """
+        Starts a new round in which we wait for an answer from each of the given players.
+        """
+        self.pending = set(players)
+        self.round_start = self.clock.now()
+        if self.closed_at is not None:
+            gap = self.round_start - self.closed_at
+            self.gaps.append(gap)
+            Metrics.ROUND_GAP.observe(gap)
+
+    def mark_done(self, player_name):
+        """
+        Marks a player as done for the current round, whether the player answered, timed out or disconnected.
+        """
+        self.pending.discard(player_name)
+
+    def is_complete(self):
+        """
+        Returns True if every live player is done for the current round.
+        """
+        return not self.pending
+
+    def time_left(self):
+        """
+        Returns the number of seconds left until the deadline of the current round.
+        """
+        if self.round_start is None:
+            return self.deadline
+        return max(0.0, self.deadline - (self.clock.now() - self.round_start))
+
+    def elapsed(self):
+        """
+        Returns the number of seconds since the current round was opened.
+        """
+        if self.round_start is None:
+            return 0.0
+        return self.clock.now() - self.round_start
+
+    def close_round(self):
+        """
+        Closes the current round and returns how much time it saved compared to the deadline.
+        """
+        saved = self.time_left()
+        self.pending = set()
+        self.round_start = None
+        self.closed_at = self.clock.now()
+        return saved
@@ -1,9 +1,20 @@
-import struct
 import time
+import queue
+import select
 import socket
 import threading
-from threading import Barrier, BrokenBarrierError, Lock, Event
 from QuestionManager import QuestionManager
+from RoundScheduler import RoundScheduler
+from LobbyScheduler import LobbyScheduler, AdmissionCounter
+from Clock import Clock
+from Beacon import OfferBeacon
+from Statistics import StatsStore
+from Recorder import SessionRecorder
+from Sessions import SessionRegistry
+from GameState import RoundSnapshot, LOBBY, QUESTION, RESULTS, OVER
+import Metrics
+import Log
+import Protocol
 
 RED = "\033[31m"
 GREEN = "\033[32m"
@@ -16,26 +27,30 @@ RESET = "\033[0m"
 
 class Server:
 
-    def __init__(self):
+    def __init__(self, autostart=True, round_deadline=12, lobby_timeout=10, answer_timeout=10, host=None,
+                 stats_path=None, metrics_port=None, record_path=None, clock=None, resume_grace=10, fill_window=None,
+                 max_lobby=None, max_queue=None, listen_backlog=128, handshake_timeout=2):
         """
                 Initializes the server with necessary attributes for managing a multiplayer trivia game.
 
                 Attributes:
                     qm (QuestionManager): An instance of the QuestionManager class to manage trivia questions.
-                    round_answers_lock (Lock): A threading lock to ensure thread-safe operations on round_answers.
-                    correct_players_lock (Lock): A lock to manage concurrent access to the correct_players set.
-                    connected_clients_lock (Lock): A lock for thread-safe operations on the connected_clients set.
-                    addresses_lock (Lock): A lock to manage access to the addresses set which tracks client IP addresses.
-
-                    timer_thread (threading.Thread): A thread for managing game timing events.
-
-                    declare_barrier (Barrier): A synchronization primitive to manage the transition from game play to declaring a winner.
-                    round_barrier (Barrier): A barrier to synchronize the end of a game round.
-
-                    declare_winner_event (Event): An event to signal the declaration of a game winner.
-                    result_event (Event): An event to manage the timing of sending game results to players.
-                    round_event (Event): An event to start a new game round.
-                    start_event (Event): An event that signals the start of the game.
+                    clock (Clock): The time of the game's timers and deadlines (see Clock.py), the real time by default.
+                    round_scheduler (RoundScheduler): Closes a round once every live player answered or after round_deadline seconds.
+                    lobby_scheduler (LobbyScheduler): Starts the game after lobby_timeout seconds without a new player,
+                        at most fill_window seconds after the first one joined, or as soon as max_lobby players joined.
+                    admissions (AdmissionCounter): The players admitted, queued and rejected, and the admission rate.
+
+                    The game state below is only changed by the game thread (the single writer, see GameState.py):
+                    inbox (queue.SimpleQueue): The events the connection handlers post to the game thread.
+                    snapshot (RoundSnapshot): The last published step of the game, the handlers follow its links.
+                    pending_joins (list): The players who connected during a game or into a full lobby, admitted to the
+                        next lobby in the order they connected.
+                    max_queue (int): The most players waiting in pending_joins, the next ones are rejected. None for no limit.
+                    sessions (SessionRegistry): The session tokens of the framed players (see Sessions.py). A player whose
+                        connection drops keeps its seat for resume_grace seconds and gets it back by reconnecting with its token.
+                    player_sessions (dict): The session of every player of the game {player_name: PlayerSession}.
+                    state_thread (threading.Thread): The game thread, it owns the game state.
 
                     server_name (str): The name of the server.
                     correct_answer (str): The correct answer for the current trivia question.
@@ -46,36 +61,58 @@ class Server:
                     General_round (int): The current round of the game.
                     correct_answers (int): The number of correct answers in the current round.
                     round_answers (dict): A dictionary to track players' answers {player_name: (answer, correct)}.
-                    current_question (str): The current trivia question being asked.
-                    broadcast_udp_flag (int): A flag to control UDP broadcast for game invitations.
-
+                    answer_latencies (dict): The seconds each player took to answer the current question {player_name: seconds}.
+                    current_question (str): The current trivia question being asked, as sent to text protocol players.
+                    framed_question (str): The current question without the player list, sent to framed protocol players.
+                    current_roster (list): The players of the current round. Framed protocol players get the whole roster in a
+                        ROSTER frame with the first question, then only the players out since the last question.
+                    roster_payload (bytes): The ROSTER or ROSTER_DELTA frame sent before the current question, b"" if no one left.
+                    roster_positions (dict): The position of every player in the ROSTER of the game {player_name: position}.
+                    game_roster (list): The players of the game as they were listed in its ROSTER.
+                    dropped_players (set): The players of the game who timed out or disconnected.
+                    question_payloads (dict): The current question encoded once for each protocol {framed (bool): bytes}.
+                    prepared_round (int): The round whose question was already prepared during the previous results phase.
+                    broadcast_udp_flag (int): 1 while the lobby is open, the game invitations are only broadcast then.
+
+                    lobby_timeout (int): Seconds without a new connection before the game starts.
+                    answer_timeout (int): Seconds a player has to answer a question.
+                    host (str): The address the server listens on, the server's IP address if None.
+                    listen_backlog (int): The connections the kernel queues before they are accepted, so a storm of joins
+                        isn't refused while the server accepts them.
+                    handshake_timeout (float): Seconds a new connection has to send its player name before it's rejected.
                     port_number (int): The TCP port number on which the server operates.
+                    stats_store (StatsStore): The players' persistent statistics (see Statistics.py), None if stats_path is None.
+                    leaderboard_size (int): The number of players of the leaderboard sent with the winner message.
+                    metrics_port (int): The local HTTP port the metrics are exported on (see Metrics.py), None to not export them.
+                    recorder (SessionRecorder): Records the games to the session file record_path (see Recorder.py), None if record_path is None.
+                    recorded_game (int): The number of the current game in the session file.
                     udp_broadcast_thread (threading.Thread): A thread dedicated to broadcasting UDP invitations.
 
                 Methods:
+                    start: Finds a free port, starts the UDP broadcast and accepts TCP connections.
                     start_udp_broadcast: Broadcasts a game invitation message over UDP.
                     accept_tcp_connections: Accepts TCP connections from clients and handles them.
 
                 This initialization sets up the game server, starts broadcasting invitations, and accepts incoming TCP connections from clients.
+                If autostart is False only the game state is set up, so another engine (see AsyncServer.py) can reuse it.
                 """
         self.qm = QuestionManager()
-        self.round_answers_lock = Lock()
-        self.correct_players_lock = Lock()
-        self.connected_clients_lock = Lock()
-        self.addresses_lock = Lock()
-        self.timer_thread = None
-        # Barriers
-        self.declare_barrier = None
-        self.round_barrier = None
-
-        # Events
-        self.declare_winner_event = Event()
-        self.result_event = Event()
-        self.round_event = Event()
-        self.start_event = Event()
+        self.clock = clock or Clock()
+        self.round_scheduler = RoundScheduler(round_deadline, self.clock)
+        self.lobby_scheduler = LobbyScheduler(lobby_timeout, fill_window, max_lobby, self.clock)
+        self.admissions = AdmissionCounter(self.clock)
+
+        # The single writer's state
+        self.inbox = queue.SimpleQueue()
+        self.snapshot = RoundSnapshot(LOBBY)
+        self.pending_joins = []
+        self.max_queue = max_queue
+        self.state_thread = None
+        self.sessions = SessionRegistry(resume_grace, self.clock)
+        self.player_sessions = {}
 
         # General variables
-        self.server_name = ""
+        self.server_name = "Gym"
         self.correct_answer = ""
         self.result_message = ""
         self.addresses = set()
@@ -84,53 +121,93 @@ class Server:
         self.General_round = 1
         self.correct_answers = 0
         self.round_answers = {}  # Track answers: {player_name: (answer, correct)}
+        self.answer_latencies = {}
         self.current_question = None
-        self.broadcast_udp_flag = 0
+        self.framed_question = None
+        self.current_roster = []
+        self.roster_payload = b""
+        self.roster_positions = {}
+        self.game_roster = []
+        self.dropped_players = set()
+        self.question_payloads = {}
+        self.prepared_round = None
+        self.broadcast_udp_flag = 1
 
         # Server init
-        self.port_number = self.find_free_port()
-        self.udp_broadcast_thread = threading.Thread(target=self.start_udp_broadcast)
-        self.udp_broadcast_thread.start()
+        self.lobby_timeout = lobby_timeout
+        self.answer_timeout = answer_timeout
+        self.host = host
+        self.listen_backlog = listen_backlog
+        self.handshake_timeout = handshake_timeout
+        self.port_number = None
+        self.udp_broadcast_thread = None
+        self.stats_store = StatsStore.open(stats_path) if stats_path else None
+        self.leaderboard_size = 5
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.recorder = SessionRecorder.open(record_path) if record_path else None
+        self.recorded_game = None
+        if autostart:
+            self.start()
+
+    def start(self, port_number=None, broadcast=True):
+        """
+        Starts the game thread and the UDP broadcast thread and then accepts the players' TCP connections (blocking).
+        :param port_number: the port to listen on, a free port is found if it's None.
+        :param broadcast: whether this server sends the UDP offers.
+        """
+        self.port_number = port_number if port_number is not None else self.find_free_port()
+        self.start_metrics()
+        self.state_thread = threading.Thread(target=self.run_state_machine, daemon=True)
+        self.state_thread.start()
+        if broadcast:
+            self.udp_broadcast_thread = threading.Thread(target=self.start_udp_broadcast)
+            self.udp_broadcast_thread.start()
         self.accept_tcp_connections()
 
-    def start_udp_broadcast(self):
+    def start_metrics(self):
         """
-        Starts the udp broadcast. Sends a message that includes the magic_cookie, message_type,
-        padded_server_name(which is the server name just padded so it will be 32 bits long),
-        and the port_number. This function broadcasts the message so that
-        the clients could use the message to connect to the server.
+        Exports the metrics in the Prometheus text format on http://127.0.0.1:<metrics_port>/metrics.
         """
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-
-        # Define a creative server name and ensure it's 32 characters long
-        self.server_name = "Gym"
-        padded_server_name = self.server_name.ljust(32)  # Pad the server name to ensure it's 32 characters
+        if self.metrics_port is not None and self.metrics_server is None:
+            self.metrics_server = Metrics.MetricsServer(self.metrics_port).start()
+            Log.info("metrics_started", "Metrics on http://127.0.0.1:{port}/metrics", YELLOW, port=self.metrics_server.port)
 
-        # Magic cookie, message type, and server port
-        magic_cookie = 0xabcddcba
-        message_type = 0x2
-
-        # Pack the message according to the given format
-        message = struct.pack('!Ib32sH', magic_cookie, message_type, padded_server_name.encode('utf-8'), self.port_number)
+    def build_offer_message(self):
+        """
+        Builds the UDP offer message: magic_cookie, message_type, padded_server_name(which is the server name
+        just padded so it will be 32 bits long), and the port_number.
+        """
+        return Protocol.build_offer(self.server_name, self.port_number)
 
-        print(GREEN + f"Server started, listening on IP address {self.get_server_ip()}" + RESET)
-        broadcast_udp_flag = 1
-        while True:
-            if broadcast_udp_flag == 1:
-                server_socket.sendto(message, ('<broadcast>', 13117))
-            time.sleep(1)
+    def offer_load(self):
+        """
+        Returns the load sent with the offers (see Beacon.py): free seats, active rooms and round phase.
+        The lobby of the threaded server takes any number of players, and none while a game is running.
+        """
+        if self.broadcast_udp_flag == 1:
+            return Protocol.FREE_SEATS_UNLIMITED, 0, Protocol.PHASE_LOBBY
+        phase = Protocol.PHASE_QUESTION if self.snapshot.kind == QUESTION else Protocol.PHASE_RESULTS
+        return 0, 1, phase
 
-    def reset_timer(self):
+    def start_udp_broadcast(self):
         """
-        Reset the timer of 10 seconds for the players connection.
+        Starts the udp broadcast. Sends the offer message (magic_cookie, message_type, padded_server_name
+        and the port_number) followed by its load extension, so the clients could use them to connect to
+        the least loaded server. The beacon (see Beacon.py) sends a fast burst when the lobby opens, one offer
+        per second while it stays open and nothing during a game.
         """
-        with self.connected_clients_lock:
-            if self.timer_thread:
-                self.timer_thread.cancel()
-            self.start_event.clear()
-            self.timer_thread = threading.Timer(10, self.start_game)
-            self.timer_thread.start()
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        beacon = OfferBeacon()
+
+        Log.info("server_started", "Server started, listening on IP address {ip}", GREEN, ip=self.get_server_ip())
+        while True:
+            free_seats, active_rooms, phase = self.offer_load()
+            if beacon.tick(free_seats):
+                for message in beacon.packets(self.server_name, self.port_number, free_seats, active_rooms, phase):
+                    server_socket.sendto(message, ('<broadcast>', 13117))
+            time.sleep(beacon.burst_interval)
 
     def is_port_in_use(self, port):
         """
@@ -165,20 +242,21 @@ class Server:
         Accept TCP connections from clients (the players) and adds them to the players' variables.
         """
         tcp_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-        tcp_server_socket.bind((str(self.get_server_ip()), self.port_number))
+        tcp_server_socket.bind((self.host or str(self.get_server_ip()), self.port_number))
 
-        tcp_server_socket.listen()
+        tcp_server_socket.listen(self.listen_backlog)
 
         while True:
             try:
                 client_socket, client_address = tcp_server_socket.accept()
             except Exception as e:
-                print("\033[31m" + f"An error occurred during the connection: {e}" + "\033[0m")
+                Log.error("accept_failed", "An error occurred during the connection: {error}", RED, error=e)
 
-            self.reset_timer()
+            Metrics.CONNECTIONS.inc()
 
-            thread = threading.Thread(target=self.client_handler, args=(client_socket, client_address))
+            thread = threading.Thread(target=self.client_handler, args=(Metrics.MeteredSocket(client_socket), client_address))
             thread.start()
 
     def client_handler(self, client_socket, client_address):
@@ -186,162 +264,454 @@ class Server:
         Manages an individual client's connection and participation in the game.
 
         Steps:
-        1. Receives the client's player name and checks for duplicates. If a duplicate is found, it assigns a unique name.
-        2. Adds the player to the game by updating game state variables, ensuring thread-safe access through locks.
-        3. Waits for the game to start, signaled by the 'start_event'.
-        4. Enters a loop that continues for the duration of the client's participation in the game:
-           a. Waits for the 'round_event', signaling the start of a new round.
-           b. Sends the current question to the client, handling any potential disconnection.
-           c. Calls 'handle_answers' to receive and process the client's answer.
-           d. Waits for the 'result_event' to signal that results can be sent, then calls 'send_results'.
-           e. Waits at a 'round_barrier' to ensure synchronization with other client handlers before proceeding to the next round or concluding the game.
-        5. If the client is the last correct player remaining or if all players have been eliminated, declares the winner and breaks the loop.
-        6. Cleans up by closing the client socket upon completion of the game or encountering a timeout exception.
-
-        This function uses several synchronization mechanisms (Events, Barriers, Locks) to ensure that game state updates are consistent across multiple threads and that clients are processed in sync with the game's progression.
+        1. Receives the client's player name. The handshake also tells if the client speaks the framed protocol
+           (see Protocol.py) or the old text one.
+        2. Asks the game thread to admit the player, which gives it a unique name if it's a duplicate, a session token
+           (framed players) and the lobby snapshot of its game. A player who connects during a game is queued for the
+           next one: it follows the running game's snapshots and is told its place in the queue every round until the
+           next lobby opens. A player reconnecting with its session token gets its seat back instead, along with the
+           roster and, if it hasn't answered yet, the question of the round. If the queue is full the player is
+           rejected and told to come back later.
+        3. Follows the snapshots the game thread publishes (see GameState.py), in order:
+           a. QUESTION: sends the question and, if the player is still in the game, waits for its answer (handle_answers).
+           b. RESULTS: sends the results of the round.
+           c. OVER: sends the winner message, if someone won, and leaves.
+        4. Cleans up by closing the client socket upon completion of the game or a disconnection.
+
+        The handler never changes the game state: the answers, timeouts and disconnections are posted to the game
+        thread's inbox, and everything the handler sends comes from immutable snapshots, so it needs no lock and
+        a slow handler never holds up the round of the others.
         """
+        player_name = None
         try:
-            client_socket.settimeout(0.1)
-            player_name = client_socket.recv(1024).strip().decode()
-
-            duplicate_player = ""
-            player_name = player_name.strip('\n')
-
-            with self.correct_players_lock, self.connected_clients_lock, self.addresses_lock:
-                if player_name in self.correct_players and client_address[0] not in self.addresses:
-                    player_name = player_name + str(len(self.correct_players))
-                    duplicate_player = f"You have been assigned {player_name}\n"
-                self.addresses.add(client_address[0])
-                self.correct_players.add(player_name)
-                self.connected_clients.add((player_name, client_socket))
-                print(CYAN + f"{player_name} has joined the game from {client_address}" + RESET)
-
-            self.start_event.wait()
-            while True:
-                self.round_event.wait()
-                try:
-                    client_socket.sendall((duplicate_player + self.current_question).encode())
-                except:
-                    print(f'player:{player_name} disconnected')
-                    with self.correct_players_lock:
-                        self.correct_players.remove(player_name)
-                if player_name in self.correct_players:
-                    self.handle_answers(self.correct_answer, player_name, client_socket)
-                self.result_event.wait()
-                self.send_results(self.result_message, client_socket)
-
-                try:
-                    self.round_barrier.wait()
-                except BrokenBarrierError:
-                    pass
-
-                if len(self.correct_players) == 1:
-                    self.declare_winner_event.wait()
-                    self.declare_winner(list(self.correct_players)[0], player_name, client_socket)
-                    try:
-                        self.declare_barrier.wait()
-                    except BrokenBarrierError:
-                        pass
-                    break
-                if len(self.correct_players) == 0:
-                    break
+            client_socket.settimeout(self.handshake_timeout)
+            hello = client_socket.recv(1024)
+            player_name, codec = Protocol.parse_hello(hello)
+            client_socket.settimeout(None)
+            admitted = queue.SimpleQueue()
+            session_token = Protocol.parse_resume(hello) if codec.framed else None
+            if session_token:
+                self.post("resume", session_token, player_name, client_socket, client_address, codec.framed, admitted)
+            else:
+                self.post("join", player_name, client_socket, client_address, codec.framed, admitted)
+            reply = admitted.get()
+            if reply[0] == "rejected":
+                client_socket.sendall(codec.encode(Protocol.TEXT, "The server is full, please come back later\n"))
+                return
+            while reply[0] == "queued":
+                self.wait_in_queue(reply[1], reply[2], client_socket, codec)
+                reply = admitted.get()
+            _, player_name, duplicate_player, snapshot, session_token, catch_up, ask = reply
+            if codec.framed:
+                session_frame = codec.encode(Protocol.SESSION, session_token) if session_token else b""
+                client_socket.sendall(codec.encode(Protocol.HELLO, player_name) + session_frame + catch_up)
+            if ask:
+                client_socket.sendall(snapshot.payloads[codec.framed])
+                self.handle_answers(snapshot, player_name, client_socket, codec)
+
+            while snapshot.kind != OVER:
+                snapshot = snapshot.wait_next()
+                if snapshot.kind == QUESTION:
+                    if duplicate_player and not codec.framed:
+                        # Framed players already got their assigned name in the HELLO frame
+                        client_socket.sendall(codec.encode(Protocol.TEXT, duplicate_player))
+                    duplicate_player = ""
+                    client_socket.sendall(snapshot.payloads[codec.framed])
+                    if player_name in snapshot.players:
+                        self.handle_answers(snapshot, player_name, client_socket, codec)
+                elif snapshot.kind == RESULTS:
+                    self.send_results(snapshot.payloads[codec.framed], client_socket)
+                elif snapshot.payloads:
+                    self.declare_winner(snapshot.payloads[codec.framed], client_socket)
 
         except socket.timeout:
-            print("\033[31m" + f"Timeout waiting for {player_name} from {client_address}" + "\033[0m")
+            Log.warning("hello_timeout", "Timeout waiting for {player} from {address}", RED,
+                        player=player_name, address=client_address)
+            self.post("reject")
+        except OSError:
+            Log.warning("player_disconnected", "player:{player} disconnected", player=player_name)
+            self.post("leave", player_name, client_socket)
         finally:
             client_socket.close()
+            Metrics.CONNECTIONS.dec()
 
-    def start_game(self):
+    def wait_in_queue(self, position, snapshot, client_socket, codec):
         """
-        This function starts the game, and calls the game_loop() function to run it.
+        Follows the running game's snapshots until it's over, telling a queued player its place in the queue
+        at every question, so the player knows the server is alive while it waits.
+        A player who disconnects while queued raises ConnectionError, so it's out of the queue before the next game.
         """
-        print(RED + "Timer expired, game starting..." + RESET)
-        self.start_event.set()
-        self.game_loop()
-        self.start_event.clear()
+        notify = True
+        while snapshot.kind != OVER:
+            if notify and snapshot.kind == LOBBY:
+                notice = f"The next game is full, you are number {position} in the queue for the game after it\n"
+            elif notify:
+                notice = (f"A game is being played (round {snapshot.round_number}), you are number {position} "
+                          f"in the queue for the next game\n")
+            if notify:
+                client_socket.sendall(codec.encode(Protocol.TEXT, notice))
+            next_snapshot = snapshot.wait_next(1)
+            notify = next_snapshot is not None and next_snapshot.kind == QUESTION
+            if next_snapshot is not None:
+                snapshot = next_snapshot
+            elif select.select([client_socket], [], [], 0)[0] and not client_socket.recv(1, socket.MSG_PEEK):
+                raise ConnectionError("disconnected while queued")
+
+    def post(self, event, *fields):
+        """
+        Posts an event to the game thread, the only writer of the game state. Called by the connection handlers.
+        """
+        self.inbox.put((event, time.perf_counter()) + fields)
+
+    def run_state_machine(self):
+        """
+        The game thread: the single writer of the game state.
+        In the lobby it admits the players and waits for the events only until the lobby's deadline (see
+        LobbyScheduler), so a storm of joins costs no timers, then game_loop runs the whole game, applying the
+        handlers' events between the steps of each round.
+        """
+        while True:
+            if self.lobby_scheduler.is_due():
+                players = self.lobby_scheduler.close()
+                if self.connected_clients:
+                    Log.info("game_starting", "Lobby closed with {players} players, game starting... ({admitted} "
+                             "admitted, {queued} queued, {rejected} rejected, {admission_rate} joins/s)", RED,
+                             players=players, **self.admissions.report())
+                    self.game_loop()
+                    self.open_lobby()
+                continue
+            try:
+                self.apply_event(self.inbox.get(timeout=self.lobby_scheduler.time_left()))
+            except queue.Empty:
+                pass
+
+    def apply_event(self, event):
+        """
+        Applies an event posted by a connection handler to the game state.
+        """
+        kind, posted = event[0], event[1]
+        Metrics.STATE_EVENT_DELAY.observe(time.perf_counter() - posted)
+        if kind == "join":
+            self.join_player(event[2:])
+        elif kind == "reject":
+            self.admissions.reject()
+        elif kind == "resume":
+            _, _, session_token, player_name, client_socket, client_address, framed, admitted = event
+            session = self.sessions.find(session_token)
+            if session is not None and session.owner is self and self.snapshot.kind != LOBBY:
+                self.resume_player(session, client_socket, client_address, admitted)
+            else:
+                Log.info("resume_rejected", "{player} has no seat to get back, joining as a new player", YELLOW,
+                         player=player_name)
+                self.join_player((player_name, client_socket, client_address, framed, admitted))
+        elif kind == "answer":
+            _, _, player_name, round_number, answer, latency = event
+            if (round_number == self.snapshot.round_number and self.snapshot.kind == QUESTION
+                    and player_name in self.correct_players and player_name not in self.round_answers):
+                self.round_answers[player_name] = (answer, self.correct_answer)
+                self.answer_latencies[player_name] = latency
+                if self.recorder is not None:
+                    self.recorder.answer(self.recorded_game, player_name, answer)
+                self.round_scheduler.mark_done(player_name)
+        elif kind == "timeout":
+            _, _, player_name, round_number = event
+            if round_number == self.snapshot.round_number and player_name in self.correct_players:
+                Log.warning("answer_timeout", "Timeout waiting for answer from {player}", player=player_name)
+                self.drop_player(player_name)
+        elif kind == "leave":
+            _, _, player_name, client_socket = event
+            self.pending_joins = [join for join in self.pending_joins if join[1] is not client_socket]
+            if (player_name, client_socket) not in self.connected_clients:
+                return  # a queued player, or the old connection of a player who reconnected
+            self.connected_clients.discard((player_name, client_socket))
+            session = self.player_sessions.get(player_name)
+            if session is not None and self.snapshot.kind != LOBBY and self.sessions.drop(session):
+                if player_name in self.correct_players:
+                    Log.info("player_away", "{player} disconnected, keeping its seat for {grace} seconds", YELLOW,
+                             player=player_name, grace=self.sessions.grace)
+            elif player_name in self.correct_players:
+                if self.snapshot.kind == LOBBY:
+                    self.lobby_scheduler.leave()
+                self.drop_player(player_name)
+                if session is not None:
+                    self.sessions.close(self.player_sessions.pop(player_name))
+
+    def join_player(self, join):
+        """
+        Admits a new player to the lobby, or queues it for the next game if a game is running or the lobby is full.
+        A player who doesn't fit in a full queue is rejected.
+        join is (player_name, client_socket, client_address, framed, admitted).
+        """
+        if self.snapshot.kind == LOBBY and not self.lobby_scheduler.is_full():
+            self.admit_player(*join)
+        elif self.max_queue is not None and len(self.pending_joins) >= self.max_queue:
+            self.admissions.reject()
+            join[-1].put(("rejected",))
+        else:
+            self.pending_joins.append(join)
+            self.admissions.queue()
+            join[-1].put(("queued", len(self.pending_joins), self.snapshot))
+
+    def admit_player(self, player_name, client_socket, client_address, framed, admitted):
+        """
+        Adds a player to the lobby, giving it a unique name if it's already taken and a session token if it speaks
+        the framed protocol, and replies to its handler with (player name, the message telling it its new name,
+        the lobby snapshot, the session token, b"", False).
+        """
+        duplicate_player = ""
+        if player_name in self.correct_players:
+            suffix = len(self.correct_players)
+            while player_name + str(suffix) in self.correct_players:
+                suffix += 1
+            player_name = player_name + str(suffix)
+            duplicate_player = f"You have been assigned {player_name}\n"
+        self.addresses.add(client_address[0])
+        self.correct_players.add(player_name)
+        self.connected_clients.add((player_name, client_socket))
+        session_token = None
+        if framed:
+            session = self.player_sessions[player_name] = self.sessions.issue(player_name, self)
+            session_token = session.token
+        Log.info("player_joined", "{player} has joined the game from {address}", CYAN,
+                 player=player_name, address=client_address)
+        if self.recorder is not None:
+            self.recorder.join(player_name)
+        self.lobby_scheduler.admit()
+        self.admissions.admit()
+        admitted.put(("admitted", player_name, duplicate_player, self.snapshot, session_token, b"", False))
+
+    def resume_player(self, session, client_socket, client_address, admitted):
+        """
+        Gives a reconnecting player its seat back on its new connection. The old connection is shut down, so a
+        handler still waiting on it leaves (its "leave" is then ignored). Replies to the new handler with the
+        player's name, the current snapshot, the roster of the game and whether it still has to answer the
+        question of the round.
+        """
+        player_name = session.player_name
+        for old_client in [client for client in self.connected_clients if client[0] == player_name]:
+            self.connected_clients.discard(old_client)
+            try:
+                old_client[1].shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connected_clients.add((player_name, client_socket))
+        self.sessions.resume(session)
+        Log.info("player_resumed", "{player} is back in the game from {address}", CYAN,
+                 player=player_name, address=client_address)
+        ask = (self.snapshot.kind == QUESTION and player_name in self.correct_players
+               and player_name not in self.round_answers)
+        admitted.put(("admitted", player_name, "", self.snapshot, session.token, self.roster_catch_up(), ask))
+
+    def expire_sessions(self):
+        """
+        Takes the players who didn't reconnect within the grace window out of the game.
+        """
+        for session in self.sessions.expire(self):
+            self.player_sessions.pop(session.player_name, None)
+            if session.player_name in self.correct_players:
+                Log.warning("player_disconnected", "player:{player} didn't come back in time", player=session.player_name)
+                self.drop_player(session.player_name)
+
+    def drop_player(self, player_name):
+        """
+        Takes a player who timed out or disconnected out of the game.
+        """
+        self.correct_players.discard(player_name)
+        self.record_timeout(player_name)
+        self.round_scheduler.mark_done(player_name)
+
+    def open_lobby(self):
+        """
+        Opens the lobby of the next game and admits the players who connected during the last one, as many as fit.
+        The others keep their order in the queue and are told their new place.
+        """
+        self.snapshot = RoundSnapshot(LOBBY)
+        pending_joins, self.pending_joins = self.pending_joins, []
+        for join in pending_joins:
+            if not self.lobby_scheduler.is_full():
+                self.admit_player(*join)
+            else:
+                self.pending_joins.append(join)
+                join[-1].put(("queued", len(self.pending_joins), self.snapshot))
+
+    def publish(self, kind, payloads=None, **fields):
+        """
+        Publishes the next step of the game as an immutable snapshot, waking the handlers that follow it.
+        """
+        snapshot = RoundSnapshot(kind, self.General_round - 1, self.current_roster, self.correct_players, payloads,
+                                 self.correct_answer, **fields)
+        self.snapshot.link(snapshot)
+        self.snapshot = snapshot
+
+    def collect_answers(self):
+        """
+        Applies the handlers' events until every live player is done or the round deadline passes (see RoundScheduler).
+        A player who disconnected holds up the round until it reconnects or its grace window is over.
+        """
+        while not self.round_scheduler.is_complete():
+            time_left = self.round_scheduler.time_left()
+            if time_left <= 0:
+                break
+            away = self.sessions.next_expiry(self)
+            try:
+                self.apply_event(self.inbox.get(timeout=time_left if away is None else min(time_left, away)))
+            except queue.Empty:
+                pass
+            self.expire_sessions()
 
     def game_loop(self):
         """
-        Manages the game's progression by controlling the flow of rounds, broadcasting questions, and evaluating answers.
-        Utilizes synchronization primitives like Barriers and Events to coordinate between threads handling individual clients.
+        Runs a whole game on the game thread, the only writer of the game state.
 
         Steps:
-        1. Initializes barriers based on the number of connected clients.
-        2. Enters a loop that continues as long as more than one player remains correct.
-        3. Broadcasts the start of the game or questions for each round.
-        4. Waits for answers within a timeout period and evaluates them, updating scores.
-        5. After each round, waits at a barrier to ensure all threads have processed the round before proceeding.
-        6. Declares a winner if only one correct player remains, broadcasting the result.
-        7. Resets game state for potential new rounds and continues listening for new offers.
-
-        The round and result events control the flow within each client handler thread, ensuring that messages are sent and received in sync.
+        1. While more than one player remains correct, draws the question (the welcome message in the first round)
+           and publishes it in a QUESTION snapshot, which the handlers send to their players.
+        2. Applies the answers, timeouts and disconnections the handlers post until every live player is done or
+           the round deadline passed (see RoundScheduler), then evaluates the answers right away, updating scores.
+        3. Publishes the results in a RESULTS snapshot and prepares the next question while the handlers send them.
+           The handlers follow the snapshots at their own pace, so no one waits for the slowest handler.
+        4. Publishes the OVER snapshot with the winner message (if someone won) and resets the game state.
         """
         self.General_round = 1
-        self.round_barrier = Barrier(len(self.connected_clients) + 1)
-        self.declare_barrier = Barrier(len(self.connected_clients) + 1)
         self.round_answers.clear()
+        self.answer_latencies.clear()
         self.broadcast_udp_flag = 0
+        self.round_scheduler.new_game()
+        # The players the game started with, the ones who leave before it's over are credited with the game too
+        game_players = [player_name for player_name, _ in self.connected_clients]
+        self.start_recording(game_players)
 
         while len(self.correct_players) > 1:
+            round_start = self.clock.now()
+            self.round_answers.clear()
+            self.answer_latencies.clear()
+            self.round_scheduler.open_round(self.correct_players)
             if self.General_round == 1:
                 self.broadcast_game_start()
                 self.General_round = 2
             else:
                 self.broadcast_question()
                 self.General_round += 1
-
-            time.sleep(12)
-            self.round_event.clear()
-            self.evaluate_and_update_scores()
-            self.result_event.set()
-            self.result_event.clear()
-            try:
-                self.round_barrier.wait()
-            except BrokenBarrierError:
-                pass
-
-        if len(self.correct_players) == 1:
-            winner_msg = f"Game over!\nCongratulations to the winner: {list(self.correct_players)[0]}"
-            print(BLUE + winner_msg + RESET)
-            print("Game over, sending out offer requests...")
-            self.General_round = 1
-            self.declare_winner_event.set()
-            try:
-                self.declare_barrier.wait()
-            except BrokenBarrierError:
-                pass
-        self.result_event.clear()
+            self.publish(QUESTION, self.question_payloads, opened_at=self.clock.now())
+
+            self.collect_answers()
+            for player_name in list(self.round_scheduler.pending):
+                # The round deadline passed before the player answered
+                Log.warning("answer_timeout", "Timeout waiting for answer from {player}", player=player_name)
+                self.drop_player(player_name)
+            saved = self.round_scheduler.close_round()
+            if saved > 0:
+                Log.info("round_closed_early", "All answers are in, round closed {saved:.1f} seconds early", YELLOW,
+                         saved=saved)
+            with Metrics.EVALUATE_DURATION.time():
+                self.evaluate_and_update_scores()
+            self.publish(RESULTS, self.encode_message(Protocol.RESULT, self.result_message),
+                         answers=[(player_name, answer) for player_name, (answer, _) in self.round_answers.items()],
+                         result_message=self.result_message)
+            if len(self.correct_players) > 1:
+                self.prepare_question()
+            Metrics.ROUND_DURATION.observe(self.clock.now() - round_start)
+
+        # Recorded before the winner is declared, so the leaderboard in the winner message includes this game
+        winner = list(self.correct_players)[0] if len(self.correct_players) == 1 else None
+        self.record_game(game_players, winner)
+        if winner is not None:
+            Log.info("game_over", "Game over!\nCongratulations to the winner: {winner}", BLUE, winner=winner)
+            Log.info("offers_resumed", "Game over, sending out offer requests...")
+            self.publish(OVER, self.encode_message(Protocol.WINNER, self.winner_message(winner)), winner=winner)
+        else:
+            self.publish(OVER)
+        self.General_round = 1
         self.connected_clients = set()
         self.correct_players = set()
+        self.sessions.close_all(self)
+        self.player_sessions = {}
+        self.game_roster = []
         self.broadcast_udp_flag = 1
 
     def broadcast_game_start(self):
         """
         Broadcasts the start of the game. Including a welcome message to the player and the first question.
+        Every game gets a new shuffled deck of questions, so no question repeats in a game.
         """
         welcome_message = f"Welcome to the {self.server_name} server, where we are answering trivia questions about Aston Villa FC.\n"
         player_list_message = ""
         for idx, (player_name, _) in enumerate(self.connected_clients, start=1):
             player_list_message += f"Player {idx}: {player_name}\n"
 
+        self.qm.new_game()
         first_question = self.qm.get_random_question()
+        self.record_question()
         self.current_question = welcome_message + player_list_message + "==\nTrue or False: " + first_question + "\n"
-        print(MAGENTA + self.current_question + RESET)
+        self.framed_question = welcome_message + "==\nTrue or False: " + first_question + "\n"
+        self.current_roster = [player_name for player_name, _ in self.connected_clients]
+        self.roster_payload = Protocol.encode_frame(Protocol.ROSTER, "\n".join(self.current_roster))
+        self.roster_positions = {player_name: position for position, player_name in enumerate(self.current_roster)}
+        self.game_roster = list(self.current_roster)
+        self.dropped_players = set()
+        Log.info("question", "{question}", MAGENTA, question=self.current_question, round=self.General_round)
         self.correct_answer = self.qm.get_correct_answer()
         self.correct_answer = [str(element) for element in self.correct_answer]
-        self.round_event.set()
+        self.encode_question()
 
-    def broadcast_question(self):
+    def prepare_question(self):
         """
-        Broadcasts a question to all the players simultaneously.
+        Draws the question of round General_round and encodes it, so broadcast_question only has to send it.
+        Called in the results phase of the previous round, once the remaining players are known.
+        The players aren't listed again: the question only tells who is out since the last one, so the bytes of a
+        round grow with the players who left it, not with the players of the game.
         """
-        self.current_question = self.qm.get_random_question()
-        self.current_question = (f"\nRound {self.General_round}, played by {' and '.join(list(self.correct_players))}:\nTrue or False:"
-                      f" {self.current_question}\n")
+        question = self.qm.get_random_question()
+        out = [player_name for player_name in self.current_roster if player_name not in self.correct_players]
+        eliminated = [self.roster_positions[player_name] for player_name in out if player_name not in self.dropped_players]
+        disconnected = [self.roster_positions[player_name] for player_name in out if player_name in self.dropped_players]
+        left_message = f" ({', '.join(out)} out)" if out else ""
+        self.current_question = (f"\nRound {self.General_round}, {len(self.correct_players)} players left{left_message}:\n"
+                                 f"True or False: {question}\n")
+        self.framed_question = f"\nRound {self.General_round}:\nTrue or False: {question}\n"
+        self.roster_payload = (Protocol.encode_frame(Protocol.ROSTER_DELTA, Protocol.encode_roster_delta(eliminated, disconnected))
+                               if out else b"")
+        self.current_roster = [player_name for player_name in self.current_roster if player_name in self.correct_players]
         self.correct_answer = self.qm.get_correct_answer()
         self.correct_answer = [str(element) for element in self.correct_answer]
-        print(MAGENTA + self.current_question + RESET)
-        self.round_event.set()
+        self.encode_question()
+        self.prepared_round = self.General_round
+
+    def broadcast_question(self):
+        """
+        Broadcasts a question to all the players simultaneously.
+        The question is usually prepared during the previous results phase, otherwise it's prepared now.
+        """
+        if self.prepared_round != self.General_round:
+            self.prepare_question()
+        self.prepared_round = None
+        self.record_question()
+        Log.info("question", "{question}", MAGENTA, question=self.current_question, round=self.General_round)
+
+    def roster_catch_up(self):
+        """
+        Returns the frames that bring a reconnecting player's roster up to date: the ROSTER of the game and a
+        ROSTER_DELTA of everyone out since, b"" before the game started.
+        """
+        if not self.game_roster:
+            return b""
+        out = [player_name for player_name in self.game_roster if player_name not in self.correct_players]
+        eliminated = [self.roster_positions[player_name] for player_name in out if player_name not in self.dropped_players]
+        disconnected = [self.roster_positions[player_name] for player_name in out if player_name in self.dropped_players]
+        catch_up = Protocol.encode_frame(Protocol.ROSTER, "\n".join(self.game_roster))
+        if out:
+            catch_up += Protocol.encode_frame(Protocol.ROSTER_DELTA, Protocol.encode_roster_delta(eliminated, disconnected))
+        return catch_up
+
+    def encode_question(self):
+        """
+        Encodes the current question once for each protocol, every player gets the same bytes object.
+        Framed players get the roster (the whole of it in the first round, then what changed) followed by the QUESTION frame.
+        """
+        self.question_payloads = {
+            False: Protocol.TextCodec().encode(Protocol.QUESTION, self.current_question),
+            True: self.roster_payload + Protocol.encode_frame(Protocol.QUESTION, self.framed_question),
+        }
 
     def evaluate_and_update_scores(self):
         """
@@ -358,74 +728,131 @@ class Server:
            b. If only one player remains as having provided a correct answer, that player is declared the winner.
         4. Constructs a message summarizing the outcomes of the round's answers, which is then broadcast to all players.
 
-        The method ensures thread-safe operations on shared resources, particularly when accessing and modifying player answers and game state.
+        The method is only called by the writer of the game state (the game thread, or a room of the asyncio engine).
         """
         if len(self.correct_players) == 0:
             self.correct_players = set()
             # If all the players have disconnected
-            print(YELLOW + "No players had answer within the time limit\nGame over!" + RESET)
-            print(YELLOW + "Game over, sending out offer requests..." + RESET)
+            Log.info("no_answers", "No players had answer within the time limit\nGame over!", YELLOW)
+            Log.info("offers_resumed", "Game over, sending out offer requests...", YELLOW)
             self.result_message = "No players had answer within the time limit\nGame over!\n"
  
         elif len(self.correct_players) >= 1:
-            with self.round_answers_lock:
-                who_is_correct = ""
-                copy_of_correct_players = self.correct_players.copy()
-                for player_name, (answer, correct) in self.round_answers.items():
-                    if player_name in self.correct_players:
-                        if str(answer) in correct:
-                            who_is_correct += f"\n{player_name} is correct!"
-                        else:
-                            self.correct_players.remove(player_name)
-                            incorrect = f"\n{player_name} is incorrect!" + who_is_correct
-                            who_is_correct = incorrect
-                if len(self.correct_players) == 0:
-                    self.correct_players = copy_of_correct_players.copy()
-                if len(self.correct_players) == 1 and "is correct" in who_is_correct:
-                    who_is_correct += " " + list(self.correct_players)[0] + ' Wins!'
-
-            print(BLUE + who_is_correct + RESET)
+            who_is_correct = ""
+            copy_of_correct_players = self.correct_players.copy()
+            for player_name, (answer, correct) in self.round_answers.items():
+                if player_name in self.correct_players:
+                    self.record_answer(player_name, str(answer) in correct)
+                    if str(answer) in correct:
+                        who_is_correct += f"\n{player_name} is correct!"
+                    else:
+                        self.correct_players.remove(player_name)
+                        incorrect = f"\n{player_name} is incorrect!" + who_is_correct
+                        who_is_correct = incorrect
+            if len(self.correct_players) == 0:
+                self.correct_players = copy_of_correct_players.copy()
+            if len(self.correct_players) == 1 and "is correct" in who_is_correct:
+                who_is_correct += " " + list(self.correct_players)[0] + ' Wins!'
+
+            Log.info("round_results", "{results}", BLUE, results=who_is_correct, round=self.General_round)
             self.result_message = who_is_correct
+        if self.recorder is not None:
+            # General_round was already moved on to the next round when the question was sent
+            self.recorder.result(self.recorded_game, self.General_round - 1, self.correct_players)
+
+    def encode_message(self, kind, text):
+        """
+        Encodes a message once for each protocol {framed (bool): bytes}, like encode_question.
+        """
+        return {False: Protocol.TextCodec().encode(kind, text), True: Protocol.encode_frame(kind, text)}
 
-    def handle_answers(self, correct_answer, player_name, client_socket):
+    def handle_answers(self, snapshot, player_name, client_socket, codec):
         """
-        A helper function that handles the gathering of answers from the players.
+        A helper function that waits for a player's answer to the question of a snapshot and posts it to the game thread,
+        or posts a timeout if the player didn't answer in time.
         """
         try:
-            client_socket.settimeout(10)
-            answer = client_socket.recv(1024).decode()
-            with self.round_answers_lock:
-                self.round_answers[player_name] = (answer, correct_answer)
-        except:
-            with self.correct_players_lock:
-                if player_name in self.correct_players:
-                    print(f"Timeout waiting for answer from {player_name}")
-                    self.correct_players.remove(player_name)
+            client_socket.settimeout(self.answer_timeout)
+            answer = Protocol.receive_message_text(client_socket, codec)
+            self.post("answer", player_name, snapshot.round_number, answer, self.clock.now() - snapshot.opened_at)
+        except socket.timeout:
+            Metrics.ANSWER_TIMEOUTS.inc()
+            self.post("timeout", player_name, snapshot.round_number)
+        except (OSError, Protocol.ProtocolError, UnicodeDecodeError):
+            Metrics.ANSWER_TIMEOUTS.inc()
+            raise OSError("The player disconnected while the server waited for its answer")
+
+    def record_answer(self, player_name, correct):
+        """
+        Records a player's answer to the current round in the players' statistics.
+        """
+        if self.stats_store is not None:
+            self.stats_store.record_answer(player_name, correct, self.answer_latencies.get(player_name, 0.0))
+
+    def record_game(self, players, winner):
+        """
+        Records a finished game of the given players in the players' statistics, winner is None if no one won.
+        """
+        if self.stats_store is not None:
+            self.stats_store.record_game(players, winner)
+        if self.recorder is not None:
+            self.recorder.finish(self.recorded_game, winner)
+            self.recorded_game = None
+
+    def start_recording(self, players):
+        """
+        Records the start of a game of the given players and seeds its questions with the recorded seed,
+        so the game can be replayed with the same questions (see Replay.py).
+        """
+        if self.recorder is not None:
+            self.recorded_game, seed = self.recorder.start_game(players)
+            self.qm.rng.seed(seed)
+
+    def record_question(self):
+        """
+        Records the question of the current round (General_round) in the session file.
+        """
+        if self.recorder is not None:
+            self.recorder.question(self.recorded_game, self.General_round, self.qm.current_question_id)
+
+    def record_timeout(self, player_name):
+        """
+        Records a player who is out of the game for not answering in time or disconnecting.
+        """
+        self.dropped_players.add(player_name)
+        if self.recorder is not None:
+            self.recorder.timeout(self.recorded_game, player_name)
+
+    def winner_message(self, winner):
+        """
+        Returns the message announcing the winner of the game, followed by the top of the leaderboard.
+        """
+        message = (f"Game over!\nCongratulations to the winner: {winner}\n"
+                   f"The total number of correct answers from all clients this round: {self.correct_answers}")
+        if self.stats_store is not None:
+            message += "\n" + self.stats_store.leaderboard.format(self.leaderboard_size)
+        return message
 
-    def send_results(self, result_message, client_socket):
+    def send_results(self, payload, client_socket):
         """
-        Sends the results (result_message) to all the players in the game.
+        Sends the results of a round (an encoded RESULTS payload) to a player.
         """
         try:
-            client_socket.sendall(result_message.encode())
+            client_socket.sendall(payload)
         except Exception as e:
-            print(f"Error sending message to client: {e}")
+            Log.error("send_failed", "Error sending message to client: {error}", error=e)
 
-    def declare_winner(self, winner, player_name, client_socket):
+    def declare_winner(self, payload, client_socket):
         """
-        A helper function that sends a message to the players about who won the game.
+        A helper function that sends a player the message about who won the game (an encoded OVER payload).
         """
         try:
-            client_socket.sendall(f"Game over!\nCongratulations to the winner: {winner}\n"
-                                  f"The total number of correct answers from all clients this round: {self.correct_answers}".encode())
+            client_socket.sendall(payload)
         except Exception as e:
-            print(f"Error declaring winner: {e}")
+            Log.error("send_failed", "Error declaring winner: {error}", error=e)
 
 
-server = Server()
-server.start_udp_broadcast()
-udp_broadcast_thread = threading.Thread(target=server.start_udp_broadcast())
-udp_broadcast_thread.start()
-server.accept_tcp_connections()
+if __name__ == "__main__":
+    Server()
 
 
@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import secrets
+from Clock import Clock
+
+"""
+The players' sessions: a framed protocol player gets a session token when it joins a game, and a player whose
+connection drops keeps its seat for a grace window. Reconnecting with the token (see Protocol.build_hello)
+gives the player back its seat, its name and the state of the round in one round trip, without discovering the
+servers again.
+"""
+
+
+class PlayerSession:
+    """
+    A player's seat in a game, kept while its connection is down.
+    """
+
+    def __init__(self, token, player_name, owner):
+        """
+        Attributes:
+            token (str): The secret the player reconnects with.
+            player_name (str): The player's name in the game.
+            owner: The game the seat belongs to (the threaded Server or a GameRoom).
+            dropped_at (float): The clock's time the player's connection dropped at, None while it's connected.
+            resumes (int): The number of times the player reconnected.
+        """
+        self.token = token
+        self.player_name = player_name
+        self.owner = owner
+        self.dropped_at = None
+        self.resumes = 0
+
+
+class SessionRegistry:
+    """
+    The sessions of a server's players, found by their token.
+    The away players of every game are kept in a heap ordered by the end of their grace window, so finding and
+    closing the seats that are due costs only the seats that are due. A player who reconnects (or whose session
+    is closed) leaves a stale entry in the heap, it's skipped when it reaches the top.
+    It's only used by the writer of the game state (the threaded server's game thread or the asyncio engine's
+    event loop), so it needs no lock.
+    """
+
+    def __init__(self, grace=10, clock=None):
+        """
+        Attributes:
+            grace (float): The seconds a dropped player's seat is kept for, 0 to never keep it.
+            clock (Clock): The time the grace window is measured with (see Clock.py).
+            sessions (dict): The live sessions {token: PlayerSession}.
+            away (dict): The heap of the away players of every game {owner: [(deadline, order, dropped_at, session)]}.
+            order (itertools.count): Breaks the ties between the deadlines of the heap.
+            resumed (int): The number of successful reconnections.
+            expired (int): The number of seats lost because the player didn't come back in time.
+        """
+        self.grace = grace
+        self.clock = clock or Clock()
+        self.sessions = {}
+        self.away = {}
+        self.order = itertools.count()
+        self.resumed = 0
+        self.expired = 0
+
+    def issue(self, player_name, owner):
+        """
+        Opens the session of a player who joined a game and returns it.
+        """
+        session = PlayerSession(secrets.token_urlsafe(12), player_name, owner)
+        self.sessions[session.token] = session
+        return session
+
+    def find(self, token):
+        """
+        Returns the session of a token, None if there is none or its grace window is over.
+        """
+        session = self.sessions.get(token)
+        if session is None or self.time_left(session) <= 0:
+            return None
+        return session
+
+    def drop(self, session):
+        """
+        The player's connection dropped: its seat is kept until the grace window is over.
+        Returns False if seats aren't kept (the grace window is 0).
+        """
+        if self.grace <= 0:
+            return False
+        if session.dropped_at is None:
+            session.dropped_at = self.clock.now()
+            heapq.heappush(self.away.setdefault(session.owner, []),
+                           (session.dropped_at + self.grace, next(self.order), session.dropped_at, session))
+        return True
+
+    def resume(self, session):
+        session.dropped_at = None
+        session.resumes += 1
+        self.resumed += 1
+
+    def time_left(self, session):
+        """
+        Returns the seconds left to the player to reconnect, infinity while it's connected.
+        """
+        if session.dropped_at is None:
+            return float("inf")
+        return session.dropped_at + self.grace - self.clock.now()
+
+    def first_away(self, owner):
+        """
+        Drops the stale entries from the top of a game's heap and returns the heap, None if no player is away.
+        """
+        heap = self.away.get(owner)
+        while heap:
+            _, _, dropped_at, session = heap[0]
+            if session.dropped_at == dropped_at and self.sessions.get(session.token) is session:
+                return heap
+            heapq.heappop(heap)
+        self.away.pop(owner, None)
+        return None
+
+    def expire(self, owner):
+        """
+        Closes the sessions of a game whose players didn't reconnect in time and returns them.
+        """
+        expired = []
+        now = self.clock.now()
+        heap = self.first_away(owner)
+        while heap and heap[0][0] <= now:
+            session = heapq.heappop(heap)[3]
+            del self.sessions[session.token]
+            expired.append(session)
+            heap = self.first_away(owner)
+        self.expired += len(expired)
+        return expired
+
+    def next_expiry(self, owner):
+        """
+        Returns the seconds until the next seat of a game is lost, None if no player of the game is away.
+        """
+        heap = self.first_away(owner)
+        return max(0.0, heap[0][0] - self.clock.now()) if heap else None
+
+    def close(self, session):
+        self.sessions.pop(session.token, None)
+
+    def close_all(self, owner):
+        """
+        Closes the sessions of a game that is over.
+        """
+        for token in [token for token, session in self.sessions.items() if session.owner is owner]:
+            del self.sessions[token]
+        self.away.pop(owner, None)
@@ -0,0 +1,165 @@
+import asyncio
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+from Server import Server, RED, YELLOW
+from AsyncServer import AsyncServer
+import Protocol
+import Log
+
+
+def run_worker(worker_id, port_number, stats_queue, server_options, report_interval):
+    """
+    The main function of a worker process: runs an AsyncServer on the shared port (without UDP offers)
+    and reports its counters to the coordinator every report_interval seconds.
+    Each worker keeps its players' statistics in its own log (stats_path + ".<worker_id>"), records its games to its
+    own session file (record_path + ".<worker_id>") and exports its metrics on its own port (metrics_port + worker_id).
+    """
+    if server_options.get("stats_path"):
+        server_options = dict(server_options, stats_path=f"{server_options['stats_path']}.{worker_id}")
+    if server_options.get("record_path"):
+        server_options = dict(server_options, record_path=f"{server_options['record_path']}.{worker_id}")
+    if server_options.get("metrics_port") is not None:
+        server_options = dict(server_options, metrics_port=server_options["metrics_port"] + worker_id)
+    server = AsyncServer(autostart=False, **server_options)
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_interval)
+            stats_queue.put((worker_id, server.stats()))
+
+    async def main():
+        reporter = asyncio.create_task(report())
+        try:
+            await server.serve(port_number, reuse_port=True, broadcast=False)
+        finally:
+            reporter.cancel()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def format_stats(stats):
+    """
+    Returns the counters of a worker (or their total) as name=value pairs.
+    """
+    return ", ".join(f"{name}={value}" for name, value in stats.items())
+
+
+class ShardedServer(Server):
+    """
+    Runs the asyncio engine on several cores.
+
+    The GIL keeps a single server process on one core, so the coordinator starts N worker processes that all
+    listen on the same TCP port with SO_REUSEPORT, and the kernel spreads the new connections between them.
+    Every worker runs its own rooms and games, while the coordinator alone sends the UDP offers and logs
+    the counters each worker reports.
+    """
+
+    def __init__(self, workers=None, autostart=True, report_interval=10, **server_options):
+        """
+        Attributes:
+            workers (int): The number of worker processes, one per core by default.
+            report_interval (int): Seconds between two reports of the workers' counters.
+            server_options (dict): The options of each worker's AsyncServer (lobby_timeout, room_size...).
+            processes (list): The worker processes.
+            stats_queue (multiprocessing.Queue): The queue the workers send their counters through.
+            worker_stats (dict): The last counters reported by every worker {worker_id: stats}.
+        """
+        super().__init__(autostart=False)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.report_interval = report_interval
+        self.server_options = server_options
+        self.processes = []
+        self.stats_queue = multiprocessing.Queue()
+        self.worker_stats = {}
+        if autostart:
+            self.start()
+
+    def start(self):
+        """
+        Starts the workers on a free port, the stats reporter and then broadcasts the offers (blocking).
+        """
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise OSError("SO_REUSEPORT is not supported on this platform, run the server with a single process")
+        self.port_number = self.find_free_port()
+        self.start_workers()
+        threading.Thread(target=self.collect_stats, daemon=True).start()
+        try:
+            self.start_udp_broadcast()
+        finally:
+            self.stop_workers()
+
+    def start_workers(self):
+        """
+        Starts the worker processes, all listening on self.port_number.
+        """
+        for worker_id in range(1, self.workers + 1):
+            process = multiprocessing.Process(target=run_worker, daemon=True,
+                                              args=(worker_id, self.port_number, self.stats_queue,
+                                                    self.server_options, self.report_interval))
+            process.start()
+            self.processes.append(process)
+        Log.info("workers_started", "Started {workers} workers on port {port}", YELLOW,
+                 workers=self.workers, port=self.port_number)
+
+    def stop_workers(self):
+        """
+        Stops the worker processes.
+        """
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    def collect_stats(self):
+        """
+        Receives the counters of the workers and logs them with their total every report_interval seconds.
+        """
+        last_report = time.monotonic()
+        while True:
+            try:
+                worker_id, stats = self.stats_queue.get(timeout=self.report_interval)
+                self.worker_stats[worker_id] = stats
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_report >= self.report_interval and self.worker_stats:
+                last_report = time.monotonic()
+                self.print_stats()
+
+    def total_stats(self):
+        """
+        Returns the sum of the last counters reported by the workers.
+        """
+        total = {}
+        for stats in self.worker_stats.values():
+            for name, value in stats.items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def offer_load(self):
+        """
+        Returns the load sent with the offers, from the last counters reported by the workers.
+        """
+        if not self.worker_stats:
+            return Protocol.FREE_SEATS_UNLIMITED, 0, Protocol.PHASE_LOBBY
+        total = self.total_stats()
+        free_seats = min(total.get("free_seats", 0), Protocol.FREE_SEATS_UNLIMITED)
+        phase = Protocol.PHASE_LOBBY if free_seats > 0 else Protocol.PHASE_QUESTION
+        return free_seats, total.get("active_rooms", 0), phase
+
+    def print_stats(self):
+        """
+        Logs the counters of every worker and their total.
+        """
+        for worker_id, stats in sorted(self.worker_stats.items()):
+            Log.info("worker_stats", "Worker {worker}: {stats}", worker=worker_id, stats=format_stats(stats))
+        dead = [process.pid for process in self.processes if not process.is_alive()]
+        if dead:
+            Log.error("workers_stopped", "Workers {pids} are not running", RED, pids=dead)
+        Log.info("workers_total", "All workers: {stats}", YELLOW, stats=format_stats(self.total_stats()))
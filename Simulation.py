@@ -0,0 +1,364 @@
+import argparse
+import asyncio
+import random
+import selectors
+import time
+from RoomManager import RoomManager
+from QuestionBank import TRUE_ANSWER, FALSE_ANSWER
+from Server import RED, GREEN, RESET
+import Protocol
+import Metrics
+import Log
+
+"""
+The simulation mode of the game: the asyncio engine's rooms play complete games against scripted players,
+on a virtual clock and through in-memory connections, so thousands of games take seconds instead of hours.
+
+The limit is the rooms' own work, not the simulation: every round of every game still creates a task per player,
+encodes, sends and decodes the real frames and evaluates the answers. On one core that is about 13,000 player
+rounds per second, about 1,200 games per second of 4 players and 600 of 8 players. More games per second take
+more processes, as the tournament mode does (see Tournament.py).
+"""
+
+DISCONNECT = object()  # a strategy's answer that drops the player's connection
+
+
+def answer_right(player, rng):
+    return player.room.correct_answer[0]
+
+
+def answer_wrong(player, rng):
+    return FALSE_ANSWER[0] if player.room.correct_answer[0] in TRUE_ANSWER else TRUE_ANSWER[0]
+
+
+def answer_random(player, rng):
+    return rng.choice(TRUE_ANSWER + FALSE_ANSWER)
+
+
+def answer_nothing(player, rng):
+    return None
+
+
+def disconnect(player, rng):
+    return DISCONNECT
+
+
+# The scripted players' strategies: called with the player and the simulation's random generator when a
+# question arrives, they return the answer, None to stay silent or DISCONNECT
+STRATEGIES = {"right": answer_right, "wrong": answer_wrong, "random": answer_random, "silent": answer_nothing,
+              "disconnect": disconnect}
+
+# The edge cases, as the strategies of the players of each game (cycled over the seats)
+SCENARIOS = {"random": ("random",),
+             "all-wrong": ("wrong",),
+             "all-disconnected": ("disconnect",),
+             "all-silent": ("silent",),
+             "ties": ("right",),
+             "mixed": ("right", "random", "wrong", "silent", "disconnect")}
+
+
+class VirtualSelector(selectors.BaseSelector):
+    """
+    The selector of a VirtualEventLoop: the loop asks it to wait for I/O until its next timer, it moves the
+    virtual time to that timer instead and reports no I/O. The players talk to the rooms through in-memory
+    connections (see MemoryTransport), so the only file the loop registers is its own wake-up pipe.
+    """
+
+    def __init__(self):
+        """
+        Attributes:
+            virtual_time (float): The loop's time, in virtual seconds since the simulation started.
+            keys (dict): The registered files {fd: selectors.SelectorKey}.
+        """
+        self.virtual_time = 0.0
+        self.keys = {}
+
+    def register(self, fileobj, events, data=None):
+        key = selectors.SelectorKey(fileobj, fileobj if isinstance(fileobj, int) else fileobj.fileno(), events, data)
+        self.keys[key.fd] = key
+        return key
+
+    def unregister(self, fileobj):
+        return self.keys.pop(fileobj if isinstance(fileobj, int) else fileobj.fileno())
+
+    def select(self, timeout=None):
+        """
+        Called by the loop when it would wait: moves the time to the next timer instead.
+        """
+        if timeout is None:
+            raise RuntimeError("The simulation is stuck: nothing is scheduled and nothing can arrive")
+        self.virtual_time += timeout
+        return []
+
+    def get_map(self):
+        return self.keys
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """
+    An asyncio event loop on a virtual clock: when no callback is ready, the time jumps straight to the next
+    timer instead of sleeping, so a 10 second answer timeout costs nothing.
+    It's a standard selector event loop built with a VirtualSelector, whose clock is also the loop's time().
+    """
+
+    def __init__(self):
+        self.virtual_selector = VirtualSelector()
+        super().__init__(self.virtual_selector)
+
+    def time(self):
+        return self.virtual_selector.virtual_time
+
+
+class MemoryTransport:
+    """
+    The room's side of a scripted player's connection: what the room writes is handed to the player at once.
+    """
+
+    def __init__(self, player):
+        self.player = player
+        self.closing = False
+
+    def write(self, data):
+        if not self.closing:
+            self.player.receive(data)
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        if not self.closing:
+            self.closing = True
+            self.player.disconnected()
+
+    def abort(self):
+        self.close()
+
+
+class MemoryWriter:
+    """The part of asyncio.StreamWriter the rooms use, on a MemoryTransport."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def close(self):
+        self.transport.close()
+
+
+class ScriptedPlayer:
+    """
+    A simulated player: answers each question with its strategy after a random think time (virtual seconds).
+    """
+
+    def __init__(self, player_name, strategy, seat, think_time, rng):
+        """
+        Attributes:
+            player_name (str): The name the player joins with.
+            strategy (str): The name of the player's strategy (see STRATEGIES).
+            seat (int): The player's position in the game's join order, to check the game is fair to every seat.
+            think_time (tuple): The (shortest, longest) seconds the player takes to answer.
+            questions (int): The questions the player received.
+            bytes_received (int): The bytes the room sent to the player.
+            question_bytes (int): The part of bytes_received that carried the questions and the roster.
+            won (bool): Whether the player was declared the winner.
+            connected (bool): False once either side closed the connection.
+        """
+        self.player_name = player_name
+        self.strategy = strategy
+        self.seat = seat
+        self.think_time = think_time
+        self.rng = rng
+        self.codec = Protocol.FrameCodec()
+        self.reader = asyncio.StreamReader()
+        self.writer = MemoryWriter(MemoryTransport(self))
+        self.room = None
+        self.questions = 0
+        self.bytes_received = 0
+        self.question_bytes = 0
+        self.won = False
+        self.connected = True
+
+    def join(self, room, address):
+        """
+        Joins a room with the framed protocol's name handshake, as a real client would.
+        """
+        self.room = room
+        player_name, codec = Protocol.parse_hello(Protocol.build_hello(self.player_name))
+        Metrics.CONNECTIONS.inc()
+        room.add_player(player_name, self.reader, self.writer, codec, address)
+
+    def receive(self, data):
+        self.bytes_received += len(data)
+        for kind, text in self.codec.feed(data):
+            if kind in (Protocol.QUESTION, Protocol.ROSTER, Protocol.ROSTER_DELTA):
+                self.question_bytes += Protocol.HEADER.size + len(text.encode())
+            if kind == Protocol.QUESTION:
+                self.questions += 1
+                loop = asyncio.get_running_loop()
+                loop.call_later(self.rng.uniform(*self.think_time), self.answer, STRATEGIES[self.strategy](self, self.rng))
+            elif kind == Protocol.WINNER:
+                self.won = f"winner: {self.player_name}\n" in text + "\n"
+
+    def answer(self, answer):
+        if not self.connected or answer is None:
+            return
+        if answer is DISCONNECT:
+            self.writer.close()
+        else:
+            self.reader.feed_data(Protocol.encode_frame(Protocol.ANSWER, answer))
+
+    def disconnected(self):
+        self.connected = False
+        self.reader.feed_eof()
+
+
+class Simulation:
+    """
+    Plays games of the asyncio engine's rooms (see GameRoom.py) against scripted players on a VirtualEventLoop.
+
+    Each game gets its own players, who join a room through the name handshake and fill it, so the game starts
+    at once. The game logic, the messages and the timeouts are the real ones, only the clock and the connections
+    are simulated. A game that is still running after max_game_time virtual seconds (e.g. players who all answer
+    the same every round) is stopped and counted as unfinished.
+    """
+
+    def __init__(self, games=1000, players=4, strategies=("random",), think_time=(0.1, 3.0), concurrency=10,
+                 seed=None, max_game_time=3600, answer_timeout=10, round_deadline=12):
+        """
+        Attributes:
+            games (int): The number of games to play.
+            players (int): The players of each game.
+            strategies (tuple): The strategies of the players, cycled over the seats of each game.
+            think_time (tuple): The (shortest, longest) seconds a player takes to answer.
+            concurrency (int): The most games played at the same time.
+            seed (int): Seeds the players and the questions, so a simulation can be run again the same way.
+            max_game_time (float): The virtual seconds after which a game is stopped.
+            results (dict): The counters of the simulation (see report).
+        """
+        self.games = games
+        self.players = players
+        self.strategies = tuple(strategies)
+        self.think_time = think_time
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.max_game_time = max_game_time
+        self.answer_timeout = answer_timeout
+        self.round_deadline = round_deadline
+        self.results = {"games": 0, "rounds": 0, "won": 0, "no_winner": 0, "unfinished": 0,
+                        "wins_by_seat": [0] * players, "wins_by_strategy": {}, "round_gaps": [], "bytes": 0, "question_bytes": 0,
+                        "virtual_seconds": 0.0, "wall_seconds": 0.0}
+
+    def run(self):
+        """
+        Plays every game and returns the results.
+        """
+        loop = VirtualEventLoop()
+        start = time.perf_counter()
+        try:
+            loop.run_until_complete(self.play_all())
+        finally:
+            loop.close()
+        self.results["wall_seconds"] = time.perf_counter() - start
+        self.results["virtual_seconds"] = loop.time()
+        return self.results
+
+    async def play_all(self):
+        # The lobby timer never fires: the last player of a game fills the room
+        room_manager = RoomManager(lobby_timeout=self.max_game_time, answer_timeout=self.answer_timeout,
+                                   round_deadline=self.round_deadline, room_size=self.players)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def play_slot(game_number):
+            async with slots:
+                await self.play_game(room_manager, game_number)
+
+        await asyncio.gather(*(play_slot(game_number) for game_number in range(1, self.games + 1)))
+
+    async def play_game(self, room_manager, game_number):
+        """
+        Plays a single game and counts its outcome.
+        """
+        room = room_manager.get_open_room()
+        room.qm.rng.seed(self.rng.getrandbits(32))
+        players = [ScriptedPlayer(f"Player{seat}", self.strategies[seat % len(self.strategies)], seat,
+                                  self.think_time, self.rng)
+                   for seat in range(self.players)]
+        for player in players:
+            player.join(room, ("simulation", game_number))
+        # Read as soon as the game is over: the room is reused by the next game, which starts with no gaps
+        gaps = []
+        room.game_task.add_done_callback(lambda game_task: gaps.extend(room.round_scheduler.gaps))
+        try:
+            await asyncio.wait_for(room.game_task, self.max_game_time)
+        except asyncio.TimeoutError:
+            self.results["unfinished"] += 1
+
+        self.results["games"] += 1
+        self.results["rounds"] += max(player.questions for player in players)
+        self.results["round_gaps"] += gaps
+        self.results["bytes"] += sum(player.bytes_received for player in players)
+        self.results["question_bytes"] += sum(player.question_bytes for player in players)
+        winners = [player for player in players if player.won]
+        if winners:
+            self.results["won"] += 1
+            self.results["wins_by_seat"][winners[0].seat] += 1
+            wins_by_strategy = self.results["wins_by_strategy"]
+            wins_by_strategy[winners[0].strategy] = wins_by_strategy.get(winners[0].strategy, 0) + 1
+        else:
+            self.results["no_winner"] += 1
+
+
+def report(results):
+    """
+    Returns the results of a simulation as text.
+    """
+    wall_seconds = results["wall_seconds"]
+    finished = results["games"] - results["unfinished"]
+    gaps = results["round_gaps"] or [0.0]
+    return "\n".join([
+        f"{results['games']} games ({results['rounds']} rounds) in {wall_seconds:.2f} seconds: "
+        f"{results['games'] / wall_seconds if wall_seconds else 0:.0f} games per second, "
+        f"{results['virtual_seconds']:.0f} virtual seconds",
+        f"Won: {results['won']}, no winner: {results['no_winner'] - results['unfinished']}, "
+        f"unfinished: {results['unfinished']} ({finished} finished)",
+        "Wins by seat: " + ", ".join(f"{seat}: {wins}" for seat, wins in enumerate(results["wins_by_seat"])),
+        "Wins by strategy: " + ", ".join(f"{name}: {wins}" for name, wins in sorted(results["wins_by_strategy"].items())),
+        f"Gap from the end of a round to the next question: {sum(gaps) / len(gaps):.3f} seconds on average, "
+        f"{min(gaps):.3f} to {max(gaps):.3f}",
+        f"Bytes sent to the players: {results['bytes'] // max(1, results['rounds'])} per round, "
+        f"{results['question_bytes'] // max(1, results['rounds'])} of them questions and roster",
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays simulated games against scripted players on a virtual clock.")
+    parser.add_argument("--games", type=int, default=1000, help="the number of games to play")
+    parser.add_argument("--players", type=int, default=4, help="the players of each game")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="random",
+                        help="the players' strategies: an edge case or random answers")
+    parser.add_argument("--strategies", default=None,
+                        help=f"the players' strategies cycled over the seats, e.g. right,random (of {', '.join(STRATEGIES)})")
+    parser.add_argument("--think-min", type=float, default=0.1, help="the shortest virtual seconds to answer")
+    parser.add_argument("--think-max", type=float, default=3.0, help="the longest virtual seconds to answer")
+    parser.add_argument("--concurrency", type=int, default=10, help="the most games played at the same time")
+    parser.add_argument("--max-game-time", type=float, default=3600, help="stop a game after this many virtual seconds")
+    parser.add_argument("--seed", type=int, default=None, help="seed the simulation to run it again the same way")
+    parser.add_argument("--verbose", action="store_true", help="print the game's logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        Log.configure(level="ERROR")
+    strategies = args.strategies.split(",") if args.strategies else SCENARIOS[args.scenario]
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies {', '.join(unknown)}")
+    simulation = Simulation(args.games, args.players, strategies, (args.think_min, args.think_max), args.concurrency,
+                            args.seed, args.max_game_time)
+    simulation_results = simulation.run()
+    colour = RED if simulation_results["unfinished"] else GREEN
+    print(colour + report(simulation_results) + RESET)
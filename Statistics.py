@@ -1,10 +1,13 @@
+import json
+import os
 import re
+from Leaderboard import Leaderboard
 
 
 class Statistics:
     """A class that stores data for statistics calculations of the players' performance"""
     def __init__(self):
-        self.player_stats = {}  # Dictionary to store player statistics
+        self.player_stats = {}  # Dictionary to store player statistics {player_name: {rounds, correct_answers, answer_time}}
         self.player_victories = {}  # Dictionary to store player victories
         self.player_games_played = {}  # Dictionary to store number of games each player played
 
@@ -15,4 +18,206 @@ class Statistics:
             return round_number
         else:
             return None
-            
+
+    def add_answer(self, player_name, correct, latency):
+        """
+        Counts a player's answer to a round in O(1): the round, whether it was correct and how long it took (seconds).
+        """
+        stats = self.player_stats.get(player_name)
+        if stats is None:
+            stats = self.player_stats[player_name] = {"rounds": 0, "correct_answers": 0, "answer_time": 0.0}
+        stats["rounds"] += 1
+        stats["correct_answers"] += 1 if correct else 0
+        stats["answer_time"] += latency
+
+    def add_game(self, player_name, won):
+        """
+        Counts a game a player played in O(1), and the victory if the player won it.
+        """
+        self.player_games_played[player_name] = self.player_games_played.get(player_name, 0) + 1
+        if won:
+            self.player_victories[player_name] = self.player_victories.get(player_name, 0) + 1
+
+    def player_summary(self, player_name):
+        """
+        Returns a player's totals: rounds, correct answers, accuracy (%), average answer time, games and wins.
+        """
+        stats = self.player_stats.get(player_name, {"rounds": 0, "correct_answers": 0, "answer_time": 0.0})
+        rounds = stats["rounds"]
+        return {"player": player_name,
+                "rounds": rounds,
+                "correct_answers": stats["correct_answers"],
+                "accuracy": 100 * stats["correct_answers"] / rounds if rounds else 0.0,
+                "average_answer_time": stats["answer_time"] / rounds if rounds else 0.0,
+                "games_played": self.player_games_played.get(player_name, 0),
+                "wins": self.player_victories.get(player_name, 0)}
+
+    def merge(self, other):
+        """
+        Adds the totals of another Statistics to these ones.
+        """
+        for player_name, stats in other.player_stats.items():
+            totals = self.player_stats.setdefault(player_name, {"rounds": 0, "correct_answers": 0, "answer_time": 0.0})
+            for name, value in stats.items():
+                totals[name] += value
+        for player_name, wins in other.player_victories.items():
+            self.player_victories[player_name] = self.player_victories.get(player_name, 0) + wins
+        for player_name, games in other.player_games_played.items():
+            self.player_games_played[player_name] = self.player_games_played.get(player_name, 0) + games
+
+    def as_snapshot(self):
+        """
+        Returns the totals as a JSON-serializable dict.
+        """
+        return {"player_stats": self.player_stats, "player_victories": self.player_victories,
+                "player_games_played": self.player_games_played}
+
+    def load_snapshot(self, snapshot):
+        """
+        Replaces the totals with the ones of a snapshot (see as_snapshot).
+        """
+        self.player_stats = snapshot.get("player_stats", {})
+        self.player_victories = snapshot.get("player_victories", {})
+        self.player_games_played = snapshot.get("player_games_played", {})
+
+
+class StatsStore:
+    """
+    The server's persistent player statistics.
+
+    Every answer and every finished game is appended to a log file (one JSON record per line) and added to the
+    in-memory totals (a Statistics) in O(1). The log is only written to the OS buffers while a game is played
+    and flushed once the game is over, so the round loop never waits for the disk.
+
+    The snapshot file next to the log holds the totals and the log offset they cover. On startup the snapshot is
+    loaded, only the records appended after it are replayed, and a new snapshot is written (compaction), so a
+    restart doesn't replay the whole log.
+
+    The store also keeps the players' Leaderboard (see Leaderboard.py), updated at the end of every game.
+    """
+
+    def __init__(self, path):
+        """
+        Attributes:
+            path (str): The log file, the snapshot is path + ".snapshot".
+            statistics (Statistics): The totals of every player.
+            log_file (file): The log, opened for appending.
+            records_replayed (int): The number of log records replayed on startup.
+            leaderboard (Leaderboard): The players ranked by wins and by accuracy.
+        """
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.statistics = Statistics()
+        self.log_file = None
+        self.records_replayed = 0
+        self.leaderboard = None
+
+    @classmethod
+    def open(cls, path):
+        """
+        Loads the statistics of a log file (creating it if needed) and opens it for appending.
+        """
+        store = cls(path)
+        store.load(repair=True)
+        store.log_file = open(path, "ab")
+        store.compact()
+        store.leaderboard = Leaderboard(store.statistics)
+        return store
+
+    @classmethod
+    def read(cls, paths):
+        """
+        Loads the statistics of one or more logs (the logs of a sharded server's workers) without writing to them,
+        e.g. to query the leaderboard while the server runs.
+        """
+        store = cls(paths[0])
+        for path in paths:
+            worker_store = cls(path)
+            worker_store.load()
+            store.statistics.merge(worker_store.statistics)
+            store.records_replayed += worker_store.records_replayed
+        store.leaderboard = Leaderboard(store.statistics)
+        return store
+
+    def load(self, repair=False):
+        """
+        Loads the snapshot, then replays the log records that were appended after it.
+        An incomplete last record (being written, or the server stopped in the middle of writing it) is skipped,
+        and cut from the log if repair is True.
+        """
+        offset = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            self.statistics.load_snapshot(snapshot)
+            offset = snapshot.get("offset", 0)
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b" if repair else "rb") as log_file:
+            size = log_file.seek(0, os.SEEK_END)
+            if offset > size:  # the log was replaced, everything in it is newer than the snapshot
+                offset = 0
+            log_file.seek(offset)
+            end = offset
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    break
+                self.apply(json.loads(line))
+                self.records_replayed += 1
+                end += len(line)
+            if repair and end < size:
+                log_file.truncate(end)
+
+    def apply(self, record):
+        """
+        Adds a log record to the totals.
+        """
+        if record[0] == "answer":
+            _, player_name, correct, latency = record
+            self.statistics.add_answer(player_name, correct, latency)
+        elif record[0] == "game":
+            _, player_name, won = record
+            self.statistics.add_game(player_name, won)
+
+    def append(self, record):
+        """
+        Adds a record to the totals and to the log.
+        """
+        self.apply(record)
+        self.log_file.write(json.dumps(record).encode() + b"\n")
+
+    def record_answer(self, player_name, correct, latency):
+        """
+        Records a player's answer to a round, latency is the seconds from the question to the answer.
+        """
+        self.append(["answer", player_name, 1 if correct else 0, round(latency, 3)])
+
+    def record_game(self, players, winner):
+        """
+        Records a finished game for each of its players, moves them on the leaderboard and flushes the log.
+        """
+        for player_name in players:
+            self.append(["game", player_name, 1 if player_name == winner else 0])
+            self.leaderboard.update(player_name)
+        self.log_file.flush()
+
+    def compact(self):
+        """
+        Writes the totals and the log offset they cover to the snapshot file (atomically, through a temporary file).
+        """
+        self.log_file.flush()
+        snapshot = self.statistics.as_snapshot()
+        snapshot["offset"] = self.log_file.tell()
+        temporary_path = self.snapshot_path + ".tmp"
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary_path, self.snapshot_path)
+
+    def close(self):
+        """
+        Writes a last snapshot and closes the log.
+        """
+        if self.log_file is not None:
+            self.compact()
+            self.log_file.close()
+            self.log_file = None
@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+from GameRoom import GameRoom
+from Simulation import VirtualEventLoop, ScriptedPlayer, STRATEGIES, SCENARIOS
+from Server import GREEN, YELLOW, RESET
+import Log
+
+"""
+The tournament mode: thousands of entrants are split into small games played at the same time, the winner of
+each game moves on to the next level of the bracket, until one champion is left.
+
+The games are the asyncio engine's rooms (see GameRoom.py), so every game has the real questions, answers and
+eliminations of evaluate_and_update_scores. The games of a level are spread over a pool of worker processes and
+each worker plays its share at the same time on a virtual clock (see Simulation.py), so the tournament takes as
+many game times as the bracket has levels, however many entrants it has.
+"""
+
+
+class Bracket:
+    """
+    The bracket of a tournament: splits the entrants of each level into games of at most game_size players and
+    moves the winners on to the next level.
+    """
+
+    def __init__(self, entrants, game_size=4):
+        """
+        Attributes:
+            entrants (list): The (player_name, strategy) of every entrant, in seeding order.
+            game_size (int): The most players of a game, at least 2.
+            current (list): The entrants still in the tournament.
+            levels (list): The games of every level played so far, each game a list of entrants.
+        """
+        if game_size < 2:
+            raise ValueError("a game needs at least 2 players")
+        self.entrants = list(entrants)
+        self.game_size = game_size
+        self.current = list(entrants)
+        self.levels = []
+
+    def is_over(self):
+        return len(self.current) <= 1
+
+    def champion(self):
+        """
+        Returns the entrant who won the tournament, None while it isn't over.
+        """
+        return self.current[0] if len(self.current) == 1 else None
+
+    def next_games(self):
+        """
+        Splits the entrants of the next level into games and returns them.
+        The entrants are dealt over the games like cards, so the games differ by one player at most and the top
+        seeds meet as late as possible.
+        """
+        games = [[] for _ in range(-(-len(self.current) // self.game_size))]
+        for position, entrant in enumerate(self.current):
+            games[position % len(games)].append(entrant)
+        self.levels.append(games)
+        return games
+
+    def advance(self, winners):
+        """
+        Moves the winners of the last level's games, in the games' order, on to the next level.
+        """
+        self.current = list(winners)
+
+
+def quiet_worker():
+    """Keeps the workers' game logs out of the tournament's report."""
+    Log.configure(level="ERROR")
+
+
+def play_games(games, seed, options):
+    """
+    Plays games at the same time on a virtual clock, in a worker process. Returns for every game the winner, the
+    virtual seconds it took, how many times it was replayed and whether it was decided by seed.
+    """
+    loop = VirtualEventLoop()
+    rng = random.Random(seed)
+    try:
+        return loop.run_until_complete(play_all(games, rng, options))
+    finally:
+        loop.close()
+
+
+async def play_all(games, rng, options):
+    return await asyncio.gather(*(play_game(game_number, game, rng, options) for game_number, game in enumerate(games)))
+
+
+async def play_game(game_number, game, rng, options):
+    """
+    Plays a single game of the bracket. A game without a winner (every player out in the same round, or still
+    tied after max_game_time) is played again, up to max_replays times, then its first seed moves on.
+    An entrant alone in its game moves on without playing.
+    """
+    if len(game) == 1:
+        return game[0], 0.0, 0, False
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for replay in range(options["max_replays"] + 1):
+        room = GameRoom(game_number, options["max_game_time"], options["answer_timeout"], options["round_deadline"],
+                        max_players=len(game))
+        room.qm.rng.seed(rng.getrandbits(32))
+        players = [ScriptedPlayer(player_name, strategy, seat, options["think_time"], rng)
+                   for seat, (player_name, strategy) in enumerate(game)]
+        for player in players:
+            player.join(room, ("tournament", game_number))
+        try:
+            await asyncio.wait_for(room.game_task, options["max_game_time"])
+        except asyncio.TimeoutError:
+            pass
+        for player, entrant in zip(players, game):
+            if player.won:
+                return entrant, loop.time() - start, replay, False
+    return game[0], loop.time() - start, options["max_replays"], True
+
+
+class Tournament:
+    """
+    Runs a tournament of scripted entrants through its bracket, one level at a time, each level's games spread
+    over a pool of worker processes.
+    """
+
+    def __init__(self, entrants=1024, game_size=4, strategies=("random",), think_time=(0.1, 3.0), workers=None,
+                 seed=None, max_game_time=3600, max_replays=3, answer_timeout=10, round_deadline=12):
+        """
+        Attributes:
+            bracket (Bracket): The entrants' games, level by level.
+            workers (int): The worker processes playing the games, one per core by default.
+            rng (random.Random): Seeds the workers, so a tournament can be run again the same way.
+            options (dict): The settings of every game (see play_game).
+            results (dict): The counters of the tournament (see report).
+        """
+        players = [(f"Entrant{number}", strategies[number % len(strategies)]) for number in range(entrants)]
+        self.bracket = Bracket(players, game_size)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.rng = random.Random(seed)
+        self.options = {"think_time": think_time, "max_game_time": max_game_time, "max_replays": max_replays,
+                        "answer_timeout": answer_timeout, "round_deadline": round_deadline}
+        self.results = {"entrants": entrants, "workers": self.workers, "levels": [], "champion": None,
+                        "wall_seconds": 0.0}
+
+    def run(self):
+        """
+        Plays the whole tournament and returns the results.
+        """
+        start = time.perf_counter()
+        with multiprocessing.Pool(self.workers, initializer=quiet_worker) as pool:
+            while not self.bracket.is_over():
+                self.play_level(pool)
+        self.results["champion"] = self.bracket.champion()
+        self.results["wall_seconds"] = time.perf_counter() - start
+        return self.results
+
+    def play_level(self, pool):
+        """
+        Plays the games of the next level, a share of them in each worker, and moves the winners on.
+        """
+        level_start = time.perf_counter()
+        games = self.bracket.next_games()
+        share = -(-len(games) // self.workers)
+        batches = [(games[first:first + share], self.rng.getrandbits(32), self.options)
+                   for first in range(0, len(games), share)]
+        outcomes = [outcome for batch in pool.starmap(play_games, batches) for outcome in batch]
+        self.bracket.advance([winner for winner, _, _, _ in outcomes])
+        self.results["levels"].append({
+            "games": len(games),
+            "players": sum(len(game) for game in games),
+            "virtual_seconds": max(seconds for _, seconds, _, _ in outcomes),
+            "replays": sum(replays for _, _, replays, _ in outcomes),
+            "by_seed": sum(1 for _, _, _, by_seed in outcomes if by_seed),
+            "wall_seconds": time.perf_counter() - level_start})
+
+
+def report(results):
+    """
+    Returns the results of a tournament as text.
+    """
+    levels = results["levels"]
+    lines = [f"{results['entrants']} entrants, {len(levels)} levels, {sum(level['games'] for level in levels)} games "
+             f"in {results['wall_seconds']:.2f} seconds on {results['workers']} workers"]
+    for number, level in enumerate(levels, 1):
+        lines.append(f"Level {number}: {level['players']} players in {level['games']} games, "
+                     f"{level['wall_seconds']:.2f} seconds, {level['virtual_seconds']:.0f} virtual seconds, "
+                     f"{level['replays']} replayed, {level['by_seed']} decided by seed")
+    lines.append(f"Tournament time: {sum(level['virtual_seconds'] for level in levels):.0f} virtual seconds "
+                 f"(the longest game of every level)")
+    champion = results["champion"]
+    lines.append(f"Champion: {champion[0]} ({champion[1]})" if champion else "No champion")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays a bracketed tournament of simulated games on a process pool.")
+    parser.add_argument("--entrants", type=int, default=1024, help="the number of players entering the tournament")
+    parser.add_argument("--game-size", type=int, default=4, help="the most players of each game of the bracket")
+    parser.add_argument("--workers", type=int, default=None, help="the worker processes (one per core by default)")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="random",
+                        help="the entrants' strategies: an edge case or random answers")
+    parser.add_argument("--strategies", default=None,
+                        help=f"the entrants' strategies cycled over the seeds, e.g. right,random (of {', '.join(STRATEGIES)})")
+    parser.add_argument("--think-min", type=float, default=0.1, help="the shortest virtual seconds to answer")
+    parser.add_argument("--think-max", type=float, default=3.0, help="the longest virtual seconds to answer")
+    parser.add_argument("--max-game-time", type=float, default=3600, help="stop a game after this many virtual seconds")
+    parser.add_argument("--max-replays", type=int, default=3,
+                        help="replay a game without a winner this many times before its first seed moves on")
+    parser.add_argument("--seed", type=int, default=None, help="seed the tournament to run it again the same way")
+    args = parser.parse_args()
+
+    strategies = args.strategies.split(",") if args.strategies else SCENARIOS[args.scenario]
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies {', '.join(unknown)}")
+    if args.entrants < 1 or args.game_size < 2:
+        parser.error("a tournament needs at least 1 entrant and games of at least 2 players")
+    Log.configure(level="ERROR")
+    tournament = Tournament(args.entrants, args.game_size, strategies, (args.think_min, args.think_max), args.workers,
+                            args.seed, args.max_game_time, args.max_replays)
+    tournament_results = tournament.run()
+    decided_by_seed = sum(level["by_seed"] for level in tournament_results["levels"])
+    colour = YELLOW if decided_by_seed else GREEN
+    print(colour + report(tournament_results) + RESET)
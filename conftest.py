@@ -0,0 +1,21 @@
+import pytest
+from Clock import Clock
+
+"""
+The test doubles shared by the tests.
+"""
+
+
+class ManualClock(Clock):
+    """A clock that only moves when the test moves it."""
+
+    def __init__(self):
+        self.time = 100.0
+
+    def now(self):
+        return self.time
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
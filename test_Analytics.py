@@ -0,0 +1,83 @@
+import csv
+import pytest
+from QuestionBank import QuestionBank
+from Recorder import SessionRecorder
+
+np = pytest.importorskip("numpy")
+from Analytics import AnswerTable, AnswerAnalytics
+
+"""
+The offline analytics of a recorded session, down to the difficulty table and the rated question bank.
+"""
+
+QUESTIONS = [{'question': "Villa won the 1982 European Cup", 'answer': ['T'], 'difficulty': 3},
+             {'question': "Villa Park is in Manchester", 'answer': ['F'], 'difficulty': 3},
+             {'question': "Villa were founded in 1874", 'answer': ['T'], 'difficulty': 2}]
+PLAYERS = ["Alice", "Bob", "Charlie", "Dave"]
+
+
+def record_session(path, games=2):
+    """
+    Records games where everyone gets the first question right and only Alice the second (Dave doesn't answer it).
+    The third question is never asked.
+    """
+    recorder = SessionRecorder.open(path)
+    for _ in range(games):
+        game, _ = recorder.start_game(PLAYERS)
+        recorder.question(game, 1, 0)
+        for player_name in PLAYERS:
+            recorder.answer(game, player_name, "T")
+        recorder.result(game, 1, PLAYERS)
+        recorder.question(game, 2, 1)
+        recorder.answer(game, "Alice", "F")
+        recorder.answer(game, "Bob", "T")
+        recorder.answer(game, "Charlie", "true")
+        recorder.timeout(game, "Dave")
+        recorder.result(game, 2, ["Alice"])
+        recorder.finish(game, "Alice")
+    recorder.close()
+
+
+def test_difficulty_table_of_a_recorded_session(tmp_path):
+    session_path = str(tmp_path / "games.trs")
+    record_session(session_path)
+    table = AnswerTable.from_sessions([session_path])
+    assert len(table) == 16
+    assert table.names == PLAYERS
+    assert table.answered.sum() == 14
+
+    analytics = AnswerAnalytics(table, QuestionBank.from_questions(QUESTIONS))
+    stats = analytics.question_stats()
+    assert stats["attempts"].tolist() == [8, 8, 0]
+    assert stats["accuracy"][:2].tolist() == [1.0, 0.25]
+    assert stats["timeout_rate"][:2].tolist() == [0.0, 0.25]
+    assert np.isnan(stats["accuracy"][2])
+    # The questions answered right by most are the easiest, the one never asked keeps the level of the bank
+    levels = analytics.difficulty_levels(stats, min_answers=8)
+    assert levels.tolist() == [1, 4, 2]
+    assert analytics.difficulty_levels(stats, min_answers=9).tolist() == [3, 3, 2]
+
+    table_path = str(tmp_path / "difficulty.csv")
+    analytics.write_table(table_path, stats, levels)
+    with open(table_path, newline="") as table_file:
+        rows = list(csv.DictReader(table_file))
+    assert [(row["difficulty"], row["attempts"], row["accuracy"]) for row in rows] == [
+        ("1", "8", "1.0000"), ("4", "8", "0.2500"), ("2", "0", "nan")]
+
+    bank_path = str(tmp_path / "rated.tqb")
+    analytics.write_bank(bank_path, levels)
+    rated = QuestionBank.open(bank_path)
+    assert [rated.question(question_id)["difficulty"] for question_id in range(3)] == [1, 4, 2]
+    assert rated.question(1)["question"] == "Villa Park is in Manchester"
+
+
+def test_cached_table_loads_the_same_answers(tmp_path):
+    session_path = str(tmp_path / "games.trs")
+    record_session(session_path, games=1)
+    table = AnswerTable.from_sessions([session_path])
+    cache_path = str(tmp_path / "answers.npz")
+    table.save(cache_path)
+    cached = AnswerTable.open([cache_path])
+    assert cached.names == table.names
+    for column in ("game", "question", "player", "answer", "answered"):
+        assert getattr(cached, column).tolist() == getattr(table, column).tolist()
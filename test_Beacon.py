@@ -0,0 +1,46 @@
+import Protocol
+from Beacon import OfferBeacon, add_datagram, merge_loads, pick_least_loaded
+
+"""
+The offer beacon: its datagrams, when it sends them, and how a client picks the least loaded server.
+"""
+
+
+def test_load_extension_round_trips():
+    data = Protocol.build_load(2025, 3, 7, Protocol.PHASE_QUESTION)
+    assert Protocol.parse_load(data) == (2025, 3, 7, Protocol.PHASE_QUESTION)
+    assert Protocol.parse_offer(data) is None
+    # A server without a seat limit and an offer that isn't a load extension
+    assert Protocol.parse_load(Protocol.build_load(2025, 10 ** 12, 1, Protocol.PHASE_LOBBY))[1] == (
+        Protocol.FREE_SEATS_UNLIMITED)
+    assert Protocol.parse_load(Protocol.build_offer("Villa", 2025)) is None
+    assert Protocol.parse_offer(Protocol.build_offer("Villa", 2025)) == ("Villa", 2025)
+
+
+def test_beacon_bursts_when_a_lobby_opens_then_slows_down():
+    beacon = OfferBeacon(burst_interval=0.25, burst_duration=1.0, idle_interval=1.0)
+    sent = [tick / 4 for tick in range(16) if beacon.tick(4, now=tick / 4)]
+    assert sent == [0.0, 0.25, 0.5, 0.75, 1.0, 2.0, 3.0]
+    # Every seat taken: silent, and a burst again when the lobby opens again
+    assert not beacon.tick(0, now=4.0)
+    assert beacon.tick(4, now=4.25)
+    assert beacon.tick(4, now=4.5)
+    assert beacon.offers_sent == 9
+
+
+def test_client_picks_the_least_loaded_server():
+    offers, loads = {}, {}
+    servers = [("10.0.0.1", 2025, 2, 1), ("10.0.0.2", 2025, 6, 3), ("10.0.0.3", 2025, 6, 1), ("10.0.0.4", 2025, 0, 0)]
+    for ip, port, free_seats, active_rooms in servers:
+        add_datagram(offers, loads, Protocol.build_offer(ip, port), (ip, 40000))
+        add_datagram(offers, loads, Protocol.build_load(port, free_seats, active_rooms, Protocol.PHASE_LOBBY), (ip, 40000))
+    add_datagram(offers, loads, Protocol.build_offer("old", 2025), ("10.0.0.5", 40000))
+    merged = merge_loads(offers, loads)
+    assert merged[("10.0.0.5", 2025)]['free_seats'] is None
+    # The most free seats, then the fewest active rooms
+    assert pick_least_loaded(merged) == ("10.0.0.3", 2025)
+
+    # A server without the load extension beats a full one
+    del merged[("10.0.0.1", 2025)], merged[("10.0.0.2", 2025)], merged[("10.0.0.3", 2025)]
+    assert pick_least_loaded(merged) == ("10.0.0.5", 2025)
+    assert pick_least_loaded({}) is None
@@ -0,0 +1,77 @@
+import asyncio
+import random
+import Log
+import Protocol
+from GameRoom import GameRoom
+from Simulation import VirtualEventLoop, ScriptedPlayer
+
+"""
+The asyncio engine's rooms, played by scripted players on a virtual clock (see Simulation.py).
+"""
+
+Log.configure(level="ERROR")
+
+
+class RecordingPlayer(ScriptedPlayer):
+    """A scripted player that keeps every byte the room sent it and the virtual time of every question."""
+
+    def __init__(self, player_name, strategy, seat):
+        super().__init__(player_name, strategy, seat, (0.1, 1.0), random.Random(seat))
+        self.data = bytearray()
+        self.question_times = []
+        self.last_received = None
+
+    def receive(self, data):
+        self.data += data
+        questions = self.questions
+        super().receive(data)
+        if self.questions > questions:
+            self.question_times.append(asyncio.get_running_loop().time())
+        self.last_received = asyncio.get_running_loop().time()
+
+
+def play(entrants, **options):
+    """
+    Plays a game of a new room against recording players, given as (player_name, strategy), on a virtual clock.
+    Returns the players.
+    """
+    async def game():
+        room = GameRoom(1, **options)
+        players = [RecordingPlayer(player_name, strategy, seat) for seat, (player_name, strategy) in enumerate(entrants)]
+        for player in players:
+            player.join(room, ("test", player.seat))
+        await asyncio.wait_for(room.game_task, 600)
+        return players
+
+    loop = VirtualEventLoop()
+    try:
+        return loop.run_until_complete(game())
+    finally:
+        loop.close()
+
+
+def test_room_sends_a_framed_duplicate_its_name_in_hello():
+    players = play([("Dup", "right"), ("Dup", "wrong")], lobby_timeout=600, max_players=2)
+    # Every byte decodes as a frame (no raw notice), and the second player learned its new name from HELLO
+    frames = [Protocol.FrameDecoder().feed(bytes(player.data)) for player in players]
+    assert [[text for kind, text in player_frames if kind == Protocol.HELLO] for player_frames in frames] == [
+        ["Dup"], ["Dup1"]]
+    assert players[0].won
+
+
+def test_round_closes_as_soon_as_every_player_answered():
+    players = play([("Alice", "right"), ("Bob", "random"), ("Charlie", "random"), ("Dave", "random")],
+                   lobby_timeout=600, max_players=4, answer_timeout=10, round_deadline=12)
+    times = players[0].question_times
+    assert len(times) > 2
+    # Every answer is in within a second, the next question doesn't wait for the deadline
+    assert max(later - earlier for earlier, later in zip(times, times[1:])) < 2
+
+
+def test_round_waits_for_a_silent_player_until_the_answer_timeout():
+    players = play([("Alice", "right"), ("Bob", "silent")], lobby_timeout=600, max_players=2,
+                   answer_timeout=5, round_deadline=12)
+    assert players[0].won
+    assert players[0].questions == 1
+    # The only round lasted the whole answer timeout, the results and the winner came at its end
+    assert 5 <= players[0].last_received - players[0].question_times[0] < 6
@@ -0,0 +1,69 @@
+import threading
+import pytest
+import Log
+from GameState import RoundSnapshot, LOBBY, QUESTION, RESULTS, OVER
+from Server import Server
+
+"""
+The hand-off of the threaded game's state: the game thread publishes immutable snapshots, the handlers follow them.
+"""
+
+Log.configure(level="ERROR")
+
+
+def test_a_handler_behind_follows_every_step_in_order():
+    first = snapshot = RoundSnapshot(LOBBY)
+    for kind in (QUESTION, RESULTS, QUESTION, RESULTS, OVER):
+        published = RoundSnapshot(kind)
+        snapshot.link(published)
+        snapshot = published
+    # The handler only looks after the game is over, it still sees every step
+    kinds = []
+    snapshot = first
+    while snapshot.kind != OVER:
+        snapshot = snapshot.wait_next(0)
+        kinds.append(snapshot.kind)
+    assert kinds == [QUESTION, RESULTS, QUESTION, RESULTS, OVER]
+
+
+def test_a_waiting_handler_wakes_on_the_next_snapshot():
+    lobby = RoundSnapshot(LOBBY)
+    assert lobby.wait_next(0.01) is None
+    received = []
+    handler = threading.Thread(target=lambda: received.append(lobby.wait_next(5)))
+    handler.start()
+    question = RoundSnapshot(QUESTION, 1, payloads={True: b"frame", False: b"text"})
+    lobby.link(question)
+    handler.join(5)
+    assert received == [question]
+
+
+def test_snapshots_cant_be_changed():
+    players = {"Alice", "Bob"}
+    payloads = {True: b"frame", False: b"text"}
+    snapshot = RoundSnapshot(QUESTION, 1, ["Alice", "Bob"], players, payloads, ["T"])
+    # The writer's own state moves on, the published snapshot doesn't
+    players.discard("Bob")
+    payloads[True] = b"next"
+    assert snapshot.players == {"Alice", "Bob"}
+    assert snapshot.payloads[True] == b"frame"
+    with pytest.raises(TypeError):
+        snapshot.payloads[True] = b"changed"
+    with pytest.raises(AttributeError):
+        snapshot.players.add("Charlie")
+
+
+def test_server_publishes_linked_snapshots():
+    server = Server(autostart=False)
+    lobby = server.snapshot
+    assert lobby.kind == LOBBY
+    server.correct_players = {"Alice", "Bob"}
+    server.publish(QUESTION, {True: b"frame", False: b"text"})
+    question = server.snapshot
+    assert lobby.wait_next(0) is question
+    assert question.players == {"Alice", "Bob"}
+    server.correct_players.discard("Bob")
+    server.publish(RESULTS, result_message="Alice is correct!")
+    assert question.wait_next(0).players == {"Alice"}
+    assert question.players == {"Alice", "Bob"}
+    assert server.snapshot.result_message == "Alice is correct!"
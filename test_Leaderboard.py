@@ -0,0 +1,78 @@
+import random
+import pytest
+from Leaderboard import Leaderboard, RankedList
+from Statistics import Statistics
+
+"""
+The leaderboard's skip list checked against a plain sorted list, and the ranking of the players.
+"""
+
+
+def assert_matches(ranked, expected):
+    assert len(ranked) == len(expected)
+    assert ranked.slice(0, len(ranked)) == expected
+    for position, key in enumerate(expected):
+        assert ranked.rank(key) == position
+        assert ranked[position] == key
+
+
+def test_built_list_matches_the_sorted_keys():
+    keys = sorted(random.Random(1).sample(range(10000), 500))
+    assert_matches(RankedList(keys), keys)
+
+
+def test_random_inserts_and_removes_keep_ranks_and_indexes():
+    rng = random.Random(2)
+    ranked = RankedList()
+    expected = []
+    for _ in range(2000):
+        key = rng.randrange(300)
+        if key in expected:
+            ranked.remove(key)
+            expected.remove(key)
+        else:
+            ranked.insert(key)
+            expected.append(key)
+            expected.sort()
+    assert_matches(ranked, expected)
+
+
+def test_missing_keys():
+    ranked = RankedList([1, 3, 5])
+    assert ranked.rank(4) is None
+    with pytest.raises(KeyError):
+        ranked.remove(4)
+    with pytest.raises(IndexError):
+        ranked[3]
+    assert ranked.slice(2, 10) == [5]
+    assert ranked.slice(3, 10) == []
+
+
+def test_players_move_up_when_they_win():
+    statistics = Statistics()
+    for player_name in ("Alice", "Bob", "Charlie"):
+        statistics.add_game(player_name, player_name == "Bob")
+    leaderboard = Leaderboard(statistics, min_rounds=1)
+    assert leaderboard.rank("Bob") == 1
+    assert leaderboard.rank("Alice") == 2  # ties are ranked by name
+
+    for _ in range(2):
+        statistics.add_game("Charlie", True)
+        leaderboard.update("Charlie")
+    assert [entry["player"] for entry in leaderboard.top(3)] == ["Charlie", "Bob", "Alice"]
+    assert [entry["rank"] for entry in leaderboard.around("Bob", k=1)] == [1, 2, 3]
+
+
+def test_accuracy_board_needs_min_rounds():
+    statistics = Statistics()
+    statistics.add_answer("Alice", True, 1.0)
+    for _ in range(3):
+        statistics.add_answer("Bob", False, 1.0)
+    leaderboard = Leaderboard(statistics, min_rounds=2)
+    assert leaderboard.rank("Alice", "accuracy") is None
+    assert leaderboard.rank("Bob", "accuracy") == 1
+
+    statistics.add_answer("Alice", True, 1.0)
+    leaderboard.update("Alice")
+    assert leaderboard.rank("Alice", "accuracy") == 1
+    assert leaderboard.rank("Bob", "accuracy") == 2
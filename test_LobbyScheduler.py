@@ -0,0 +1,88 @@
+import queue
+import Log
+from LobbyScheduler import LobbyScheduler
+from Server import Server
+
+"""
+When a lobby starts its game (quiet window, fill window, full lobby) and what happens to the players who don't fit.
+"""
+
+Log.configure(level="ERROR")
+
+
+def test_game_starts_after_the_quiet_window(clock):
+    lobby = LobbyScheduler(quiet=10, clock=clock)
+    assert lobby.time_left() is None
+    assert not lobby.is_due()
+
+    lobby.admit()
+    clock.time += 6
+    lobby.admit()  # every join restarts the quiet window
+    clock.time += 6
+    assert lobby.time_left() == 4
+    assert not lobby.is_due()
+    clock.time += 4
+    assert lobby.is_due()
+
+
+def test_fill_window_caps_a_storm_of_joins(clock):
+    lobby = LobbyScheduler(quiet=10, fill_window=15, clock=clock)
+    lobby.admit()
+    for _ in range(7):
+        clock.time += 2
+        lobby.admit()
+    # The quiet window would end at 124, the fill window ends first
+    assert lobby.time_left() == 1
+    clock.time += 1
+    assert lobby.is_due()
+
+
+def test_full_lobby_starts_at_once(clock):
+    lobby = LobbyScheduler(quiet=10, max_size=2, clock=clock)
+    assert not lobby.admit()
+    assert lobby.admit()
+    assert lobby.time_left() == 0
+    assert lobby.is_due()
+    assert lobby.close() == 2
+    assert lobby.time_left() is None
+
+
+def test_last_player_leaving_empties_the_lobby(clock):
+    lobby = LobbyScheduler(quiet=10, fill_window=15, clock=clock)
+    lobby.admit()
+    clock.time += 12
+    lobby.leave()
+    assert lobby.time_left() is None
+    lobby.admit()  # a new fill window starts
+    assert lobby.time_left() == 10
+
+
+def join(server, player_name):
+    admitted = queue.Queue()
+    server.join_player((player_name, None, ("127.0.0.1", 0), False, admitted))
+    return admitted
+
+
+def test_overflow_is_queued_then_rejected():
+    server = Server(autostart=False, max_lobby=2, max_queue=1)
+    replies = [join(server, player_name).get_nowait() for player_name in ("Alice", "Bob", "Charlie", "Dave")]
+    assert [reply[0] for reply in replies] == ["admitted", "admitted", "queued", "rejected"]
+    assert replies[2][1] == 1  # Charlie's place in the queue
+    assert (server.admissions.admitted, server.admissions.queued, server.admissions.rejected) == (2, 1, 1)
+
+
+def test_queued_players_join_the_next_lobby_in_order():
+    server = Server(autostart=False, max_lobby=2, max_queue=10)
+    for player_name in ("Alice", "Bob"):
+        join(server, player_name)
+    queued = [join(server, player_name) for player_name in ("Charlie", "Dave", "Eve")]
+    for admitted in queued:
+        assert admitted.get_nowait()[0] == "queued"
+
+    # The game is over: the next lobby takes as many queued players as fit, the others move up the queue
+    server.lobby_scheduler.close()
+    server.correct_players = set()
+    server.open_lobby()
+    assert [admitted.get_nowait()[:2] for admitted in queued[:2]] == [("admitted", "Charlie"), ("admitted", "Dave")]
+    assert queued[2].get_nowait()[:2] == ("queued", 1)
+    assert server.lobby_scheduler.is_full()
@@ -0,0 +1,123 @@
+import socket
+import pytest
+import Protocol
+
+"""
+The behaviour of the framed protocol: frames split over several reads or coalesced in one, and the handshake.
+"""
+
+
+def test_decoder_returns_a_whole_frame():
+    decoder = Protocol.FrameDecoder()
+    assert decoder.feed(Protocol.encode_frame(Protocol.QUESTION, "True or False: 1 + 1 = 2")) == [
+        (Protocol.QUESTION, "True or False: 1 + 1 = 2")]
+    assert decoder.buffer == bytearray()
+
+
+def test_decoder_waits_for_the_rest_of_a_split_frame():
+    decoder = Protocol.FrameDecoder()
+    frame = Protocol.encode_frame(Protocol.RESULT, "Villa won")
+    # Cut inside the header and inside the payload
+    assert decoder.feed(frame[:3]) == []
+    assert decoder.feed(frame[3:Protocol.HEADER.size + 2]) == []
+    assert decoder.feed(frame[Protocol.HEADER.size + 2:]) == [(Protocol.RESULT, "Villa won")]
+
+
+def test_decoder_splits_coalesced_frames():
+    decoder = Protocol.FrameDecoder()
+    data = (Protocol.encode_frame(Protocol.HELLO, "Alice") + Protocol.encode_frame(Protocol.ROSTER, "Alice\nBob")
+            + Protocol.encode_frame(Protocol.QUESTION, "Q"))
+    assert decoder.feed(data[:-1]) == [(Protocol.HELLO, "Alice"), (Protocol.ROSTER, "Alice\nBob")]
+    assert decoder.feed(data[-1:]) == [(Protocol.QUESTION, "Q")]
+
+
+def test_decoder_keeps_multibyte_text_split_between_reads():
+    decoder = Protocol.FrameDecoder()
+    frame = Protocol.encode_frame(Protocol.TEXT, "Villa Park – Birmingham")
+    frames = [decoded for byte in range(len(frame)) for decoded in decoder.feed(frame[byte:byte + 1])]
+    assert frames == [(Protocol.TEXT, "Villa Park – Birmingham")]
+
+
+def test_decoder_rejects_bad_magic():
+    with pytest.raises(Protocol.ProtocolError, match="magic"):
+        Protocol.FrameDecoder().feed(b"You have been assigned Dup1\n")
+
+
+def test_decoder_rejects_another_version():
+    frame = bytearray(Protocol.encode_frame(Protocol.TEXT, "hi"))
+    frame[1] = Protocol.PROTOCOL_VERSION + 1
+    with pytest.raises(Protocol.ProtocolError, match="version"):
+        Protocol.FrameDecoder().feed(bytes(frame))
+
+
+def test_decoder_rejects_a_payload_too_long():
+    header = Protocol.HEADER.pack(Protocol.FRAME_MAGIC, Protocol.PROTOCOL_VERSION, Protocol.TEXT,
+                                  Protocol.MAX_PAYLOAD + 1)
+    with pytest.raises(Protocol.ProtocolError, match="too long"):
+        Protocol.FrameDecoder().feed(header)
+
+
+def test_text_codec_keeps_a_character_split_between_reads():
+    codec = Protocol.TextCodec()
+    data = "Villa Park – Birmingham".encode()
+    split = data.index("–".encode()) + 1
+    assert codec.feed(data[:split]) == [(Protocol.TEXT, "Villa Park ")]
+    assert codec.feed(data[split:]) == [(Protocol.TEXT, "– Birmingham")]
+    assert codec.feed(b"") == []
+
+
+def test_roster_delta_takes_the_players_out_by_position():
+    roster = ["Alice", "Bob", "Charlie", "Dave"]
+    players_left = set(roster)
+    payload = Protocol.encode_roster_delta([1], [3])
+    assert payload == "-1\n!3"
+    assert Protocol.apply_roster_delta(roster, players_left, payload) == (["Bob"], ["Dave"])
+    assert players_left == {"Alice", "Charlie"}
+    assert Protocol.apply_roster_delta(roster, players_left, Protocol.encode_roster_delta([], [])) == ([], [])
+
+
+def test_parse_hello_of_a_framed_client():
+    player_name, codec = Protocol.parse_hello(Protocol.build_hello("Alice"))
+    assert player_name == "Alice"
+    assert codec.framed
+
+
+def test_parse_hello_of_a_text_client():
+    player_name, codec = Protocol.parse_hello(b"Bob\n")
+    assert player_name == "Bob"
+    assert not codec.framed
+
+
+def test_parse_resume_of_a_reconnecting_player():
+    hello = Protocol.build_hello("Alice", "s3cr3t-token")
+    assert Protocol.parse_hello(hello)[0] == "Alice"
+    assert Protocol.parse_hello(hello)[1].framed
+    assert Protocol.parse_resume(hello) == "s3cr3t-token"
+
+
+def test_parse_resume_of_a_new_player():
+    assert Protocol.parse_resume(Protocol.build_hello("Alice")) is None
+    assert Protocol.parse_resume(b"Alice\n") is None
+    # A player can't resume by picking a name that looks like the prefix
+    assert Protocol.parse_resume((Protocol.RESUME_PREFIX + "token\n").encode()) is None
+
+
+def test_detect_codec_from_the_first_byte():
+    assert Protocol.detect_codec(Protocol.encode_frame(Protocol.HELLO, "Alice")).framed
+    assert not Protocol.detect_codec(b"Welcome to the server").framed
+
+
+def test_frames_after_an_answer_are_kept_for_the_next_read():
+    server_side, client_side = socket.socketpair()
+    codec = Protocol.FrameCodec()
+    try:
+        # Two answers and a frame of another kind arrive in the same recv
+        client_side.sendall(Protocol.encode_frame(Protocol.ANSWER, "T") + Protocol.encode_frame(Protocol.ROSTER, "x")
+                            + Protocol.encode_frame(Protocol.ANSWER, "F"))
+        assert Protocol.receive_message_text(server_side, codec) == "T"
+        assert Protocol.receive_message_text(server_side, codec) == "F"
+        client_side.close()
+        with pytest.raises(ConnectionError):
+            Protocol.receive_message_text(server_side, codec)
+    finally:
+        server_side.close()
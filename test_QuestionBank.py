@@ -0,0 +1,46 @@
+import random
+import pytest
+from QuestionBank import QuestionBank, QuestionBankError, build_bank, TRUE_ANSWER, FALSE_ANSWER
+
+"""
+The question bank format: questions read back by id, category and difficulty indexes, and no-repeat decks.
+"""
+
+QUESTIONS = [{'question': f"Question {number}", 'answer': ['T'] if number % 2 else ['F'],
+              'category': "history" if number < 6 else "players", 'difficulty': 1 + number % 3}
+             for number in range(10)]
+
+
+def test_questions_read_back_by_id():
+    bank = QuestionBank.from_questions(QUESTIONS)
+    assert bank.question_count == 10
+    question = bank.question(7)
+    assert question['question'] == "Question 7"
+    assert question['answer'] == TRUE_ANSWER
+    assert bank.question(4)['answer'] == FALSE_ANSWER
+    assert question['category'] == "players"
+    assert question['difficulty'] == 2
+    with pytest.raises(IndexError):
+        bank.question(10)
+
+
+def test_decks_draw_every_question_of_their_index_once():
+    bank = QuestionBank.from_questions(QUESTIONS)
+    rng = random.Random(1)
+    deck = bank.deck(rng)
+    drawn = [deck.draw() for _ in range(10)]
+    assert sorted(drawn) == list(range(10))
+    assert deck.draw() is None
+
+    history = bank.deck(rng, category="history")
+    assert sorted(iter(history.draw, None)) == list(range(6))
+    hard_players = bank.deck(rng, category="players", difficulty=3)
+    assert sorted(iter(hard_players.draw, None)) == [8]
+
+
+def test_too_many_categories_is_a_bank_error():
+    questions = [{'question': f"Question {number}", 'answer': ['T'], 'category': f"category {number}"}
+                 for number in range(256)]
+    build_bank(questions[:255])
+    with pytest.raises(QuestionBankError, match="255 categories"):
+        build_bank(questions)
@@ -0,0 +1,80 @@
+import pytest
+import Recorder
+from Recorder import SessionRecorder, read_session
+
+"""
+The session files: what a SessionRecorder writes, read_session reads back.
+"""
+
+
+def record_a_game(path):
+    recorder = SessionRecorder.open(path)
+    recorder.join("Alice")
+    recorder.join("Bob")
+    game, seed = recorder.start_game(["Alice", "Bob"])
+    recorder.question(game, 1, 42)
+    recorder.answer(game, "Alice", "T")
+    recorder.timeout(game, "Bob")
+    recorder.result(game, 1, ["Alice"])
+    recorder.finish(game, "Alice")
+    recorder.close()
+    return game, seed
+
+
+def test_recorded_game_reads_back(tmp_path):
+    path = str(tmp_path / "game.trs")
+    game, seed = record_a_game(path)
+
+    question_file, records = read_session(path)
+    assert question_file == "Questions.py"
+    assert [(kind, record_game, fields) for kind, _, record_game, fields in records] == [
+        (Recorder.JOIN, 0, ("Alice",)),
+        (Recorder.JOIN, 0, ("Bob",)),
+        (Recorder.GAME, game, (seed, ["Alice", "Bob"])),
+        (Recorder.QUESTION, game, (1, 42)),
+        (Recorder.ANSWER, game, ("Alice", "T")),
+        (Recorder.TIMEOUT, game, ("Bob",)),
+        (Recorder.RESULT, game, (1, ["Alice"])),
+        (Recorder.FINISH, game, ("Alice",)),
+    ]
+    times = [seconds for _, seconds, _, _ in records]
+    assert times == sorted(times)
+
+
+def test_game_without_a_winner(tmp_path):
+    path = str(tmp_path / "game.trs")
+    recorder = SessionRecorder.open(path)
+    game, _ = recorder.start_game(["Alice"])
+    recorder.finish(game, None)
+    recorder.close()
+    assert read_session(path)[1][-1][3] == (None,)
+
+
+def test_incomplete_last_record_is_skipped(tmp_path):
+    path = str(tmp_path / "game.trs")
+    record_a_game(path)
+    with open(path, "rb") as session_file:
+        data = session_file.read()
+    with open(path, "wb") as session_file:
+        session_file.write(data[:-1])
+    kinds = [kind for kind, _, _, _ in read_session(path)[1]]
+    assert kinds[-1] == Recorder.RESULT
+
+
+def test_varints_round_trip():
+    out = bytearray()
+    values = [0, 1, 127, 128, 300, 2 ** 32 - 1, 2 ** 40]
+    for value in values:
+        Recorder.encode_varint(value, out)
+    position = 0
+    for value in values:
+        decoded, position = Recorder.decode_varint(out, position)
+        assert decoded == value
+    assert position == len(out)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not_a_session.trs"
+    path.write_bytes(b"player_stats")
+    with pytest.raises(Recorder.SessionFileError):
+        read_session(str(path))
@@ -0,0 +1,26 @@
+from RoundScheduler import RoundScheduler
+
+"""
+When a round is over: once every live player is done, or at the round deadline.
+"""
+
+
+def test_round_is_complete_once_every_player_is_done(clock):
+    scheduler = RoundScheduler(deadline=12, clock=clock)
+    scheduler.open_round({"Alice", "Bob", "Charlie"})
+    scheduler.mark_done("Alice")
+    scheduler.mark_done("Bob")
+    assert not scheduler.is_complete()
+    clock.time += 3
+    scheduler.mark_done("Charlie")  # timed out or disconnected, the round doesn't wait for it either
+    assert scheduler.is_complete()
+    assert scheduler.close_round() == 9
+
+
+def test_round_closed_at_the_deadline_saves_nothing(clock):
+    scheduler = RoundScheduler(deadline=12, clock=clock)
+    scheduler.open_round({"Alice", "Bob"})
+    scheduler.mark_done("Alice")
+    clock.time += 15
+    assert scheduler.time_left() == 0
+    assert scheduler.close_round() == 0
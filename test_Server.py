@@ -0,0 +1,117 @@
+import socket
+import threading
+import time
+import Log
+import Protocol
+from Server import Server
+
+"""
+The threaded engine end to end on the loopback interface: real sockets, real handler threads and a short lobby.
+"""
+
+Log.configure(level="ERROR")
+
+
+def start_server(**options):
+    """
+    Starts a threaded server without the UDP offers on a free port and returns it.
+    """
+    server = Server(autostart=False, host="127.0.0.1", **options)
+    threading.Thread(target=server.start, args=(server.find_free_port(), False), daemon=True).start()
+    return server
+
+
+def connect(server):
+    """
+    Connects to the server, waiting for it to listen (every connection is a player, so it can't be probed).
+    """
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", server.port_number))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def read_until(client_socket, codec, kind):
+    """
+    Reads from a socket until a message of the given kind arrived, returns every message received by then.
+    """
+    messages = []
+    client_socket.settimeout(10)
+    while not any(message_kind == kind for message_kind, _ in messages):
+        data = client_socket.recv(4096)
+        assert data, "the server closed the connection"
+        messages += codec.feed(data)
+    return messages
+
+
+def test_threaded_server_sends_a_framed_duplicate_its_name_in_hello():
+    server = start_server(lobby_timeout=0.3)
+    clients = [connect(server) for _ in range(2)]
+    try:
+        for client_socket in clients:
+            client_socket.sendall(Protocol.build_hello("Dup"))
+        received = [read_until(client_socket, Protocol.FrameCodec(), Protocol.QUESTION) for client_socket in clients]
+    finally:
+        for client_socket in clients:
+            client_socket.close()
+    # Every byte decoded as a frame (no raw notice), and the second player learned its new name from HELLO
+    names = sorted(text for messages in received for kind, text in messages if kind == Protocol.HELLO)
+    assert names == ["Dup", "Dup1"]
+    assert all(kind != Protocol.TEXT or "assigned" not in text for messages in received for kind, text in messages)
+
+
+def test_text_player_with_a_taken_name_is_told_its_new_name():
+    server = start_server(lobby_timeout=0.3)
+    framed = connect(server)
+    text = connect(server)
+    try:
+        framed.sendall(Protocol.build_hello("Dup"))
+        read_until(framed, Protocol.FrameCodec(), Protocol.HELLO)
+        text.sendall(b"Dup\n")
+        received = ""
+        text.settimeout(10)
+        while "True or False" not in received:
+            data = text.recv(4096)
+            assert data, "the server closed the connection"
+            received += data.decode()
+    finally:
+        framed.close()
+        text.close()
+    assert "You have been assigned Dup1" in received
+
+
+def test_roster_deltas_keep_a_framed_client_up_to_date():
+    server = Server(autostart=False)
+    server.connected_clients = {(player_name, None) for player_name in ("Alice", "Bob", "Charlie", "Dave")}
+    server.correct_players = {"Alice", "Bob", "Charlie", "Dave"}
+    server.broadcast_game_start()
+    [(kind, text)] = Protocol.FrameDecoder().feed(server.roster_payload)
+    assert kind == Protocol.ROSTER
+    roster = text.split("\n")
+    players_left = set(roster)
+
+    # Bob answered wrong and Charlie dropped out of round 1, then Dave answered wrong in round 2
+    server.correct_players -= {"Bob", "Charlie"}
+    server.dropped_players.add("Charlie")
+    out = []
+    for round_number, leaving in ((2, ()), (3, ("Dave",))):
+        server.correct_players -= set(leaving)
+        server.General_round = round_number
+        server.prepare_question()
+        [(kind, text)] = Protocol.FrameDecoder().feed(server.roster_payload)
+        assert kind == Protocol.ROSTER_DELTA
+        out.append(Protocol.apply_roster_delta(roster, players_left, text))
+    assert out == [(["Bob"], ["Charlie"]), (["Dave"], [])]
+    assert players_left == {"Alice"}
+
+    # A player who reconnects now gets the whole roster and everyone out since the start
+    catch_up = Protocol.FrameDecoder().feed(server.roster_catch_up())
+    assert [kind for kind, _ in catch_up] == [Protocol.ROSTER, Protocol.ROSTER_DELTA]
+    caught_up = set(roster)
+    eliminated, disconnected = Protocol.apply_roster_delta(catch_up[0][1].split("\n"), caught_up, catch_up[1][1])
+    assert sorted(eliminated) == ["Bob", "Dave"] and disconnected == ["Charlie"]
+    assert caught_up == {"Alice"}
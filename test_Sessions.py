@@ -0,0 +1,91 @@
+from Sessions import SessionRegistry
+
+"""
+The players' sessions: a dropped player's seat is kept for the grace window and lost once it's over.
+"""
+
+
+def test_dropped_seat_is_kept_until_the_grace_window_is_over(clock):
+    registry = SessionRegistry(grace=5, clock=clock)
+    game = object()
+    session = registry.issue("Alice", game)
+    assert registry.next_expiry(game) is None
+
+    assert registry.drop(session)
+    clock.time += 3
+    assert registry.next_expiry(game) == 2
+    assert registry.expire(game) == []
+    assert registry.find(session.token) is session
+
+    clock.time += 2
+    assert registry.expire(game) == [session]
+    assert registry.find(session.token) is None
+    assert registry.next_expiry(game) is None
+    assert registry.expired == 1
+
+
+def test_resumed_player_doesnt_expire(clock):
+    registry = SessionRegistry(grace=5, clock=clock)
+    game = object()
+    alice = registry.issue("Alice", game)
+    bob = registry.issue("Bob", game)
+    registry.drop(alice)
+    clock.time += 1
+    registry.drop(bob)
+    registry.resume(alice)
+    assert registry.next_expiry(game) == 5  # Bob's window, Alice's is gone
+
+    clock.time += 10
+    assert registry.expire(game) == [bob]
+    assert registry.find(alice.token) is alice
+    assert registry.resumed == 1
+
+
+def test_dropped_again_gets_a_new_grace_window(clock):
+    registry = SessionRegistry(grace=5, clock=clock)
+    game = object()
+    session = registry.issue("Alice", game)
+    registry.drop(session)
+    clock.time += 4
+    registry.resume(session)
+    registry.drop(session)
+    clock.time += 4
+    assert registry.expire(game) == []
+    assert registry.next_expiry(game) == 1
+
+
+def test_expiry_is_per_game(clock):
+    registry = SessionRegistry(grace=5, clock=clock)
+    first_game, second_game = object(), object()
+    first = registry.issue("Alice", first_game)
+    second = registry.issue("Alice", second_game)
+    registry.drop(first)
+    registry.drop(second)
+    clock.time += 5
+    assert registry.expire(first_game) == [first]
+    assert registry.find(second.token) is None  # over, but its game hasn't taken it out yet
+    assert registry.expire(second_game) == [second]
+
+
+def test_closed_sessions_are_forgotten(clock):
+    registry = SessionRegistry(grace=5, clock=clock)
+    game = object()
+    alice = registry.issue("Alice", game)
+    bob = registry.issue("Bob", game)
+    registry.drop(alice)
+    registry.drop(bob)
+    registry.close(alice)
+    clock.time += 5
+    assert registry.expire(game) == [bob]
+
+    registry.drop(registry.issue("Charlie", game))
+    registry.close_all(game)
+    assert registry.sessions == {}
+    assert registry.next_expiry(game) is None
+
+
+def test_no_grace_window_keeps_no_seat(clock):
+    registry = SessionRegistry(grace=0, clock=clock)
+    game = object()
+    assert not registry.drop(registry.issue("Alice", game))
+    assert registry.next_expiry(game) is None
@@ -0,0 +1,18 @@
+import Log
+from Simulation import Simulation
+
+"""
+Simulated games of the asyncio rooms against scripted players, on a virtual clock.
+"""
+
+Log.configure(level="ERROR")
+
+
+def test_round_gaps_are_counted_once_per_game():
+    # One game at a time, so every game after the first reuses the room of the one before it
+    results = Simulation(games=30, seed=1, concurrency=1).run()
+    assert results["unfinished"] == 0
+    assert len(results["round_gaps"]) <= results["rounds"]
+    # The first round of a game has no round before it
+    assert len(results["round_gaps"]) == results["rounds"] - results["games"]
+    assert max(results["round_gaps"]) < 1
@@ -0,0 +1,68 @@
+from Statistics import StatsStore
+
+"""
+The players' persistent statistics: the log, the snapshot it's compacted to and the replay of the records after it.
+"""
+
+
+def play_games(store):
+    store.record_answer("Alice", True, 1.5)
+    store.record_answer("Bob", False, 2.5)
+    store.record_game(["Alice", "Bob"], "Alice")
+
+
+def test_reopened_store_loads_the_snapshot_without_replaying_the_log(tmp_path):
+    path = str(tmp_path / "player_stats.log")
+    store = StatsStore.open(path)
+    play_games(store)
+    store.close()
+
+    reopened = StatsStore.open(path)
+    assert reopened.records_replayed == 0
+    assert reopened.statistics.player_summary("Alice") == store.statistics.player_summary("Alice")
+    assert reopened.statistics.player_summary("Bob")["games_played"] == 1
+    assert reopened.leaderboard.rank("Alice") == 1
+    reopened.close()
+
+
+def test_records_after_the_snapshot_are_replayed_once(tmp_path):
+    path = str(tmp_path / "player_stats.log")
+    store = StatsStore.open(path)
+    play_games(store)
+    store.compact()
+    play_games(store)
+    store.log_file.flush()  # the server stops without a last snapshot
+
+    reopened = StatsStore.open(path)
+    assert reopened.records_replayed == 4
+    assert reopened.statistics.player_summary("Alice")["wins"] == 2
+    assert reopened.statistics.player_summary("Alice")["rounds"] == 2
+    reopened.close()
+    # Opening compacted again: nothing is replayed twice
+    assert StatsStore.open(path).records_replayed == 0
+
+
+def test_incomplete_last_record_is_cut(tmp_path):
+    path = str(tmp_path / "player_stats.log")
+    store = StatsStore.open(path)
+    play_games(store)
+    store.log_file.write(b'["game", "Ali')  # the server stopped in the middle of a record
+    store.log_file.flush()
+
+    reopened = StatsStore.open(path)
+    assert reopened.statistics.player_summary("Alice")["games_played"] == 1
+    reopened.close()
+    with open(path, "rb") as log_file:
+        assert log_file.read().endswith(b"\n")
+
+
+def test_read_merges_the_logs_of_several_workers(tmp_path):
+    paths = [str(tmp_path / f"worker{number}.log") for number in range(2)]
+    for path in paths:
+        store = StatsStore.open(path)
+        play_games(store)
+        store.close()
+
+    merged = StatsStore.read(paths)
+    assert merged.statistics.player_summary("Alice")["wins"] == 2
+    assert merged.statistics.player_summary("Bob")["games_played"] == 2